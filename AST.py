@@ -1,8 +1,16 @@
+from Token import Token
+
 class AST:
     """Base class for all nodes in the Abstract Syntax Tree (AST).
     All specific AST node classes will inherit from this class.
+    Nodes declare `__slots__`, so they carry no per-instance dictionary.
+
+    Attributes:
+        line (int): The 1-based source line where the node starts. Only set on parsed nodes;
+                    read it with `getattr(node, 'line', None)`.
+        column (int): The 1-based source column where the node starts, set alongside `line`.
     """
-    pass
+    __slots__ = ('line', 'column')
 
 class BinOp(AST):
     """Represents a binary operation in the AST.
@@ -12,6 +20,8 @@ class BinOp(AST):
         op (Token): The operator token (e.g., '+', '-', '*', '/').
         right (AST): The right child node, representing the right operand.
     """
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
@@ -21,24 +31,34 @@ class Num(AST):
     """Represents a number in the AST.
     
     Attributes:
-        token (Token): The token instance representing the number.
         value (int or float): The numeric value extracted from the token.
+        token (Token): A token representing the number, rebuilt from `value` on access.
     """
+    __slots__ = ('value',)
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
 
+    @property
+    def token(self):
+        return Token(Token.INTEGER, self.value)
+
 class Var(AST):
     """Represents a variable in the AST.
     
     Attributes:
-        token (Token): The token instance representing the variable's identifier.
         value (str): The name of the variable, extracted from the token.
+        token (Token): A token representing the variable's identifier, rebuilt from `value` on access.
     """
+    __slots__ = ('value',)
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
 
+    @property
+    def token(self):
+        return Token(Token.IDENTIFIER, self.value)
+
 class Assign(AST):
     """Represents an assignment operation in the AST.
     
@@ -47,6 +67,8 @@ class Assign(AST):
         op (Token): The assignment operator token (e.g., '=').
         right (AST): The expression node whose value will be assigned to the variable.
     """
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
@@ -58,6 +80,8 @@ class Print(AST):
     Attributes:
         value (AST): The expression whose value will be printed.
     """
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -68,6 +92,8 @@ class If(AST):
         condition (AST): The condition expression which determines whether the 'if' body will execute.
         body (list of AST): The list of statement nodes that form the body of the 'if' statement.
     """
+    __slots__ = ('condition', 'body')
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -79,6 +105,98 @@ class While(AST):
         condition (AST): The condition expression which determines the continuation of the loop.
         body (list of AST): The list of statement nodes that form the body of the loop.
     """
+    __slots__ = ('condition', 'body')
+
     def __init__(self, condition, body):
         self.condition = condition
-        self.body = body
\ No newline at end of file
+        self.body = body
+
+class Array(AST):
+    """Represents an array literal such as `[1, 2, 3]` in the AST.
+    
+    Attributes:
+        elements (list of AST): The expressions giving the elements of the array.
+    """
+    __slots__ = ('elements',)
+
+    def __init__(self, elements):
+        self.elements = elements
+
+class Range(AST):
+    """Represents an integer range array such as `[0 : 10]` in the AST.
+    
+    Attributes:
+        start (AST): The expression giving the first element.
+        stop (AST): The expression giving the end of the range, which is not included.
+    """
+    __slots__ = ('start', 'stop')
+
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+
+class Index(AST):
+    """Represents indexing an array, such as `x[i]`, in the AST.
+    
+    Attributes:
+        value (AST): The expression giving the array.
+        index (AST): The expression giving the position, or an array of positions.
+    """
+    __slots__ = ('value', 'index')
+
+    def __init__(self, value, index):
+        self.value = value
+        self.index = index
+
+class Function(AST):
+    """Represents a function definition such as `def f(a, b) then ... enddef` in the AST.
+    
+    Attributes:
+        name (str): The name of the function.
+        params (list of str): The names of the parameters.
+        body (list of AST): The list of statement nodes that form the body of the function.
+    """
+    __slots__ = ('name', 'params', 'body')
+
+    def __init__(self, name, params, body):
+        self.name = name
+        self.params = params
+        self.body = body
+
+class Return(AST):
+    """Represents a 'return' statement in the AST.
+    
+    Attributes:
+        value (AST or None): The expression whose value the function returns, or None for a bare `return`.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+class Call(AST):
+    """Represents a function call such as `f(x, 1)` in the AST, as an expression or a statement.
+    
+    Attributes:
+        name (str): The name of the called function.
+        args (list of AST): The expressions giving the arguments.
+    """
+    __slots__ = ('name', 'args')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+class Global(AST):
+    """Represents a 'global' declaration such as `global total, count` inside a function body.
+
+    Assignments in a function body create locals; the names declared global are assigned in the
+    caller's variables instead.
+
+    Attributes:
+        names (list of str): The declared names.
+    """
+    __slots__ = ('names',)
+
+    def __init__(self, names):
+        self.names = names
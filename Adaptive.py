@@ -0,0 +1,305 @@
+from AST import BinOp, Num, Var
+from Compiler import Compiler
+from Resolver import UNDEFINED
+from Transpiler import PYTHON_OPERATORS
+
+# Operand shapes of a binary operation site.
+SLOT = 'slot'    # a variable, read straight from its frame slot
+CONST = 'const'  # an integer constant, bound into the specialized code
+CALL = 'call'    # any other expression, evaluated by calling it
+
+OPERATOR_NAMES = {'+': 'add', '-': 'sub', '*': 'mul', '/': 'div', '==': 'eq', '>': 'gt', '<': 'lt'}
+
+SPECIALIZED_TEMPLATE = '''
+def factory(frame, left, right, fallback, undefined):
+    def specialized():
+        a = {left}
+{check}        b = {right}
+{guard}
+    return specialized
+'''
+
+def operand(shape, name):
+    """Return the Python expression reading an operand of the given shape."""
+    if shape == SLOT:
+        return f'frame[{name}]'
+    if shape == CALL:
+        return f'{name}()'
+    return name
+
+# Specialized closure factories, generated on first use, keyed by (operator, left shape, right shape).
+FACTORIES = {}
+
+def specialized_factory(op, left_shape, right_shape):
+    """Return a function building the int-specialized closure of an operator and operand shapes.
+
+    The closure reads slot operands from the frame and constants from its own cell, checks that
+    every operand not known at compile time is an `int` (and, for `/`, that the divisor is not
+    zero), and applies the operator inline. Any other operands go to `fallback(a, b)`.
+    Factories are generated once per combination and shared by all sites.
+    """
+    key = (op, left_shape, right_shape)
+    if key not in FACTORIES:
+        conditions = [f'type({name}) is int' for name, shape in (('a', left_shape), ('b', right_shape)) if shape != CONST]
+        if op == '/' and right_shape != CONST:
+            conditions.append('b')
+        expression = f'a {PYTHON_OPERATORS[op]} b'
+        if conditions:
+            guard = (f"        if {' and '.join(conditions)}:\n            return {expression}\n"
+                     f"        return fallback(a, b)")
+        else:
+            guard = f'        return {expression}'
+        # A slot read cannot fail, so an undefined left operand is reported before the right one runs.
+        check = '        if a is undefined:\n            return fallback(a, None)\n' \
+            if left_shape == SLOT and right_shape == CALL else ''
+        source = SPECIALIZED_TEMPLATE.format(left=operand(left_shape, 'left'), right=operand(right_shape, 'right'),
+                                             check=check, guard=guard)
+        namespace = {}
+        exec(compile(source, f'<specialized {OPERATOR_NAMES[op]}>', 'exec'), namespace)
+        FACTORIES[key] = namespace['factory']
+    return FACTORIES[key]
+
+def generic_factory(op, left, right):
+    """Return the generic closure of an operation, which applies the operator function to any operands."""
+    return lambda: op(left(), right())
+
+def cell(function, name):
+    """Return the closure cell through which a function reads its free variable `name`."""
+    return function.__closure__[function.__code__.co_freevars.index(name)]
+
+class Site:
+    """The inline cache of one binary operation node.
+
+    A site starts in a warm-up state that evaluates the operation generically while recording
+    whether every operand seen was an `int`. After `specialize_after` runs it rewrites itself:
+    into an int-specialized closure if only ints were seen, otherwise into the generic closure
+    for good. A specialized site whose guard fails falls back to the generic operator for that
+    run, and after `max_guard_failures` failures returns to the generic closure permanently.
+
+    The code running an operation does not look the implementation up on every call: it holds
+    it in a closure variable whose cell the site has linked, and a rewrite stores the new
+    implementation in every linked cell, so after warm-up a hot operation costs one call.
+
+    Attributes:
+        node (BinOp): The operation.
+        run (callable): The current implementation.
+        kind (str): 'warmup', 'generic' or the name of the specialization, e.g. 'int_add_slot_const'.
+        count (int): The number of warm-up runs so far.
+        guard_failures (int): The number of runs in which the specialized guard failed.
+    """
+    __slots__ = ('compiler', 'node', 'op', 'left', 'right', 'left_site', 'right_site', 'left_shape', 'left_operand',
+                 'right_shape', 'right_operand', 'run', 'cells', 'kind', 'count', 'ints', 'guard_failures')
+
+    def __init__(self, compiler, node, op, left, right):
+        self.compiler = compiler
+        self.node = node
+        self.op = op
+        self.left = left
+        self.right = right
+        self.left_site = compiler.node_sites.get(node.left)
+        self.right_site = compiler.node_sites.get(node.right)
+        self.left_shape, self.left_operand = self.shape(node.left)
+        self.right_shape, self.right_operand = self.shape(node.right)
+        self.run = self.warmup
+        self.cells = []
+        self.kind = 'warmup'
+        self.count = 0
+        self.ints = True
+        self.guard_failures = 0
+
+    def shape(self, node):
+        """Return the shape of an operand node and the value the specialized code binds for it."""
+        if isinstance(node, Var):
+            return SLOT, self.compiler.resolver.slots[node.value]
+        if isinstance(node, Num) and type(node.value) is int:
+            return CONST, node.value
+        return CALL, None
+
+    def link(self, function, name='run'):
+        """Make the free variable `name` of a function follow this site's implementation, and return the function."""
+        self.cells.append(cell(function, name))
+        return function
+
+    def rewrite(self, run):
+        """Replace the implementation, in the site and in every linked cell."""
+        self.run = run
+        for linked in self.cells:
+            linked.cell_contents = run
+
+    def bind(self, function):
+        """Link the operands of a new implementation that are binary operations to their sites."""
+        if self.left_site is not None:
+            self.left_site.link(function, 'left')
+        if self.right_site is not None:
+            self.right_site.link(function, 'right')
+        return function
+
+    def operands(self):
+        """Return what the left and right operands are bound to in the specialized code."""
+        left, right = self.left_operand, self.right_operand
+        if self.left_shape == CALL:
+            left = self.left_site.run if self.left_site is not None else self.left
+        if self.right_shape == CALL:
+            right = self.right_site.run if self.right_site is not None else self.right
+        return left, right
+
+    def warmup(self):
+        """Evaluate the operation generically, recording the operand types, and specialize when warm."""
+        a = self.left()
+        b = self.right()
+        if type(a) is not int or type(b) is not int:
+            self.ints = False
+        self.count += 1
+        if self.count >= self.compiler.specialize_after:
+            self.specialize()
+        return self.op(a, b)
+
+    def specialize(self):
+        """Replace the warm-up implementation with a specialized or a generic one."""
+        op = self.node.op.value
+        if self.ints and not (op == '/' and self.right_shape == CONST and self.right_operand == 0):
+            factory = specialized_factory(op, self.left_shape, self.right_shape)
+            left, right = self.operands()
+            self.rewrite(self.bind(factory(self.compiler.frame, left, right, self.fallback, UNDEFINED)))
+            self.kind = f'int_{OPERATOR_NAMES[op]}_{self.left_shape}_{self.right_shape}'
+            self.compiler.specialized += 1
+        else:
+            self.generalize()
+
+    def generalize(self):
+        """Switch to the generic implementation for good."""
+        left = self.left_site.run if self.left_site is not None else self.left
+        right = self.right_site.run if self.right_site is not None else self.right
+        self.rewrite(self.bind(generic_factory(self.op, left, right)))
+        self.kind = 'generic'
+
+    def fallback(self, a, b):
+        """Finish a run whose guard failed with the generic operator, giving up on the specialization if it keeps failing."""
+        self.guard_failures += 1
+        self.compiler.guard_failures += 1
+        if a is UNDEFINED:
+            raise NameError(f"Variable '{self.node.left.value}' not defined")
+        if b is UNDEFINED:
+            raise NameError(f"Variable '{self.node.right.value}' not defined")
+        if self.guard_failures >= self.compiler.max_guard_failures:
+            self.generalize()
+            self.compiler.deoptimized += 1
+        return self.op(a, b)
+
+class AdaptiveCompiler(Compiler):
+    """A closure compiler whose binary operations specialize themselves on the operand types they see.
+
+    Every `BinOp` gets a `Site` whose implementation starts generic and is rewritten at run time,
+    so hot operations on ints run as a single closure that reads its variables from frame slots,
+    checks their types and applies the operator inline, instead of one closure per operand plus
+    an operator call. Nested operations, assignments, prints and conditions are linked to their
+    operand's site and call its current implementation directly.
+
+    Attributes:
+        sites (list of Site): The sites of every compiled binary operation.
+        node_sites (dict): Maps each compiled `BinOp` node to its site.
+        specialize_after (int): The number of generic runs before a site specializes.
+        max_guard_failures (int): The number of guard failures after which a site stays generic.
+        specialized (int): The number of sites that specialized.
+        guard_failures (int): The number of guard failures over all sites.
+        deoptimized (int): The number of specialized sites that went back to the generic code.
+    """
+    def __init__(self, interpreter, resolver, frame, specialize_after=8, max_guard_failures=16):
+        super().__init__(interpreter, resolver, frame)
+        self.sites = []
+        self.node_sites = {}
+        self.specialize_after = specialize_after
+        self.max_guard_failures = max_guard_failures
+        self.specialized = 0
+        self.guard_failures = 0
+        self.deoptimized = 0
+
+    def compile_BinOp(self, node):
+        """Compile a binary operation into a call of its adaptive site."""
+        op = self.OPERATORS.get(node.op.value)
+        if op is None:
+            raise ValueError(f"Unsupported operator '{node.op.value}'")
+        site = Site(self, node, op, self.compile(node.left), self.compile(node.right))
+        self.sites.append(site)
+        self.node_sites[node] = site
+        run = site.run
+
+        def binop():
+            return run()
+        return site.link(binop)
+
+    def site(self, node):
+        """Compile an expression and return its site, or None if it is not a binary operation."""
+        self.compile(node)
+        return self.node_sites.get(node) if isinstance(node, BinOp) else None
+
+    def compile_Assign(self, node):
+        """Compile an assignment, running a binary operation on the right through its site."""
+        site = self.site(node.right)
+        if site is None:
+            return super().compile_Assign(node)
+        slot = self.resolver.slots[node.left.value]
+        frame = self.frame
+        run = site.run
+
+        def assign():
+            frame[slot] = new_value = run()
+            return new_value
+        return site.link(assign)
+
+    def compile_Print(self, node):
+        """Compile a print statement, running a binary operation through its site."""
+        site = self.site(node.value)
+        if site is None:
+            return super().compile_Print(node)
+        emit = self.interpreter.output.emit
+        run = site.run
+
+        def print_():
+            emit(run())
+        return site.link(print_)
+
+    def compile_If(self, node):
+        """Compile an if statement, running a binary operation condition through its site."""
+        site = self.site(node.condition)
+        if site is None:
+            return super().compile_If(node)
+        body = self.compile_block(node.body)
+        run = site.run
+
+        def if_():
+            if run():
+                return body()
+        return site.link(if_)
+
+    def compile_While(self, node):
+        """Compile a while loop, running a binary operation condition through its site."""
+        site = self.site(node.condition)
+        if site is None:
+            return super().compile_While(node)
+        body = tuple(self.compile(n) for n in node.body)
+        assigned = self.resolver.block_slots[node]
+        frame = self.frame
+        run = site.run
+
+        def loop():
+            while run():
+                fresh = [slot for slot in assigned if frame[slot] is UNDEFINED]
+                for statement in body:
+                    statement()
+                for slot in fresh:
+                    frame[slot] = UNDEFINED
+        return site.link(loop)
+
+    def stats(self):
+        """Return the specialization counters, including how many sites are in each state."""
+        kinds = {}
+        for site in self.sites:
+            kinds[site.kind] = kinds.get(site.kind, 0) + 1
+        return {
+            'sites': len(self.sites),
+            'specialized': self.specialized,
+            'guard_failures': self.guard_failures,
+            'deoptimized': self.deoptimized,
+            'kinds': kinds,
+        }
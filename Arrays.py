@@ -0,0 +1,82 @@
+try:
+    import numpy
+except ImportError:  # arrays are optional; scalar programs run without NumPy
+    numpy = None
+
+if numpy is not None:
+    class IntArray(numpy.ndarray):
+        """A one-dimensional array of 64-bit integers with the language's arithmetic semantics.
+
+        All engines evaluate `BinOp` with Python's operators, so arrays broadcast `+ - * /` and
+        the comparisons element-wise through NumPy, while scalar code keeps running on plain
+        ints. `/` is floor division and raises `ZeroDivisionError` when any divisor is zero,
+        as it does for scalars. Comparisons produce arrays of 0 and 1. An array used as a
+        condition is true when all its elements are non-zero.
+        Elements are 64-bit, so unlike scalars they wrap around on overflow.
+        """
+        def __floordiv__(self, other):
+            check_divisor(other)
+            return numpy.ndarray.__floordiv__(self, other)
+
+        def __rfloordiv__(self, other):
+            check_divisor(self)
+            return numpy.ndarray.__rfloordiv__(self, other)
+
+        def __eq__(self, other):
+            return numpy.ndarray.__eq__(self, other).astype(numpy.int64)
+
+        def __lt__(self, other):
+            return numpy.ndarray.__lt__(self, other).astype(numpy.int64)
+
+        def __gt__(self, other):
+            return numpy.ndarray.__gt__(self, other).astype(numpy.int64)
+
+        __hash__ = None
+
+        def __bool__(self):
+            return bool(self.view(numpy.ndarray).all())
+
+        def __str__(self):
+            values = self.tolist()
+            if not isinstance(values, list):
+                return str(values)
+            return '[' + ', '.join(str(value) for value in values) + ']'
+
+        def __repr__(self):
+            return f'IntArray({self})'
+
+def require_numpy():
+    """Raise an exception if NumPy, which array values are built on, is not installed."""
+    if numpy is None:
+        raise Exception("Array values require NumPy, which is not installed")
+
+def check_divisor(value):
+    """Raise ZeroDivisionError if a divisor, scalar or array, is or contains zero."""
+    if isinstance(value, numpy.ndarray):
+        if not value.view(numpy.ndarray).all():
+            raise ZeroDivisionError("integer division by zero in array")
+    elif value == 0:
+        raise ZeroDivisionError("integer division or modulo by zero")
+
+def array(values):
+    """Return an array holding a list of integers."""
+    require_numpy()
+    return numpy.array(values, dtype=numpy.int64).view(IntArray)
+
+def arange(start, stop):
+    """Return the array of the integers from `start` up to but not including `stop`."""
+    require_numpy()
+    return numpy.arange(start, stop, dtype=numpy.int64).view(IntArray)
+
+def index(value, position):
+    """Return the element of an array at an integer position, or the elements at an array of positions."""
+    if numpy is None or not isinstance(value, numpy.ndarray):
+        raise TypeError(f"Cannot index a value of type {type(value).__name__}")
+    if isinstance(position, numpy.ndarray):
+        positions = position.view(numpy.ndarray)
+        if len(positions) and (positions.min() < 0 or positions.max() >= len(value)):
+            raise IndexError("Array index out of range")
+        return value[positions]
+    if not 0 <= position < len(value):
+        raise IndexError(f"Array index {position} out of range")
+    return int(value[position])
@@ -0,0 +1,119 @@
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Lexer import Lexer
+from _Parser import Parser
+from Interperter import Interpreter
+from Cache import ProgramCache
+from Output import CollectorSink
+
+class ProgramResult:
+    """The outcome of running one program of a batch.
+
+    Attributes:
+        index (int): The position of the program in the batch.
+        output (str): Everything the program printed.
+        scope (dict): The final global scope.
+        error (str or None): The error that stopped the program, formatted as 'Type: message'.
+    """
+    __slots__ = ('index', 'output', 'scope', 'error')
+
+    def __init__(self, index, output, scope, error):
+        self.index = index
+        self.output = output
+        self.scope = scope
+        self.error = error
+
+    def to_dict(self):
+        """Return the result as a JSON-serializable dictionary."""
+        return {'index': self.index, 'output': self.output, 'scope': self.scope, 'error': self.error}
+
+    def __repr__(self):
+        return f'ProgramResult({self.index}, error={self.error!r})'
+
+def run_program(source, index=0, engine='tree', optimize=False, cache=None):
+    """Run a single program with its output captured and return its `ProgramResult`."""
+    sink = CollectorSink()
+    interpreter = None
+    error = None
+    try:
+        interpreter = Interpreter(Parser(Lexer(source)), engine=engine, cache=cache, optimize=optimize, output=sink)
+        interpreter.interpret()
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    scope = dict(interpreter.scopes[0]) if interpreter is not None else {}
+    return ProgramResult(index, sink.getvalue(), scope, error)
+
+_worker_cache = None
+_worker_options = {}
+
+def _init_worker(cache_size, cache_directory, engine, optimize):
+    """Set up the per-process program cache and run options of a pool worker."""
+    global _worker_cache, _worker_options
+    _worker_cache = ProgramCache(maxsize=cache_size, directory=cache_directory)
+    _worker_options = {'engine': engine, 'optimize': optimize}
+
+def _run_chunk(chunk):
+    """Run a chunk of (index, source) pairs in a worker and return their results."""
+    return [run_program(source, index, cache=_worker_cache, **_worker_options) for index, source in chunk]
+
+def run_batch(sources, workers=None, chunksize=1, ordered=True, engine='tree', optimize=False,
+              cache_size=128, cache_directory=None):
+    """Run many independent programs on a pool of worker processes.
+
+    Programs are sent to the workers in chunks of `chunksize`. Every worker keeps its own
+    `ProgramCache`, so programs repeated within a batch are parsed once per worker.
+
+    Args:
+        sources (iterable of str): The program sources.
+        workers (int, optional): The number of worker processes; defaults to the CPU count.
+        chunksize (int): The number of programs sent to a worker at once.
+        ordered (bool): Yield results in input order; otherwise yield them as chunks complete.
+        engine (str): The execution engine used to run each program.
+        optimize (bool): Whether to optimize each program before running it.
+        cache_size (int): The maximum number of parsed programs cached per worker.
+        cache_directory (str, optional): An on-disk cache directory shared by the workers.
+
+    Yields:
+        ProgramResult: One result per program.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    items = list(enumerate(sources))
+    chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache_size, cache_directory, engine, optimize)) as executor:
+        futures = [executor.submit(_run_chunk, chunk) for chunk in chunks]
+        for future in (futures if ordered else as_completed(futures)):
+            yield from future.result()
+
+def main(argv=None):
+    """Command-line entry point: run program files in parallel and print one JSON result per line."""
+    parser = argparse.ArgumentParser(description="Run many programs in parallel.")
+    parser.add_argument('files', nargs='+', help="program files to run")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--chunksize', type=int, default=1, help="programs sent to a worker at once")
+    parser.add_argument('--unordered', action='store_true', help="print results as they complete")
+    parser.add_argument('--engine', default='tree', help="execution engine")
+    parser.add_argument('--optimize', action='store_true', help="optimize programs before running them")
+    parser.add_argument('--cache-size', type=int, default=128, help="parsed programs cached per worker")
+    parser.add_argument('--cache-dir', default=None, help="on-disk program cache directory")
+    args = parser.parse_args(argv)
+
+    sources = []
+    for path in args.files:
+        with open(path) as f:
+            sources.append(f.read())
+    failed = False
+    for result in run_batch(sources, workers=args.workers, chunksize=args.chunksize, ordered=not args.unordered,
+                            engine=args.engine, optimize=args.optimize, cache_size=args.cache_size,
+                            cache_directory=args.cache_dir):
+        record = result.to_dict()
+        record['file'] = args.files[result.index]
+        print(json.dumps(record, default=str))
+        failed = failed or result.error is not None
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
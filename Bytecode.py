@@ -0,0 +1,174 @@
+from Resolver import Resolver
+
+LOAD_CONST = 0
+LOAD_SLOT = 1
+STORE_SLOT = 2
+ADD = 3
+SUB = 4
+MUL = 5
+FLOORDIV = 6
+EQ = 7
+GT = 8
+LT = 9
+JUMP = 10
+JUMP_IF_FALSE = 11
+ENTER_BLOCK = 12
+EXIT_BLOCK = 13
+PRINT = 14
+BUILD_ARRAY = 15  # pop `arg` element values and push the array of them
+BUILD_RANGE = 16  # pop a start and a stop and push the range array
+INDEX = 17        # pop an array and a position and push the element(s)
+
+OPNAMES = ['LOAD_CONST', 'LOAD_SLOT', 'STORE_SLOT', 'ADD', 'SUB', 'MUL', 'FLOORDIV', 'EQ', 'GT', 'LT',
+           'JUMP', 'JUMP_IF_FALSE', 'ENTER_BLOCK', 'EXIT_BLOCK', 'PRINT', 'BUILD_ARRAY', 'BUILD_RANGE', 'INDEX']
+
+BINARY_OPCODES = {'+': ADD, '-': SUB, '*': MUL, '/': FLOORDIV, '==': EQ, '>': GT, '<': LT}
+
+class Code:
+    """A compiled program: a flat instruction array plus its constant and name tables.
+
+    Attributes:
+        code (list of int): Alternating opcodes and arguments. Jump arguments are absolute
+                            offsets into this list.
+        consts (list): The constant values referenced by LOAD_CONST.
+        names (list of str): The variable name of each frame slot used by LOAD_SLOT and STORE_SLOT.
+        blocks (list of tuple): For each ENTER_BLOCK argument, the slots the block body assigns.
+    """
+    def __init__(self):
+        self.code = []
+        self.consts = []
+        self.names = []
+        self.blocks = []
+
+    def disassemble(self):
+        """Return a human-readable listing of the instructions."""
+        lines = []
+        for offset in range(0, len(self.code), 2):
+            op, arg = self.code[offset], self.code[offset + 1]
+            if op == LOAD_CONST:
+                detail = repr(self.consts[arg])
+            elif op in (LOAD_SLOT, STORE_SLOT):
+                detail = f'{arg} ({self.names[arg]})'
+            elif op == ENTER_BLOCK:
+                detail = ', '.join(self.names[slot] for slot in self.blocks[arg])
+            elif op == BUILD_ARRAY:
+                detail = str(arg)
+            elif op in (JUMP, JUMP_IF_FALSE):
+                detail = f'-> {arg}'
+            else:
+                detail = ''
+            lines.append(f'{offset:>6} {OPNAMES[op]:<14} {detail}'.rstrip())
+        return '\n'.join(lines)
+
+class BytecodeCompiler:
+    """Lower an AST into a `Code` object for the stack-based VM."""
+    def __init__(self):
+        """Initialize the compiler with an empty code object and constant index."""
+        self.output = Code()
+        self.const_index = {}
+        self.resolver = None
+
+    def compile(self, tree):
+        """Resolve the variables of a list of statement nodes, compile them and return the `Code` object."""
+        self.resolver = Resolver().resolve(tree)
+        self.output.names = self.resolver.names
+        self.visit(tree)
+        return self.output
+
+    def emit(self, op, arg=0):
+        """Append an instruction and return its offset."""
+        self.output.code.extend((op, arg))
+        return len(self.output.code) - 2
+
+    def patch(self, offset, target):
+        """Point the jump instruction at `offset` to `target`."""
+        self.output.code[offset + 1] = target
+
+    def const(self, value):
+        """Return the index of a constant, adding it to the constant table if needed."""
+        key = (type(value), value)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.output.consts)
+            self.output.consts.append(value)
+        return self.const_index[key]
+
+    def slot(self, var_name):
+        """Return the frame slot of a variable."""
+        return self.resolver.slots[var_name]
+
+    def visit(self, node):
+        """Dispatch to the node-specific compile method."""
+        if isinstance(node, list):
+            for n in node:
+                self.visit(n)
+            return
+        method_name = 'visit_' + type(node).__name__
+        visitor = getattr(self, method_name, self.no_visit_method)
+        visitor(node)
+
+    def no_visit_method(self, node):
+        """Handle undefined node types by raising an exception."""
+        raise Exception(f"No bytecode defined for {type(node).__name__}")
+
+    def visit_Num(self, node):
+        """Load the constant value of a Num node."""
+        self.emit(LOAD_CONST, self.const(node.value))
+
+    def visit_Var(self, node):
+        """Load the value of a variable."""
+        self.emit(LOAD_SLOT, self.slot(node.value))
+
+    def visit_BinOp(self, node):
+        """Evaluate both operands, then apply the operator to them."""
+        opcode = BINARY_OPCODES.get(node.op.value)
+        if opcode is None:
+            raise ValueError(f"Unsupported operator '{node.op.value}'")
+        self.visit(node.left)
+        self.visit(node.right)
+        self.emit(opcode)
+
+    def visit_Array(self, node):
+        """Evaluate the elements, then build the array."""
+        self.visit(node.elements)
+        self.emit(BUILD_ARRAY, len(node.elements))
+
+    def visit_Range(self, node):
+        """Evaluate the bounds, then build the range array."""
+        self.visit(node.start)
+        self.visit(node.stop)
+        self.emit(BUILD_RANGE)
+
+    def visit_Index(self, node):
+        """Evaluate the array and the position, then read the element(s)."""
+        self.visit(node.value)
+        self.visit(node.index)
+        self.emit(INDEX)
+
+    def visit_Assign(self, node):
+        """Evaluate the expression and store it in the variable."""
+        self.visit(node.right)
+        self.emit(STORE_SLOT, self.slot(node.left.value))
+
+    def visit_Print(self, node):
+        """Evaluate the expression and print it."""
+        self.visit(node.value)
+        self.emit(PRINT)
+
+    def visit_If(self, node):
+        """Skip the body when the condition is false."""
+        self.visit(node.condition)
+        jump = self.emit(JUMP_IF_FALSE)
+        self.visit(node.body)
+        self.patch(jump, len(self.output.code))
+
+    def visit_While(self, node):
+        """Run the body in a new scope while the condition holds, then jump back to the condition."""
+        start = len(self.output.code)
+        self.visit(node.condition)
+        jump = self.emit(JUMP_IF_FALSE)
+        self.emit(ENTER_BLOCK, len(self.output.blocks))
+        self.output.blocks.append(self.resolver.block_slots[node])
+        self.visit(node.body)
+        self.emit(EXIT_BLOCK)
+        self.emit(JUMP, start)
+        self.patch(jump, len(self.output.code))
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from Lexer import Lexer
+from _Parser import Parser
+from FlatAST import FlatProgram
+
+MAGIC = b'PLC1'
+
+class CacheEntry:
+    """A cached program: its parsed AST plus any artifacts compiled from it.
+
+    Attributes:
+        key (str): The content hash of the source text.
+        tree (list of AST): The parsed top-level statements.
+        artifacts (dict): Compiled forms of the program, keyed by name (e.g. 'bytecode').
+    """
+    __slots__ = ('key', 'tree', 'artifacts')
+
+    def __init__(self, key, tree):
+        self.key = key
+        self.tree = tree
+        self.artifacts = {}
+
+    def artifact(self, name, build):
+        """Return the artifact stored under `name`, building and storing it with `build()` on first use."""
+        if name not in self.artifacts:
+            self.artifacts[name] = build()
+        return self.artifacts[name]
+
+class ProgramCache:
+    """Cache parsed programs keyed by a content hash of their source text.
+
+    Entries live in a bounded in-memory LRU. When a directory is given, parsed programs are
+    also written there in their `FlatProgram` encoding, much like `.pyc` files, and loaded
+    from it on an in-memory miss instead of re-lexing and re-parsing the source.
+
+    Attributes:
+        maxsize (int): The maximum number of entries kept in memory.
+        directory (str or None): Where parsed programs are persisted, if anywhere.
+        hits (int): Lookups answered from memory.
+        disk_hits (int): Lookups answered from the on-disk store.
+        misses (int): Lookups that had to parse the source.
+        evictions (int): Entries dropped from memory to respect `maxsize`.
+        disk_writes (int): Programs written to the on-disk store.
+    """
+    def __init__(self, maxsize=128, directory=None):
+        if maxsize < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_writes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(text):
+        """Return the content hash identifying a source text."""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def entry(self, text, parse=None):
+        """Return the cache entry for a source text, parsing it on a miss.
+
+        Args:
+            text (str): The program source.
+            parse (callable, optional): Produces the AST on a miss. Defaults to parsing `text`
+                                        with a fresh `Lexer` and `Parser`.
+        """
+        key = self.key(text)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        tree = self._load(key)
+        if tree is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            tree = parse() if parse is not None else Parser(Lexer(text).tokenize()).parse()
+            self._store(key, tree)
+        entry = CacheEntry(key, tree)
+        self.entries[key] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def parse(self, text, parse=None):
+        """Return the parsed AST of a source text, using the cache."""
+        return self.entry(text, parse).tree
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'disk_writes': self.disk_writes,
+        }
+
+    def clear(self):
+        """Drop every in-memory entry; the on-disk store is kept."""
+        self.entries.clear()
+
+    def _path(self, key):
+        """Return the on-disk path of a cache key."""
+        return os.path.join(self.directory, key + '.plc')
+
+    def _load(self, key):
+        """Load a parsed program from the on-disk store, or return None if it is absent or unreadable."""
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if not data.startswith(MAGIC):
+            return None
+        try:
+            return FlatProgram.from_bytes(data[len(MAGIC):]).decode()
+        except (ValueError, EOFError, TypeError):
+            return None
+
+    def _store(self, key, tree):
+        """Write a parsed program to the on-disk store, replacing any existing file atomically."""
+        if self.directory is None:
+            return
+        data = MAGIC + FlatProgram.encode(tree).to_bytes()
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.disk_writes += 1
@@ -0,0 +1,161 @@
+import operator
+from AST import Num
+from Resolver import UNDEFINED
+import Arrays
+
+class Compiler:
+    """Compile an AST into a tree of pre-bound Python closures.
+
+    The tree is walked once; every node becomes a zero-argument callable that
+    evaluates it. Operators are resolved to functions from the `operator`
+    module at compile time, so running the program never dispatches on node
+    types or operator strings. Variables live in a flat frame indexed by the
+    slots assigned by a `Resolver`.
+    """
+    OPERATORS = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '/': operator.floordiv,
+        '==': operator.eq,
+        '>': operator.gt,
+        '<': operator.lt,
+    }
+
+    def __init__(self, interpreter, resolver, frame):
+        """Initialize the Compiler for a given interpreter.
+
+        Args:
+            interpreter (Interpreter): The interpreter whose output the compiled code uses.
+            resolver (Resolver): The resolver that assigned slots to the program's variables.
+            frame (list): The runtime frame the compiled code reads and writes variables in.
+        """
+        self.interpreter = interpreter
+        self.resolver = resolver
+        self.frame = frame
+
+    def compile(self, node):
+        """Compile a node, or a list of statement nodes, into a callable.
+
+        Returns:
+            A zero-argument function evaluating the node. For a list of statements the
+            function returns the list of the statements' results, like `Interpreter.visit`.
+        """
+        if isinstance(node, list):
+            return self.compile_block(node)
+        method_name = 'compile_' + type(node).__name__
+        compiler = getattr(self, method_name, self.no_compile_method)
+        return compiler(node)
+
+    def no_compile_method(self, node):
+        """Handle undefined node types by raising an exception."""
+        raise Exception(f"No compile method defined for {type(node).__name__}")
+
+    def compile_block(self, nodes):
+        """Compile a list of statements into a function returning the list of their results."""
+        statements = tuple(self.compile(n) for n in nodes)
+
+        def block():
+            return [statement() for statement in statements]
+        return block
+
+    def compile_Num(self, node):
+        """Compile a Num node into a function returning its constant value."""
+        value = node.value
+        return lambda: value
+
+    def compile_Var(self, node):
+        """Compile a Var node into a read of its frame slot."""
+        var_name = node.value
+        slot = self.resolver.slots[var_name]
+        frame = self.frame
+
+        def var():
+            value = frame[slot]
+            if value is UNDEFINED:
+                raise NameError(f"Variable '{var_name}' not defined")
+            return value
+        return var
+
+    def compile_BinOp(self, node):
+        """Compile a binary operation, binding the operator function and constant operands."""
+        op = self.OPERATORS.get(node.op.value)
+        if op is None:
+            raise ValueError(f"Unsupported operator '{node.op.value}'")
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        if isinstance(node.right, Num):
+            constant = node.right.value
+            return lambda: op(left(), constant)
+        return lambda: op(left(), right())
+
+    def compile_Array(self, node):
+        """Compile an array literal into a function building the array from its elements."""
+        elements = tuple(self.compile(element) for element in node.elements)
+        array = Arrays.array
+        return lambda: array([element() for element in elements])
+
+    def compile_Range(self, node):
+        """Compile a range into a function building the array of its integers."""
+        start = self.compile(node.start)
+        stop = self.compile(node.stop)
+        arange = Arrays.arange
+        return lambda: arange(start(), stop())
+
+    def compile_Index(self, node):
+        """Compile an index expression into a function reading the array element."""
+        value = self.compile(node.value)
+        index = self.compile(node.index)
+        read = Arrays.index
+        return lambda: read(value(), index())
+
+    def compile_Assign(self, node):
+        """Compile an assignment into a write of the target's frame slot."""
+        slot = self.resolver.slots[node.left.value]
+        value = self.compile(node.right)
+        frame = self.frame
+
+        def assign():
+            new_value = value()
+            frame[slot] = new_value
+            return new_value
+        return assign
+
+    def compile_While(self, node):
+        """Compile a while loop whose body runs in a new block scope on each iteration.
+
+        Slots assigned by the body that were undefined when an iteration started are reset
+        when it ends, which drops the names the iteration introduced.
+        """
+        condition = self.compile(node.condition)
+        body = tuple(self.compile(n) for n in node.body)
+        assigned = self.resolver.block_slots[node]
+        frame = self.frame
+
+        def loop():
+            while condition():
+                fresh = [slot for slot in assigned if frame[slot] is UNDEFINED]
+                for statement in body:
+                    statement()
+                for slot in fresh:
+                    frame[slot] = UNDEFINED
+        return loop
+
+    def compile_If(self, node):
+        """Compile an if statement returning the results of its body when the condition holds."""
+        condition = self.compile(node.condition)
+        body = self.compile_block(node.body)
+
+        def if_():
+            if condition():
+                return body()
+        return if_
+
+    def compile_Print(self, node):
+        """Compile a print statement."""
+        value = self.compile(node.value)
+        emit = self.interpreter.output.emit
+
+        def print_():
+            emit(value())
+        return print_
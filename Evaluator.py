@@ -0,0 +1,243 @@
+from AST import BinOp, Num, Var, Assign, Print, If, While, Array, Range, Index, Function, Return, Call, Global
+from Functions import Frame
+import Arrays
+
+# Work-stack instructions of the `StackEvaluator`.
+EXEC = 0        # execute a statement node
+EVAL = 1        # evaluate an expression node and push its value
+APPLY = 2       # pop two operands and push the result of a BinOp node's operator
+STORE = 3       # pop a value and assign it to an Assign node's variable
+EMIT = 4        # pop a value and print it
+BRANCH = 5      # pop an if condition and schedule the body when it is true
+LOOP = 6        # pop a while condition and schedule an iteration when it is true
+EXIT_SCOPE = 7  # leave the scope of a finished loop iteration
+BUILD = 8       # pop the element values of an Array or Range node and push the array
+INDEX = 9       # pop an array and a position and push the element of an Index node
+CALL = 10       # pop the arguments of a Call node and start the call, or push its memoized result
+RETURN = 11     # pop the value of a Return node (None for a bare return or the end of a body) and return it
+DISCARD = 12    # pop and drop the result of a call statement
+
+class StackEvaluator:
+    """Run a program with an explicit work stack instead of recursive `visit` calls.
+
+    Pending work is a stack of (instruction, node) pairs and intermediate results live on a
+    value stack, so arbitrarily deep expressions and blocks are evaluated without consuming
+    Python frames, in time and memory linear in the size of the program. Variables live in the
+    interpreter's scopes and printed values go to its output sink, with the same semantics as
+    the tree-walking engine.
+
+    Function calls do not consume Python frames either. A call pushes a `Frame` and replaces
+    the interpreter's scopes with two: the variables of the outermost caller, which the body
+    reads and assigns only through names it declares `global`, and a new scope holding the
+    parameters and locals. A return restores the caller's scopes and drops the rest of the
+    body from the work stack, so recursion depth is only limited by memory.
+
+    Attributes:
+        interpreter (Interpreter): Supplies the scopes, the functions and the output sink.
+    """
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def run(self, tree):
+        """Execute a list of statement nodes."""
+        self.execute([(EXEC, node) for node in reversed(tree)])
+
+    def evaluate(self, node):
+        """Evaluate an expression node and return its value."""
+        return self.execute([(EVAL, node)]).pop()
+
+    def execute(self, work):
+        """Run the instructions of a work stack and return the value stack."""
+        values = []
+        for _ in self.steps(work, values):
+            pass
+        return values
+
+    def steps(self, work, values):
+        """Run the instructions of a work stack as a generator that yields once per step.
+
+        A step is a statement other than `while`, or a `while` condition check, including the
+        statements and loops of called function bodies. Closing the generator part-way leaves
+        the scopes as they were outside the calls in progress, as an error does.
+
+        Args:
+            work (list of tuple): The (instruction, node) pairs to run, the next one last.
+            values (list): The value stack, which receives the results of the work.
+        """
+        interpreter = self.interpreter
+        scopes = interpreter.scopes
+        functions = interpreter.functions
+        emit = interpreter.output.emit
+        frames = []
+        push = work.append
+        pop = work.pop
+        push_value = values.append
+        pop_value = values.pop
+        try:
+            while work:
+                instruction, node = pop()
+                if instruction == EVAL:
+                    node_type = type(node)
+                    if node_type is Num:
+                        push_value(node.value)
+                    elif node_type is Var:
+                        push_value(self.lookup(node.value))
+                    elif node_type is BinOp:
+                        push((APPLY, node))
+                        push((EVAL, node.right))
+                        push((EVAL, node.left))
+                    elif node_type is Call:
+                        push((CALL, node))
+                        for arg in reversed(node.args):
+                            push((EVAL, arg))
+                    elif node_type is Index:
+                        push((INDEX, node))
+                        push((EVAL, node.index))
+                        push((EVAL, node.value))
+                    elif node_type is Array:
+                        push((BUILD, node))
+                        for element in reversed(node.elements):
+                            push((EVAL, element))
+                    elif node_type is Range:
+                        push((BUILD, node))
+                        push((EVAL, node.stop))
+                        push((EVAL, node.start))
+                    else:
+                        raise Exception(f"No evaluation defined for {node_type.__name__}")
+                elif instruction == APPLY:
+                    right = pop_value()
+                    left = pop_value()
+                    push_value(self.apply(node.op.value, left, right))
+                elif instruction == EXEC:
+                    node_type = type(node)
+                    if node_type is not While:
+                        yield
+                    if node_type is Assign:
+                        push((STORE, node))
+                        push((EVAL, node.right))
+                    elif node_type is Print:
+                        push((EMIT, node))
+                        push((EVAL, node.value))
+                    elif node_type is If:
+                        push((BRANCH, node))
+                        push((EVAL, node.condition))
+                    elif node_type is While:
+                        push((LOOP, node))
+                        push((EVAL, node.condition))
+                    elif node_type is Return:
+                        push((RETURN, node))
+                        if node.value is not None:
+                            push((EVAL, node.value))
+                    elif node_type is Call:
+                        push((DISCARD, node))
+                        push((EVAL, node))
+                    elif node_type is Function:
+                        interpreter.define(node)
+                    elif node_type is Global:
+                        pass  # the declared names are in `Function.globals`
+                    else:
+                        raise Exception(f"No execution defined for {node_type.__name__}")
+                elif instruction == STORE:
+                    name = node.left.value
+                    if frames and name in frames[-1].function.globals:
+                        scopes[0][name] = pop_value()
+                    else:
+                        scopes[-1][name] = pop_value()
+                elif instruction == EMIT:
+                    emit(pop_value())
+                elif instruction == BRANCH:
+                    if pop_value():
+                        for statement in reversed(node.body):
+                            push((EXEC, statement))
+                elif instruction == LOOP:
+                    yield
+                    if pop_value():
+                        interpreter.enter_scope()
+                        push((LOOP, node))
+                        push((EVAL, node.condition))
+                        push((EXIT_SCOPE, node))
+                        for statement in reversed(node.body):
+                            push((EXEC, statement))
+                elif instruction == EXIT_SCOPE:
+                    interpreter.exit_scope()
+                elif instruction == CALL:
+                    function = functions.get(node.name)
+                    if function is None:
+                        raise NameError(f"Function '{node.name}' not defined")
+                    count = len(node.args)
+                    if count != len(function.params):
+                        raise Exception(f"Function '{node.name}' takes {len(function.params)} arguments but {count} were given")
+                    args = tuple(values[len(values) - count:])
+                    del values[len(values) - count:]
+                    function.calls += 1
+                    if function.pure is None:
+                        function.analyze(functions)
+                    key = function.key(args)
+                    if key is not None:
+                        memo = function.memo
+                        if key in memo:
+                            function.hits += 1
+                            memo.move_to_end(key)
+                            push_value(memo[key])
+                            continue
+                        function.misses += 1
+                    frames.append(Frame(function, key, scopes, len(work), len(values)))
+                    caller = scopes[0] if len(frames) > 1 else scopes[-1]
+                    interpreter.scopes = scopes = [caller, dict(zip(function.params, args))]
+                    push((RETURN, None))
+                    for statement in reversed(function.body):
+                        push((EXEC, statement))
+                elif instruction == RETURN:
+                    value = pop_value() if node is not None and node.value is not None else None
+                    frame = frames.pop()
+                    del work[frame.work:]
+                    del values[frame.values:]
+                    interpreter.scopes = scopes = frame.scopes
+                    if frame.key is not None:
+                        frame.function.remember(frame.key, value)
+                    push_value(value)
+                elif instruction == DISCARD:
+                    pop_value()
+                elif instruction == INDEX:
+                    position = pop_value()
+                    push_value(Arrays.index(pop_value(), position))
+                elif instruction == BUILD:
+                    if type(node) is Range:
+                        stop = pop_value()
+                        push_value(Arrays.arange(pop_value(), stop))
+                    else:
+                        count = len(node.elements)
+                        elements = values[len(values) - count:]
+                        del values[len(values) - count:]
+                        push_value(Arrays.array(elements))
+        except BaseException:
+            if frames:
+                interpreter.scopes = frames[0].scopes  # leave the scopes as they were outside the calls
+            raise
+        return values
+
+    def lookup(self, name):
+        """Return the value of a variable from the innermost scope defining it."""
+        for scope in reversed(self.interpreter.scopes):
+            if name in scope:
+                return scope[name]
+        raise NameError(f"Variable '{name}' not defined")
+
+    @staticmethod
+    def apply(op, left, right):
+        """Apply a binary operator with the interpreter's semantics, including floor division for `/`."""
+        if op == '+':
+            return left + right
+        elif op == '-':
+            return left - right
+        elif op == '*':
+            return left * right
+        elif op == '/':
+            return left // right
+        elif op == '==':
+            return left == right
+        elif op == '>':
+            return left > right
+        elif op == '<':
+            return left < right
+        raise ValueError(f"Unsupported operator '{op}'")
@@ -0,0 +1,305 @@
+import marshal
+import sys
+from array import array
+from Token import Token
+from AST import BinOp, Num, Var, Assign, Print, If, While, Array, Range, Index, Function, Return, Call, Global
+import Arrays
+
+NUM = 0
+VAR = 1
+BINOP = 2
+ASSIGN = 3
+PRINT = 4
+IF = 5
+WHILE = 6
+ARRAY = 7
+RANGE = 8
+INDEX = 9
+FUNCTION = 10
+RETURN = 11
+CALL = 12
+GLOBAL = 13
+
+OPERATORS = ('+', '-', '*', '/', '==', '>', '<')
+OPERATOR_CODES = {op: code for code, op in enumerate(OPERATORS)}
+
+class FlatProgram:
+    """A program encoded as rows of parallel `array.array` columns instead of node objects.
+
+    Every node is one row. The meaning of the `a`, `b` and `c` columns depends on its kind:
+
+        NUM     a = index into `consts`
+        VAR     a = index into `names`
+        BINOP   a = left row, b = operator code (index into OPERATORS), c = right row
+        ASSIGN  a = index into `names`, b = expression row
+        PRINT   a = expression row
+        IF      a = condition row, b = first entry in `children`, c = number of body statements
+        WHILE   same as IF
+        ARRAY   b = first entry in `children`, c = number of elements
+        RANGE   a = start row, b = stop row
+        INDEX   a = array row, b = position row
+        FUNCTION a = index into `consts` of the (name, parameters) tuple, b = first entry in `children`,
+                c = number of body statements
+        RETURN  a = expression row, or -1 for a bare return
+        CALL    a = index into `names` of the function, b = first entry in `children`, c = number of arguments
+        GLOBAL  b = first entry in `children`, c = number of names, each a VAR row
+
+    Statement lists, array elements and call arguments are runs of row numbers in `children`; the program's
+    top-level statements are the run starting at `root_start` with `root_count` entries.
+
+    Attributes:
+        kinds (array): The node kind of each row.
+        a, b, c (array): The operand columns described above.
+        children (array): Row numbers of the statements in every block.
+        consts (list): Constant values referenced by NUM rows.
+        names (list of str): Variable and function names referenced by VAR, ASSIGN and CALL rows.
+        root_start (int): The offset of the top-level statements in `children`.
+        root_count (int): The number of top-level statements.
+    """
+    def __init__(self):
+        self.kinds = array('B')
+        self.a = array('i')
+        self.b = array('i')
+        self.c = array('i')
+        self.children = array('i')
+        self.consts = []
+        self.names = []
+        self.root_start = 0
+        self.root_count = 0
+        self._const_index = {}
+        self._name_index = {}
+
+    @classmethod
+    def encode(cls, tree):
+        """Encode a list of statement nodes produced by `Parser.parse` into a FlatProgram."""
+        program = cls()
+        program.root_start, program.root_count = program._add_block(tree)
+        return program
+
+    def to_bytes(self):
+        """Serialize the program into a compact byte string."""
+        columns = tuple(column.tobytes() for column in (self.kinds, self.a, self.b, self.c, self.children))
+        # Version 2 does not share repeated objects by reference, so equal programs give equal bytes.
+        return marshal.dumps((sys.byteorder, columns, self.consts, self.names, self.root_start, self.root_count), 2)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a program serialized with `to_bytes`."""
+        byteorder, columns, consts, names, root_start, root_count = marshal.loads(data)
+        program = cls()
+        for column, raw in zip((program.kinds, program.a, program.b, program.c, program.children), columns):
+            column.frombytes(raw)
+            if byteorder != sys.byteorder:
+                column.byteswap()
+        program.consts = consts
+        program.names = names
+        program.root_start = root_start
+        program.root_count = root_count
+        return program
+
+    def uses_functions(self):
+        """Return whether the program defines or calls a function, or returns from one."""
+        return any(kind >= FUNCTION for kind in self.kinds)
+
+    def __len__(self):
+        """Return the number of rows (nodes) in the program."""
+        return len(self.kinds)
+
+    def nbytes(self):
+        """Return the number of bytes used by the array columns."""
+        return sum(column.itemsize * len(column) for column in (self.kinds, self.a, self.b, self.c, self.children))
+
+    def _row(self, kind, a=0, b=0, c=0):
+        """Append a row and return its number."""
+        self.kinds.append(kind)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        return len(self.kinds) - 1
+
+    def _const(self, value):
+        """Return the index of a constant, adding it if needed."""
+        key = (type(value), value)
+        if key not in self._const_index:
+            self._const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self._const_index[key]
+
+    def _name(self, name):
+        """Return the index of a variable name, adding it if needed."""
+        if name not in self._name_index:
+            self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return self._name_index[name]
+
+    def _add_block(self, nodes):
+        """Encode a list of statements and return the (start, count) of its run in `children`."""
+        rows = [self._add(node) for node in nodes]
+        start = len(self.children)
+        self.children.extend(rows)
+        return start, len(rows)
+
+    def _add(self, node):
+        """Encode a single node and return its row number."""
+        if isinstance(node, Num):
+            return self._row(NUM, self._const(node.value))
+        if isinstance(node, Var):
+            return self._row(VAR, self._name(node.value))
+        if isinstance(node, BinOp):
+            op = OPERATOR_CODES.get(node.op.value)
+            if op is None:
+                raise ValueError(f"Unsupported operator '{node.op.value}'")
+            left = self._add(node.left)
+            right = self._add(node.right)
+            return self._row(BINOP, left, op, right)
+        if isinstance(node, Assign):
+            return self._row(ASSIGN, self._name(node.left.value), self._add(node.right))
+        if isinstance(node, Print):
+            return self._row(PRINT, self._add(node.value))
+        if isinstance(node, (If, While)):
+            condition = self._add(node.condition)
+            start, count = self._add_block(node.body)
+            return self._row(IF if isinstance(node, If) else WHILE, condition, start, count)
+        if isinstance(node, Array):
+            start, count = self._add_block(node.elements)
+            return self._row(ARRAY, 0, start, count)
+        if isinstance(node, Range):
+            return self._row(RANGE, self._add(node.start), self._add(node.stop))
+        if isinstance(node, Index):
+            return self._row(INDEX, self._add(node.value), self._add(node.index))
+        if isinstance(node, Function):
+            start, count = self._add_block(node.body)
+            return self._row(FUNCTION, self._const((node.name, tuple(node.params))), start, count)
+        if isinstance(node, Return):
+            return self._row(RETURN, -1 if node.value is None else self._add(node.value))
+        if isinstance(node, Call):
+            start, count = self._add_block(node.args)
+            return self._row(CALL, self._name(node.name), start, count)
+        if isinstance(node, Global):
+            start, count = self._add_block([Var(Token(Token.IDENTIFIER, name)) for name in node.names])
+            return self._row(GLOBAL, 0, start, count)
+        raise Exception(f"No flat encoding defined for {type(node).__name__}")
+
+    def decode(self):
+        """Rebuild the list of top-level statement nodes."""
+        return self._decode_block(self.root_start, self.root_count)
+
+    def _decode_block(self, start, count):
+        """Rebuild the statements of a run in `children`."""
+        return [self._decode(row) for row in self.children[start:start + count]]
+
+    def _decode(self, row):
+        """Rebuild the node stored in a row."""
+        kind = self.kinds[row]
+        a, b, c = self.a[row], self.b[row], self.c[row]
+        if kind == NUM:
+            return Num(Token(Token.INTEGER, self.consts[a]))
+        if kind == VAR:
+            return Var(Token(Token.IDENTIFIER, self.names[a]))
+        if kind == BINOP:
+            return BinOp(self._decode(a), Token.fixed(Token.OPERATOR, OPERATORS[b]), self._decode(c))
+        if kind == ASSIGN:
+            return Assign(Var(Token(Token.IDENTIFIER, self.names[a])), Token.fixed(Token.ASSIGN, '='), self._decode(b))
+        if kind == PRINT:
+            return Print(self._decode(a))
+        if kind == ARRAY:
+            return Array(self._decode_block(b, c))
+        if kind == RANGE:
+            return Range(self._decode(a), self._decode(b))
+        if kind == INDEX:
+            return Index(self._decode(a), self._decode(b))
+        if kind == FUNCTION:
+            name, params = self.consts[a]
+            return Function(name, list(params), self._decode_block(b, c))
+        if kind == RETURN:
+            return Return(None if a < 0 else self._decode(a))
+        if kind == CALL:
+            return Call(self.names[a], self._decode_block(b, c))
+        if kind == GLOBAL:
+            return Global([self.names[self.a[row]] for row in self.children[b:b + c]])
+        body = self._decode_block(b, c)
+        return If(self._decode(a), body) if kind == IF else While(self._decode(a), body)
+
+class FlatEvaluator:
+    """Execute a FlatProgram directly from its columns with an interpreter's scopes and semantics."""
+    def __init__(self, interpreter, program):
+        """Initialize the evaluator.
+
+        Args:
+            interpreter (Interpreter): The interpreter providing the scopes stack.
+            program (FlatProgram): The program to execute.
+        """
+        self.interpreter = interpreter
+        self.program = program
+
+    def run(self):
+        """Execute the top-level statements and return their results, like `Interpreter.visit`."""
+        return self.execute_block(self.program.root_start, self.program.root_count)
+
+    def execute_block(self, start, count):
+        """Execute the statements of a run in `children` and return their results."""
+        return [self.execute(row) for row in self.program.children[start:start + count]]
+
+    def execute(self, row):
+        """Execute the statement stored in a row."""
+        program = self.program
+        kind = program.kinds[row]
+        if kind >= FUNCTION:
+            raise Exception("Functions are not supported by the flat engine")
+        if kind == ASSIGN:
+            value = self.evaluate(program.b[row])
+            self.interpreter.current_scope()[program.names[program.a[row]]] = value
+            return value
+        if kind == PRINT:
+            self.interpreter.output.emit(self.evaluate(program.a[row]))
+            return None
+        if kind == IF:
+            if self.evaluate(program.a[row]):
+                return self.execute_block(program.b[row], program.c[row])
+            return None
+        if kind == WHILE:
+            condition, start, count = program.a[row], program.b[row], program.c[row]
+            while self.evaluate(condition):
+                self.interpreter.enter_scope()
+                self.execute_block(start, count)
+                self.interpreter.exit_scope()
+            return None
+        return self.evaluate(row)
+
+    def evaluate(self, row):
+        """Evaluate the expression stored in a row."""
+        program = self.program
+        kind = program.kinds[row]
+        if kind >= FUNCTION:
+            raise Exception("Functions are not supported by the flat engine")
+        if kind == NUM:
+            return program.consts[program.a[row]]
+        if kind == VAR:
+            var_name = program.names[program.a[row]]
+            for scope in reversed(self.interpreter.scopes):
+                if var_name in scope:
+                    return scope[var_name]
+            raise NameError(f"Variable '{var_name}' not defined")
+        if kind == ARRAY:
+            start = program.b[row]
+            return Arrays.array([self.evaluate(element) for element in program.children[start:start + program.c[row]]])
+        if kind == RANGE:
+            return Arrays.arange(self.evaluate(program.a[row]), self.evaluate(program.b[row]))
+        if kind == INDEX:
+            return Arrays.index(self.evaluate(program.a[row]), self.evaluate(program.b[row]))
+        left = self.evaluate(program.a[row])
+        right = self.evaluate(program.c[row])
+        op = program.b[row]
+        if op == 0:
+            return left + right
+        elif op == 1:
+            return left - right
+        elif op == 2:
+            return left * right
+        elif op == 3:
+            return left // right
+        elif op == 4:
+            return left == right
+        elif op == 5:
+            return left > right
+        return left < right
@@ -0,0 +1,210 @@
+from collections import OrderedDict
+from AST import BinOp, Assign, Print, If, While, Array, Range, Index, Function, Return, Call, Global
+from Optimizer import variables, has_call
+
+MEMO_SIZE = 1024  # the default number of results each pure function remembers
+
+def calls(node, names=None):
+    """Return the set of function names called anywhere in a node or a list of nodes."""
+    if names is None:
+        names = set()
+    if isinstance(node, list):
+        for n in node:
+            calls(n, names)
+    elif isinstance(node, Call):
+        names.add(node.name)
+        calls(node.args, names)
+    elif isinstance(node, BinOp):
+        calls(node.left, names)
+        calls(node.right, names)
+    elif isinstance(node, Assign):
+        calls(node.right, names)
+    elif isinstance(node, (Print, Return)):
+        if node.value is not None:
+            calls(node.value, names)
+    elif isinstance(node, (If, While)):
+        calls(node.condition, names)
+        calls(node.body, names)
+    elif isinstance(node, Array):
+        calls(node.elements, names)
+    elif isinstance(node, Range):
+        calls(node.start, names)
+        calls(node.stop, names)
+    elif isinstance(node, Index):
+        calls(node.value, names)
+        calls(node.index, names)
+    return names
+
+def uses_functions(tree):
+    """Return whether a list of statements defines or calls a function."""
+    return any(isinstance(node, Function) for node in tree) or has_call(tree)
+
+def free_reads(nodes, assigned, names=None):
+    """Return the variables a list of statements may read before assigning them.
+
+    Args:
+        nodes (list of AST): The statements.
+        assigned (set of str): The variables certainly assigned before the statements run; updated
+                               with those the statements certainly assign.
+    """
+    if names is None:
+        names = set()
+    for node in nodes:
+        if isinstance(node, Assign):
+            names |= variables(node.right) - assigned
+            assigned.add(node.left.value)
+        elif isinstance(node, (Print, Return)):
+            if node.value is not None:
+                names |= variables(node.value) - assigned
+        elif isinstance(node, (If, While)):
+            names |= variables(node.condition) - assigned
+            free_reads(node.body, set(assigned), names)
+        else:
+            names |= variables(node) - assigned
+    return names
+
+def assigns(nodes, names=None):
+    """Return the set of variable names assigned anywhere in a list of statements."""
+    if names is None:
+        names = set()
+    for node in nodes:
+        if isinstance(node, Assign):
+            names.add(node.left.value)
+        elif isinstance(node, (If, While)):
+            assigns(node.body, names)
+    return names
+
+def declared_globals(nodes, names=None):
+    """Return the set of names declared `global` anywhere in a list of statements."""
+    if names is None:
+        names = set()
+    for node in nodes:
+        if isinstance(node, Global):
+            names.update(node.names)
+        elif isinstance(node, (If, While)):
+            declared_globals(node.body, names)
+    return names
+
+def prints(nodes):
+    """Return whether a list of statements contains a print statement, including nested blocks."""
+    for node in nodes:
+        if isinstance(node, Print):
+            return True
+        if isinstance(node, (If, While)) and prints(node.body):
+            return True
+    return False
+
+class Function:
+    """A defined function, with the memo table of its results.
+
+    Assignments in the body create locals, except to the names the body declares `global`,
+    which are assigned in the caller's variables.
+
+    A function is pure when its body has no `print`, assigns no global, only reads its
+    parameters and variables it has certainly assigned before, and only calls pure functions
+    (itself included). Purity is decided on the first call, against the functions defined at
+    that time, and decided again when a function is redefined. Calls of a pure function with
+    integer arguments are memoized in a bounded LRU table keyed by the arguments.
+
+    Attributes:
+        node (AST.Function): The definition.
+        name (str): The name of the function.
+        params (list of str): The names of the parameters.
+        body (list of AST): The statements of the body.
+        globals (frozenset of str): The names the body declares `global`.
+        locals (tuple of str): The names the body assigns that are neither parameters nor globals.
+        pure (bool or None): Whether calls can be memoized, or None until it is decided.
+        memo (OrderedDict): Maps argument tuples to results, least recently used first.
+        maxsize (int): The number of results the memo keeps; 0 disables memoization.
+        calls (int): The number of calls.
+        hits (int): The number of calls answered from the memo.
+        misses (int): The number of memoizable calls that ran the body.
+        evictions (int): The number of results dropped from the memo.
+    """
+    def __init__(self, node, maxsize=MEMO_SIZE):
+        self.node = node
+        self.name = node.name
+        self.params = node.params
+        self.body = node.body
+        self.globals = frozenset(declared_globals(node.body))
+        self.locals = tuple(sorted(assigns(node.body) - set(node.params) - self.globals))
+        self.pure = None
+        self.memo = OrderedDict()
+        self.maxsize = maxsize
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def analyze(self, functions):
+        """Decide whether the function is pure, given the defined functions by name."""
+        if self.pure is not None:
+            return self.pure
+        pending = [self]
+        seen = {self.name}
+        pure = True
+        while pending and pure:
+            function = pending.pop()
+            if (prints(function.body) or assigns(function.body) & function.globals
+                    or free_reads(function.body, set(function.params))):
+                pure = False
+                break
+            for name in calls(function.body):
+                callee = functions.get(name)
+                if callee is None or callee.pure is False:
+                    pure = False
+                    break
+                if name not in seen and callee.pure is None:
+                    seen.add(name)
+                    pending.append(callee)
+        self.pure = pure
+        return pure
+
+    def key(self, args):
+        """Return the memo key of a call with the argument values `args`, or None if the call cannot be memoized."""
+        if not self.pure or not self.maxsize:
+            return None
+        for arg in args:
+            if type(arg) is not int:
+                return None
+        return args
+
+    def remember(self, key, value):
+        """Store the result of a memoized call, evicting the least recently used one when full."""
+        memo = self.memo
+        memo[key] = value
+        if len(memo) > self.maxsize:
+            memo.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Return the call and memo counters as a dictionary."""
+        lookups = self.hits + self.misses
+        return {
+            'pure': bool(self.pure),
+            'calls': self.calls,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self.memo),
+            'evictions': self.evictions,
+        }
+
+class Frame:
+    """The state of a function call in progress on the `StackEvaluator`.
+
+    Attributes:
+        function (Function): The called function.
+        key (tuple or None): The memo key the result is stored under, or None.
+        scopes (list of dict): The interpreter's scopes when the call was made, restored on return.
+        work (int): The length of the work stack when the body was scheduled.
+        values (int): The length of the value stack when the body was scheduled.
+    """
+    __slots__ = ('function', 'key', 'scopes', 'work', 'values')
+
+    def __init__(self, function, key, scopes, work, values):
+        self.function = function
+        self.key = key
+        self.scopes = scopes
+        self.work = work
+        self.values = values
@@ -1,18 +1,74 @@
 from _Parser import Parser
 from Lexer import Lexer
+from Compiler import Compiler
+from Adaptive import AdaptiveCompiler
+from Resolver import Resolver
+from Bytecode import BytecodeCompiler
+from VM import VM
+from FlatAST import FlatProgram, FlatEvaluator
+from Optimizer import Optimizer, CountedLoop
+from Evaluator import StackEvaluator
+from Functions import Function, MEMO_SIZE, uses_functions
+from Tracing import LoopTracer
+from Output import StdoutSink
+import Transpiler
+import Arrays
 
 class Interpreter:
-    def __init__(self, parser):
+    def __init__(self, parser, engine='tree', cache=None, optimize=False, output=None):
         """Initialize the Interpreter with a parser instance.
         
         Args:
             parser (Parser): An instance of a parser that produces an AST from source code.
+            engine (str): The execution engine used by `interpret`: 'tree' walks the AST with
+                          `visit`, 'closure' compiles it into pre-bound closures first,
+                          'bytecode' compiles it for the stack-based `VM`, 'flat' runs
+                          its `FlatProgram` array encoding, 'python' transpiles it to
+                          Python source executed by CPython, 'iterative' evaluates it
+                          with an explicit work stack, so nesting depth is not limited
+                          by the Python recursion limit, and 'adaptive' compiles it into
+                          closures whose operators specialize on the types they see.
+                          Programs that define or call functions run on 'tree' unless
+                          the engine is 'iterative'.
+            cache (ProgramCache, optional): A cache of parsed programs and compiled artifacts keyed by
+                                            the source text, shared between interpreters.
+            optimize (bool): Whether to run the `Optimizer` (constant folding, dead-branch
+                             elimination and loop optimizations) over the AST before executing it.
+            output (optional): The sink receiving printed values through its `emit` method, such as a
+                               `BufferedSink`, `CollectorSink` or `CallbackSink` from `Output`.
+                               Defaults to a `StdoutSink`, which prints each value immediately.
         
         Attributes:
             scopes (list of dict): A list of dictionary objects, each representing a variable scope.
                                    Initializes with a single global scope.
+            nodes_removed (int): The number of AST nodes the optimizer removed from the last program.
+            optimizer (Optimizer or None): The optimizer that processed the last program, with its statistics.
+            adaptive (AdaptiveCompiler or None): The compiler of the last program run on the 'adaptive'
+                                                 engine, with its specialization counters.
+            tracer (LoopTracer or None): Compiles hot while loops of the 'tree' engine into traces;
+                                         None runs every loop with `visit` only.
+            counted_loops (dict or None): Maps each while loop of the program the 'tree' engine is running
+                                          to its `CountedLoop`, or None if it has no closed form; cleared
+                                          for every program. Set to None to interpret every loop.
+            functions (dict): Maps the name of each defined function to its `Function`.
+            memo_size (int): The number of results each pure function memoizes; 0 disables memoization.
+            output: The sink receiving printed values.
         """
+        if not hasattr(self, 'run_' + engine):
+            raise ValueError(f"Unknown execution engine '{engine}'")
         self.parser = parser
+        self.engine = engine
+        self.cache = cache
+        self.cache_entry = None
+        self.optimize = optimize
+        self.nodes_removed = 0
+        self.optimizer = None
+        self.adaptive = None
+        self.tracer = LoopTracer(self)
+        self.counted_loops = {}
+        self.functions = {}
+        self.memo_size = MEMO_SIZE
+        self.output = output if output is not None else StdoutSink()
         self.scopes = [{}]  
 
     def current_scope(self):
@@ -84,6 +140,18 @@ class Interpreter:
         else:
             raise ValueError(f"Unsupported operator '{node.op.value}'")
 
+    def visit_Array(self, node):
+        """Evaluate the elements of an array literal and build the array."""
+        return Arrays.array([self.visit(element) for element in node.elements])
+
+    def visit_Range(self, node):
+        """Build the array of the integers from the start of a range up to its stop."""
+        return Arrays.arange(self.visit(node.start), self.visit(node.stop))
+
+    def visit_Index(self, node):
+        """Return the element, or elements, of an array at the given position."""
+        return Arrays.index(self.visit(node.value), self.visit(node.index))
+
     def visit_Assign(self, node):
         """Execute an assignment by updating the current scope with the new value."""
         var_name = node.left.value
@@ -92,7 +160,20 @@ class Interpreter:
         return new_value
 
     def visit_While(self, node):
-        """Execute a while loop by repeatedly checking the condition and executing the body in a new scope."""
+        """Execute a while loop by repeatedly checking the condition and executing the body in a new scope.
+
+        A loop with a closed form (see `CountedLoop`) is finished without iterating. Otherwise, once the
+        loop has run `tracer.threshold` iterations, the tracer may finish it with a compiled trace.
+        """
+        counted_loops = self.counted_loops
+        if counted_loops is not None:
+            if node not in counted_loops:
+                counted_loops[node] = CountedLoop.analyze(node)
+            counted = counted_loops[node]
+            if counted is not None and counted.run(self):
+                return
+        tracer = self.tracer
+        iterations = 0
         while True:
             condition_result = self.visit(node.condition)
             if not condition_result:
@@ -100,6 +181,10 @@ class Interpreter:
             self.enter_scope()
             self.visit(node.body)
             self.exit_scope()
+            if tracer is not None:
+                iterations += 1
+                if iterations >= tracer.threshold and tracer.run(node):
+                    break
 
     def visit_If(self, node):
         """Execute an if statement by evaluating the condition and executing the body if true."""
@@ -107,15 +192,213 @@ class Interpreter:
         if condition_result:
             return self.visit(node.body)
 
+    def visit_Function(self, node):
+        """Define the function of a definition statement."""
+        self.define(node)
+
+    def visit_Call(self, node):
+        """Call a function on the `StackEvaluator`, so the body and any recursion do not use Python frames."""
+        return StackEvaluator(self).evaluate(node)
+
+    def define(self, node):
+        """Define or redefine a function.
+
+        Every purity decision is reconsidered on the next call, since it may depend on the new
+        definition, and a redefinition also clears every memo.
+        """
+        redefined = node.name in self.functions
+        for function in self.functions.values():
+            function.pure = None
+            if redefined:
+                function.memo.clear()
+        self.functions[node.name] = Function(node, self.memo_size)
+
+    def function_stats(self):
+        """Return the call and memo counters of every defined function, by name."""
+        return {name: function.stats() for name, function in self.functions.items()}
+
     def visit_Print(self, node):
-        """Print the result of evaluating the expression contained in a Print node."""
-        print(self.visit(node.value))
+        """Send the result of evaluating the expression contained in a Print node to the output sink."""
+        self.output.emit(self.visit(node.value))
 
-    def interpret(self):
-        """Interpret the entire program by parsing and then visiting the AST."""
-        tree = self.parser.parse()
+    def run_tree(self, tree):
+        """Execute the AST by walking it with `visit`, dropping the loop analyses of the previous program."""
+        if self.tracer is not None:
+            self.tracer.loops.clear()
+        if self.counted_loops is not None:
+            self.counted_loops.clear()
         return self.visit(tree)
 
+    def run_iterative(self, tree):
+        """Execute the AST with the explicit-stack `StackEvaluator` instead of recursive visits."""
+        StackEvaluator(self).run(tree)
+
+    def run_closure(self, tree):
+        """Execute the AST by compiling it into closures over a slot frame and calling the result.
+
+        The frame is filled from the scopes stack before the run and its variables are written
+        back to the current scope afterwards. Programs that define or call functions run on the
+        tree engine instead.
+        """
+        if uses_functions(tree):
+            return self.run_tree(tree)
+        resolver = Resolver().resolve(tree)
+        frame = resolver.new_frame(self.scopes)
+        try:
+            return Compiler(self, resolver, frame).compile(tree)()
+        finally:
+            resolver.store_frame(frame, self.current_scope())
+
+    def run_adaptive(self, tree):
+        """Execute the AST like `run_closure`, with binary operations that specialize themselves while running.
+
+        Programs that define or call functions run on the tree engine instead.
+        """
+        if uses_functions(tree):
+            return self.run_tree(tree)
+        resolver = Resolver().resolve(tree)
+        frame = resolver.new_frame(self.scopes)
+        self.adaptive = AdaptiveCompiler(self, resolver, frame)
+        try:
+            return self.adaptive.compile(tree)()
+        finally:
+            resolver.store_frame(frame, self.current_scope())
+
+    def run_bytecode(self, tree):
+        """Execute the AST by compiling it to bytecode and running it on the VM.
+
+        The VM does not keep per-statement results, so this returns None. Programs that define
+        or call functions run on the tree engine instead.
+        """
+        if uses_functions(tree):
+            return self.run_tree(tree)
+        VM(self).run(self.artifact('bytecode', lambda: BytecodeCompiler().compile(tree)))
+
+    def run_flat(self, tree):
+        """Execute a program in its flat array encoding, encoding the AST first if needed.
+
+        Programs that define or call functions run on the tree engine instead.
+        """
+        if isinstance(tree, FlatProgram):
+            if tree.uses_functions():
+                return self.run_tree(tree.decode())
+        elif uses_functions(tree):
+            return self.run_tree(tree)
+        else:
+            source = tree
+            tree = self.artifact('flat', lambda: FlatProgram.encode(source))
+        return FlatEvaluator(self, tree).run()
+
+    def run_python(self, tree):
+        """Execute the AST by transpiling it to a Python function and calling it.
+
+        Programs whose generated source CPython cannot compile (such as extremely deep
+        expressions) run on the closure engine instead, and programs that define or call
+        functions on the tree engine.
+        """
+        if uses_functions(tree):
+            return self.run_tree(tree)
+        source, names = self.artifact('python', lambda: Transpiler.transpile(tree))
+        try:
+            Transpiler.load(source)
+        except (SyntaxError, RecursionError, MemoryError):
+            return self.run_closure(tree)
+        scope = {}
+        for layer in self.scopes:
+            scope.update(layer)
+        try:
+            Transpiler.run(source, names, scope, self.output.emit)
+        finally:
+            current_scope = self.current_scope()
+            for name in names.values():
+                if name in scope:
+                    current_scope[name] = scope[name]
+
+    def artifact(self, name, build):
+        """Return a compiled form of the program being interpreted, reusing the cached one when possible."""
+        if self.cache_entry is None:
+            return build()
+        if self.optimize:
+            name += ':optimized'
+        return self.cache_entry.artifact(name, build)
+
+    def optimized(self, tree):
+        """Run the optimizer over a parsed program and record how many nodes it removed."""
+        def build():
+            optimizer = Optimizer(loops=True)
+            return optimizer.optimize(tree), optimizer
+        tree, self.optimizer = self.artifact('tree', build)
+        self.nodes_removed = self.optimizer.removed
+        return tree
+
+    def discard_temporaries(self):
+        """Remove the temporaries introduced by the loop optimizations from every scope."""
+        if self.optimizer is not None:
+            for scope in self.scopes:
+                for name in self.optimizer.temporaries:
+                    scope.pop(name, None)
+
+    def parse(self):
+        """Parse the program, going through the program cache when one is configured."""
+        text = getattr(self.parser.lexer, 'text', None)
+        if self.cache is None or not isinstance(text, str):
+            return self.parser.parse()
+        self.cache_entry = self.cache.entry(text, self.parser.parse)
+        return self.cache_entry.tree
+
+    def defined_names(self):
+        """Return the names of the variables defined in any scope."""
+        names = set()
+        for scope in self.scopes:
+            names.update(scope)
+        return names
+
+    def int_names(self):
+        """Return the names of the variables that currently hold integers."""
+        values = {}
+        for scope in self.scopes:
+            values.update(scope)
+        return {name for name, value in values.items() if type(value) is int}
+
+    def interpret_stream(self):
+        """Interpret the program one top-level statement at a time, running each as soon as it is parsed.
+
+        Only the statement being executed is held in memory, so combined with a `StreamLexer`
+        the memory used is bounded by the largest top-level statement rather than the program.
+        Each statement runs on the selected engine; the program cache is not used. With `optimize`,
+        each statement is optimized knowing the variables the statements before it defined, so
+        loop-invariant expressions over them can still be hoisted.
+
+        Returns:
+            int: The number of top-level statements executed.
+        """
+        run = getattr(self, 'run_' + self.engine)
+        count = 0
+        try:
+            for statement in self.parser.statements():
+                tree = [statement]
+                if self.optimize:
+                    self.optimizer = Optimizer(loops=True)
+                    tree = self.optimizer.optimize(tree, self.defined_names(), self.int_names())
+                run(tree)
+                self.discard_temporaries()
+                count += 1
+        finally:
+            self.output.flush()
+        return count
+
+    def interpret(self):
+        """Interpret the entire program by parsing and then running the AST with the selected engine."""
+        try:
+            tree = self.parse()
+            if self.optimize:
+                tree = self.optimized(tree)
+            return getattr(self, 'run_' + self.engine)(tree)
+        finally:
+            self.output.flush()
+            self.discard_temporaries()
+            self.cache_entry = None
+
 if __name__ == "__main__":
     text = """
     let balance = 1000
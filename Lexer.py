@@ -11,7 +11,7 @@ BNF:
 
 <if_statement> ::= "if" <comparison> "then" <block> "endif"
 
-<while_statement> ::= "while" <comparison> "then" <block> "endwhile"
+<while_statement> ::= "while" <comparison> "then" <block> ["endwhile"]
 
 <block> ::= {<statement>}
 
@@ -19,7 +19,9 @@ BNF:
 
 <term> ::= <factor> {("*" | "/") <factor>}
 
-<factor> ::= <integer> | <identifier> | "(" <expression> ")"
+<factor> ::= (<integer> | <identifier> | "(" <expression> ")" | <array>) {"[" <expression> "]"}
+
+<array> ::= "[" [<expression> {"," <expression>}] "]" | "[" <expression> ":" <expression> "]"
 
 <comparison> ::= <expression> {("<" | ">" | "==") <expression>}
 
@@ -28,8 +30,105 @@ BNF:
 <integer> ::= [0-9]+
 """
 
+import mmap
+import os
+import re
+import sys
+from array import array
 from Token import Token
 
+KEYWORDS = {
+    'let': Token.LET,
+    'print': Token.PRINT,
+    'if': Token.IF,
+    'then': Token.THEN,
+    'endif': Token.ENDIF,
+    'while': Token.WHILE,
+    'endwhile': Token.ENDWHILE,
+    'def': Token.DEF,
+    'enddef': Token.ENDDEF,
+    'return': Token.RETURN,
+    'global': Token.GLOBAL
+}
+
+# Master pattern for `Lexer.tokenize`. Leading whitespace is skipped as part of each match and the
+# group matched (`match.lastindex`) selects the token kind: 1 integer, 2 identifier or keyword,
+# 3 operator, 4 assignment, 5 invalid character.
+TOKEN_PATTERN = re.compile(r'\s*(?:(\d+)|([^\W\d]\w*)|(==|<=|>=|[-+*/()<>\[\],:])|(=)|(\S))')
+
+# Master pattern of `BytesLexer` over ASCII source. Newlines are matched as group 1 so lines are
+# counted in the same scan; the other groups follow `TOKEN_PATTERN`, shifted by one.
+BYTES_TOKEN_PATTERN = re.compile(rb'[ \t\r\f\v]*(?:(\n)|(\d+)|([A-Za-z_]\w*)|(==|<=|>=|[-+*/()<>\[\],:])|(=)|(\S))')
+
+class TokenStream:
+    """A compact buffer of scanned tokens stored as parallel arrays.
+
+    Operators, keywords, assignments and EOF are stored as their shared `Token.fixed`
+    instance; integers and identifiers are stored as bare values and only become `Token`
+    objects when they are read. Positions live in `lines` and `columns`, so the memory per
+    token is a few bytes plus its value rather than a full object.
+
+    Attributes:
+        kinds (array): One code per token: FIXED, INTEGER or IDENTIFIER.
+        values (list): The shared token (FIXED) or the bare value of each token.
+        lines (array): The 1-based line of each token.
+        columns (array): The 1-based column of each token.
+        index (int): The position of the next token returned by `get_next_token`.
+        last (int): The position of the token returned last by `get_next_token`.
+    """
+    FIXED = 0
+    INTEGER = 1
+    IDENTIFIER = 2
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = []
+        self.lines = array('I')
+        self.columns = array('I')
+        self.index = 0
+        self.last = 0
+
+    def append(self, type_, value, line, column):
+        """Append a token given by its type and value at the given position."""
+        if type_ == Token.INTEGER:
+            self.kinds.append(self.INTEGER)
+        elif type_ == Token.IDENTIFIER:
+            self.kinds.append(self.IDENTIFIER)
+            value = sys.intern(value)
+        else:
+            self.kinds.append(self.FIXED)
+            value = Token.fixed(type_, value)
+        self.values.append(value)
+        self.lines.append(line)
+        self.columns.append(column)
+
+    def position(self, index=None):
+        """Return the (line, column) of the token at `index`, by default the one returned last by `get_next_token`."""
+        if index is None:
+            index = self.last
+        return self.lines[index], self.columns[index]
+
+    def get_next_token(self):
+        """Return the next token; the final EOF token is returned again once the stream is exhausted."""
+        index = self.last = self.index
+        if index < len(self.kinds) - 1:
+            self.index = index + 1
+        return self[index]
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        kind = self.kinds[index]
+        if kind == self.FIXED:
+            return self.values[index]
+        type_ = Token.INTEGER if kind == self.INTEGER else Token.IDENTIFIER
+        return Token(type_, self.values[index], self.lines[index], self.columns[index])
+
 class Lexer:
     def __init__(self, text):
         """Initialize the Lexer with the source code as text.
@@ -41,10 +140,38 @@ class Lexer:
             text (str): Stores the entire source code as a string.
             pos (int): Current position in the text (character index).
             current_char (str or None): Character at the current position or None if at end of text.
+            line (int): The 1-based line of the current position.
+            line_start (int): The index in `text` where the current line starts.
+            token_line (int): The line of the token returned last by `get_next_token`.
+            token_column (int): The 1-based column of the token returned last by `get_next_token`.
+            token_start (int): The index in `text` where the token returned last by `get_next_token` starts.
         """
         self.text = text
         self.pos = 0
         self.current_char = self.text[self.pos] if self.text else None
+        self.line = 1
+        self.line_start = 0
+        self.token_line = 1
+        self.token_column = 1
+        self.token_start = 0
+
+    @staticmethod
+    def open(path):
+        """Return a `BytesLexer` scanning an ASCII source file in place through a memory map."""
+        return BytesLexer(path)
+
+    def seek(self, pos, line=None, line_start=None):
+        """Continue tokenizing from index `pos` of the text, keeping line numbers correct.
+
+        Args:
+            pos (int): The index to continue from.
+            line (int): The line of `pos`, if known; otherwise newlines before `pos` are counted.
+            line_start (int): The index where the line of `pos` starts, if known.
+        """
+        self.pos = pos
+        self.current_char = self.text[pos] if pos < len(self.text) else None
+        self.line = line if line is not None else self.text.count('\n', 0, pos) + 1
+        self.line_start = line_start if line_start is not None else self.text.rfind('\n', 0, pos) + 1
 
     def error(self):
         """Raise an exception indicating an error at the current lexer position."""
@@ -64,6 +191,9 @@ class Lexer:
     def skip_whitespace(self):
         """Skip any whitespace characters in the input until a non-whitespace character is encountered."""
         while self.current_char is not None and self.current_char.isspace():
+            if self.current_char == '\n':
+                self.line += 1
+                self.line_start = self.pos + 1
             self.advance()
 
     def integer(self):
@@ -80,16 +210,14 @@ class Lexer:
         while self.current_char is not None and (self.current_char.isalnum() or self.current_char == '_'):
             result += self.current_char
             self.advance()
-        keyword_map = {
-            'let': Token.LET,
-            'print': Token.PRINT,
-            'if': Token.IF,
-            'then': Token.THEN,
-            'endif': Token.ENDIF,
-            'while': Token.WHILE,
-            'endwhile': Token.ENDWHILE
-        }
-        return Token(keyword_map.get(result.lower(), Token.IDENTIFIER), result)
+        keyword = KEYWORDS.get(result.lower())
+        if keyword is not None:
+            return Token.fixed(keyword, result)
+        return Token(Token.IDENTIFIER, result, self.token_line, self.token_column)
+
+    def position(self):
+        """Return the (line, column) of the token returned last by `get_next_token`."""
+        return self.token_line, self.token_column
 
     def get_next_token(self):
         """Tokenize the input one token at a time by analyzing the current character."""
@@ -98,38 +226,354 @@ class Lexer:
                 self.skip_whitespace()
                 continue
 
+            self.token_start = self.pos
+            self.token_line = self.line
+            self.token_column = self.pos - self.line_start + 1
+
             if self.current_char.isdigit():
-                return Token(Token.INTEGER, self.integer())
+                return Token(Token.INTEGER, self.integer(), self.token_line, self.token_column)
 
             if self.current_char.isalpha() or self.current_char == '_':
                 return self.identifier()
 
-            if self.current_char in '+-*/()':
+            if self.current_char in '+-*/()[],:':
                 op_char = self.current_char
                 self.advance()
-                return Token(Token.OPERATOR, op_char)
+                return Token.fixed(Token.OPERATOR, op_char)
 
             if self.current_char == '=':
                 self.advance()
                 if self.current_char == '=':
                     self.advance()
-                    return Token(Token.OPERATOR, '==')
-                return Token(Token.ASSIGN, '=')
+                    return Token.fixed(Token.OPERATOR, '==')
+                return Token.fixed(Token.ASSIGN, '=')
 
             if self.current_char == '>':
                 self.advance()
                 if self.current_char == '=':
                     self.advance()
-                    return Token(Token.OPERATOR, '>=')
-                return Token(Token.OPERATOR, '>')
+                    return Token.fixed(Token.OPERATOR, '>=')
+                return Token.fixed(Token.OPERATOR, '>')
 
             if self.current_char == '<':
                 self.advance()
                 if self.current_char == '=':
                     self.advance()
-                    return Token(Token.OPERATOR, '<=')
-                return Token(Token.OPERATOR, '<')
+                    return Token.fixed(Token.OPERATOR, '<=')
+                return Token.fixed(Token.OPERATOR, '<')
 
             self.error()
 
-        return Token(Token.EOF, None)  
+        self.token_start = self.pos
+        self.token_line = self.line
+        self.token_column = self.pos - self.line_start + 1
+        return Token.fixed(Token.EOF, None)
+
+    def tokenize(self):
+        """Scan the rest of the input in one pass with the master regex and return every token at once.
+
+        The stream records the 1-based line and column of every token in compact arrays.
+
+        Returns:
+            TokenStream: The tokens up to and including EOF, consumable by `Parser`.
+        """
+        text = self.text
+        length = len(text)
+        stream = TokenStream()
+        kinds = stream.kinds.append
+        values = stream.values.append
+        lines = stream.lines.append
+        columns = stream.columns.append
+        fixed = Token.fixed
+        shared = {}
+        intern = sys.intern
+        FIXED, INTEGER, IDENTIFIER = TokenStream.FIXED, TokenStream.INTEGER, TokenStream.IDENTIFIER
+        pos = self.pos
+        line = text.count('\n', 0, pos) + 1
+        line_start = text.rfind('\n', 0, pos) + 1
+        while True:
+            end = text.find('\n', pos)
+            if end == -1:
+                end = length
+            for match in TOKEN_PATTERN.finditer(text, pos, end):
+                kind = match.lastindex
+                value = match.group(kind)
+                if kind == 1:
+                    kinds(INTEGER)
+                    values(int(value))
+                elif kind == 2:
+                    token = shared.get(value)
+                    if token is None:
+                        keyword = KEYWORDS.get(value.lower())
+                        if keyword is None:
+                            token = shared[value] = intern(value)
+                        else:
+                            token = shared[value] = fixed(keyword, value)
+                    kinds(IDENTIFIER if type(token) is str else FIXED)
+                    values(token)
+                elif kind == 3:
+                    token = shared.get(value)
+                    if token is None:
+                        token = shared[value] = fixed(Token.OPERATOR, value)
+                    kinds(FIXED)
+                    values(token)
+                elif kind == 4:
+                    kinds(FIXED)
+                    values(fixed(Token.ASSIGN, value))
+                else:
+                    self.pos = match.start(kind)
+                    self.current_char = value
+                    self.error()
+                lines(line)
+                columns(match.start(kind) - line_start + 1)
+            if end == length:
+                break
+            pos = line_start = end + 1
+            line += 1
+        stream.append(Token.EOF, None, line, length - line_start + 1)
+        self.pos = length
+        self.current_char = None
+        return stream
+
+class StreamLexer:
+    def __init__(self, source, chunk_size=65536):
+        """Initialize a lexer that reads its input incrementally instead of from one string.
+
+        Only the part of the input that has not been tokenized yet is kept in memory, so a
+        `Parser` over a StreamLexer can consume a program of any size.
+
+        Args:
+            source (file or iterable of str): A text file object, read `chunk_size` characters at a
+                                              time, or any iterable yielding chunks of source text.
+            chunk_size (int): The number of characters read from a file object at once.
+
+        Attributes:
+            buffer (str): The input read but not yet tokenized, starting at or before `pos`.
+            pos (int): The position of the next character to tokenize in `buffer`.
+            line (int): The current 1-based line.
+            line_start (int): The offset in `buffer` where the current line starts (may be negative).
+            exhausted (bool): Whether the whole input has been read.
+            token_line (int): The line of the token returned last by `get_next_token`.
+            token_column (int): The column of the token returned last by `get_next_token`.
+        """
+        if hasattr(source, 'read'):
+            self.chunks = iter(lambda: source.read(chunk_size), '')
+        else:
+            self.chunks = iter(source)
+        self.buffer = ''
+        self.pos = 0
+        self.line = 1
+        self.line_start = 0
+        self.exhausted = False
+        self.token_line = 1
+        self.token_column = 1
+
+    def fill(self):
+        """Read the next chunk into the buffer, dropping what was already tokenized.
+
+        Returns:
+            bool: False if the input is exhausted.
+        """
+        if self.exhausted:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.line_start -= self.pos
+        self.pos = 0
+        return True
+
+    def error(self, char, column):
+        """Raise an exception indicating an invalid character."""
+        raise Exception(f"Invalid character: '{char}' at line {self.line}, column {column}")
+
+    def get_next_token(self):
+        """Return the next token, reading more input whenever a token might continue past the buffer."""
+        while True:
+            match = TOKEN_PATTERN.match(self.buffer, self.pos)
+            if match is None or (match.end() == len(self.buffer) and not self.exhausted):
+                if self.fill():
+                    continue
+                if match is None:
+                    return self.finish()
+            kind = match.lastindex
+            start = match.start(kind)
+            newlines = self.buffer.count('\n', self.pos, start)
+            if newlines:
+                self.line += newlines
+                self.line_start = self.buffer.rfind('\n', self.pos, start) + 1
+            column = start - self.line_start + 1
+            self.token_line = self.line
+            self.token_column = column
+            value = match.group(kind)
+            self.pos = match.end()
+            if kind == 1:
+                return Token(Token.INTEGER, int(value), self.line, column)
+            if kind == 2:
+                keyword = KEYWORDS.get(value.lower())
+                if keyword is not None:
+                    return Token.fixed(keyword, value)
+                return Token(Token.IDENTIFIER, value, self.line, column)
+            if kind == 3:
+                return Token.fixed(Token.OPERATOR, value)
+            if kind == 4:
+                return Token.fixed(Token.ASSIGN, value)
+            self.error(value, column)
+
+    def position(self):
+        """Return the (line, column) of the token returned last by `get_next_token`."""
+        return self.token_line, self.token_column
+
+    def finish(self):
+        """Consume the trailing whitespace and return the EOF token."""
+        newlines = self.buffer.count('\n', self.pos)
+        if newlines:
+            self.line += newlines
+            self.line_start = self.buffer.rfind('\n', self.pos) + 1
+        self.token_line = self.line
+        self.token_column = len(self.buffer) - self.line_start + 1
+        self.buffer = ''
+        self.pos = 0
+        return Token.fixed(Token.EOF, None)
+
+class BytesLexer:
+    def __init__(self, source):
+        """Initialize a lexer that scans ASCII source bytes in place.
+
+        The input is never decoded or copied as a whole: the master regex runs directly over the
+        buffer, and only the lexemes of integers and identifiers are materialized, when their
+        tokens are produced. Memory use while lexing is therefore the size of the tokens rather
+        than the size of the source, which makes it suitable for very large generated programs.
+
+        Args:
+            source (str, os.PathLike or bytes-like): The path of a source file, which is memory
+                                                     mapped, or a `bytes`, `bytearray`, `mmap` or
+                                                     `memoryview` holding the source.
+
+        Attributes:
+            data: The buffer being scanned.
+            pos (int): The offset of the next byte to scan.
+            line (int): The current 1-based line.
+            line_start (int): The offset where the current line starts.
+            token_line (int): The line of the token returned last by `get_next_token`.
+            token_column (int): The column of the token returned last by `get_next_token`.
+        """
+        self.mapping = None
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            source = self.mapping if self.mapping is not None else b''
+        self.data = source
+        self.length = len(memoryview(source).cast('B'))
+        self.pos = 0
+        self.line = 1
+        self.line_start = 0
+        self.token_line = 1
+        self.token_column = 1
+        self.words = {}
+
+    def close(self):
+        """Release the memory map of a source file opened by path."""
+        if self.mapping is not None:
+            self.data = b''
+            self.mapping.close()
+            self.mapping = None
+
+    def error(self, char, column):
+        """Raise an exception indicating an invalid character."""
+        raise Exception(f"Invalid character: {char!r} at line {self.line}, column {column}")
+
+    def word(self, lexeme):
+        """Return the keyword token or interned identifier name of an identifier lexeme."""
+        word = self.words.get(lexeme)
+        if word is None:
+            name = lexeme.decode('ascii')
+            keyword = KEYWORDS.get(name.lower())
+            word = self.words[lexeme] = sys.intern(name) if keyword is None else Token.fixed(keyword, name)
+        return word
+
+    def get_next_token(self):
+        """Return the next token, scanning the buffer from the current offset."""
+        match = BYTES_TOKEN_PATTERN.match(self.data, self.pos)
+        while match is not None and match.lastindex == 1:
+            self.line += 1
+            self.pos = self.line_start = match.end()
+            match = BYTES_TOKEN_PATTERN.match(self.data, self.pos)
+        if match is None:
+            self.pos = self.length
+            self.token_line = self.line
+            self.token_column = self.length - self.line_start + 1
+            return Token.fixed(Token.EOF, None)
+        kind = match.lastindex
+        column = match.start(kind) - self.line_start + 1
+        self.token_line = self.line
+        self.token_column = column
+        self.pos = match.end()
+        if kind == 2:
+            return Token(Token.INTEGER, int(match.group(kind)), self.line, column)
+        if kind == 3:
+            word = self.word(match.group(kind))
+            if type(word) is str:
+                return Token(Token.IDENTIFIER, word, self.line, column)
+            return word
+        if kind == 4:
+            return Token.fixed(Token.OPERATOR, match.group(kind).decode('ascii'))
+        if kind == 5:
+            return Token.fixed(Token.ASSIGN, '=')
+        self.error(bytes(match.group(kind)), column)
+
+    def position(self):
+        """Return the (line, column) of the token returned last by `get_next_token`."""
+        return self.token_line, self.token_column
+
+    def tokenize(self):
+        """Scan the rest of the buffer in one pass and return every token at once.
+
+        Returns:
+            TokenStream: The tokens up to and including EOF, consumable by `Parser`.
+        """
+        stream = TokenStream()
+        kinds = stream.kinds.append
+        values = stream.values.append
+        lines = stream.lines.append
+        columns = stream.columns.append
+        word = self.word
+        operators = {}
+        assign = Token.fixed(Token.ASSIGN, '=')
+        FIXED, INTEGER, IDENTIFIER = TokenStream.FIXED, TokenStream.INTEGER, TokenStream.IDENTIFIER
+        line, line_start = self.line, self.line_start
+        for match in BYTES_TOKEN_PATTERN.finditer(self.data, self.pos):
+            kind = match.lastindex
+            if kind == 1:
+                line += 1
+                line_start = match.end()
+                continue
+            if kind == 2:
+                kinds(INTEGER)
+                values(int(match.group(kind)))
+            elif kind == 3:
+                token = word(match.group(kind))
+                kinds(IDENTIFIER if type(token) is str else FIXED)
+                values(token)
+            elif kind == 4:
+                lexeme = match.group(kind)
+                token = operators.get(lexeme)
+                if token is None:
+                    token = operators[lexeme] = Token.fixed(Token.OPERATOR, lexeme.decode('ascii'))
+                kinds(FIXED)
+                values(token)
+            elif kind == 5:
+                kinds(FIXED)
+                values(assign)
+            else:
+                self.line = line
+                self.error(bytes(match.group(kind)), match.start(kind) - line_start + 1)
+            lines(line)
+            columns(match.start(kind) - line_start + 1)
+        stream.append(Token.EOF, None, line, self.length - line_start + 1)
+        self.pos = self.length
+        self.line, self.line_start = line, line_start
+        return stream
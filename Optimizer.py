@@ -0,0 +1,618 @@
+import operator
+from Token import Token
+from AST import BinOp, Num, Var, Assign, Print, If, While, Array, Range, Index, Function, Return, Call
+
+def count_nodes(node):
+    """Return the number of AST nodes in a node or a list of statement nodes."""
+    if isinstance(node, list):
+        return sum(count_nodes(n) for n in node)
+    if isinstance(node, BinOp):
+        return 1 + count_nodes(node.left) + count_nodes(node.right)
+    if isinstance(node, Assign):
+        return 2 + count_nodes(node.right)
+    if isinstance(node, Print):
+        return 1 + count_nodes(node.value)
+    if isinstance(node, (If, While)):
+        return 1 + count_nodes(node.condition) + count_nodes(node.body)
+    if isinstance(node, Array):
+        return 1 + count_nodes(node.elements)
+    if isinstance(node, Range):
+        return 1 + count_nodes(node.start) + count_nodes(node.stop)
+    if isinstance(node, Index):
+        return 1 + count_nodes(node.value) + count_nodes(node.index)
+    if isinstance(node, Function):
+        return 1 + count_nodes(node.body)
+    if isinstance(node, Return):
+        return 1 + (count_nodes(node.value) if node.value is not None else 0)
+    if isinstance(node, Call):
+        return 1 + count_nodes(node.args)
+    return 1
+
+def assigned_names(nodes):
+    """Return the set of variable names assigned anywhere in a list of statements, including nested blocks."""
+    names = set()
+    for node in nodes:
+        if isinstance(node, Assign):
+            names.add(node.left.value)
+        elif isinstance(node, (If, While)):
+            names |= assigned_names(node.body)
+    return names
+
+def assignments(nodes):
+    """Yield every Assign statement in a list of statements, including nested blocks."""
+    for node in nodes:
+        if isinstance(node, Assign):
+            yield node
+        elif isinstance(node, (If, While)):
+            yield from assignments(node.body)
+
+def int_valued(expression, ints):
+    """Return whether an expression always gives an integer, given the variables known to hold integers.
+
+    Arrays, ranges, indexing and calls may give other values, such as arrays or the None of a
+    call without a return value, so only integer literals, those variables and arithmetic on
+    them qualify.
+    """
+    if isinstance(expression, Num):
+        return type(expression.value) is int
+    if isinstance(expression, Var):
+        return expression.value in ints
+    if isinstance(expression, BinOp):
+        return (expression.op.value in ('+', '-', '*', '/') and int_valued(expression.left, ints)
+                and int_valued(expression.right, ints))
+    return False
+
+def stable_ints(nodes, ints):
+    """Return the variables of `ints` that still hold integers however often and along whatever branches the statements run."""
+    ints = set(ints)
+    while True:
+        lost = {node.left.value for node in assignments(nodes)
+                if node.left.value in ints and not int_valued(node.right, ints)}
+        if not lost:
+            return ints
+        ints -= lost
+
+def assignment_counts(nodes, counts=None):
+    """Return how many assignments to each variable name appear in a list of statements, including nested blocks."""
+    if counts is None:
+        counts = {}
+    for node in nodes:
+        if isinstance(node, Assign):
+            counts[node.left.value] = counts.get(node.left.value, 0) + 1
+        elif isinstance(node, (If, While)):
+            assignment_counts(node.body, counts)
+    return counts
+
+def variables(node):
+    """Return the set of variable names read by an expression."""
+    if isinstance(node, Var):
+        return {node.value}
+    if isinstance(node, BinOp):
+        return variables(node.left) | variables(node.right)
+    if isinstance(node, Array):
+        names = set()
+        for element in node.elements:
+            names |= variables(element)
+        return names
+    if isinstance(node, Range):
+        return variables(node.start) | variables(node.stop)
+    if isinstance(node, Index):
+        return variables(node.value) | variables(node.index)
+    if isinstance(node, Call):
+        names = set()
+        for arg in node.args:
+            names |= variables(arg)
+        return names
+    return set()
+
+def has_call(node):
+    """Return whether an expression, a statement or a list of statements calls a function."""
+    if isinstance(node, list):
+        return any(has_call(n) for n in node)
+    if isinstance(node, Call):
+        return True
+    if isinstance(node, Assign):
+        return has_call(node.right)
+    if isinstance(node, (Print, Return)):
+        return node.value is not None and has_call(node.value)
+    if isinstance(node, (If, While)):
+        return has_call(node.condition) or has_call(node.body)
+    if isinstance(node, BinOp):
+        return has_call(node.left) or has_call(node.right)
+    if isinstance(node, Array):
+        return any(has_call(element) for element in node.elements)
+    if isinstance(node, Range):
+        return has_call(node.start) or has_call(node.stop)
+    if isinstance(node, Index):
+        return has_call(node.value) or has_call(node.index)
+    return False
+
+def expression_key(node):
+    """Return a hashable key identifying an expression by its structure."""
+    if isinstance(node, BinOp):
+        return (node.op.value, expression_key(node.left), expression_key(node.right))
+    if isinstance(node, Num):
+        return ('Num', type(node.value), node.value)
+    return ('Var', node.value)
+
+def temporary(name):
+    """Return an Assign target for a compiler-generated variable."""
+    return Var(Token(Token.IDENTIFIER, name))
+
+class Optimizer:
+    """Simplify a parsed program before it is executed.
+
+    The optimizer folds `BinOp` subtrees whose operands are constants into `Num` nodes,
+    removes `If` and `While` statements whose condition is a constant false value and
+    inlines the body of `If` statements whose condition is a constant true value (an `If`
+    body shares its enclosing scope, so inlining keeps scoping intact). Folding uses the
+    interpreter's operator semantics, including floor division for `/`; a division by zero
+    is left in place so it is still raised when and where the program reaches it.
+
+    With `loops` enabled the folded program is then passed through a `LoopOptimizer`.
+
+    The input tree is never modified, so it can be shared through a `ProgramCache`.
+
+    Attributes:
+        loops (bool): Whether to run the loop optimizations after folding.
+        removed (int): The number of nodes removed by folding in the last call to `optimize`.
+        hoisted (int): The number of loop-invariant expressions moved out of loops.
+        reduced (int): The number of multiplications replaced by running additions.
+        temporaries (list of str): The names of the variables introduced by the loop optimizations.
+    """
+    OPERATORS = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '/': operator.floordiv,
+        '==': operator.eq,
+        '>': operator.gt,
+        '<': operator.lt,
+    }
+
+    def __init__(self, loops=False):
+        self.loops = loops
+        self.removed = 0
+        self.hoisted = 0
+        self.reduced = 0
+        self.temporaries = []
+
+    def optimize(self, tree, defined=(), ints=()):
+        """Return an optimized copy of a list of statement nodes.
+
+        Args:
+            tree (list of AST): The statements.
+            defined (iterable of str): The variables already assigned before the statements run,
+                                       such as those of earlier statements in streaming mode.
+            ints (iterable of str): The variables of `defined` that hold integers.
+        """
+        result = self.visit_block(tree)
+        self.removed = count_nodes(tree) - count_nodes(result)
+        if self.loops:
+            loop_optimizer = LoopOptimizer()
+            result = loop_optimizer.optimize(result, defined, ints)
+            self.hoisted = loop_optimizer.hoisted
+            self.reduced = loop_optimizer.reduced
+            self.temporaries = loop_optimizer.temporaries
+        return result
+
+    def visit(self, node):
+        """Dispatch to the node-specific method."""
+        method_name = 'visit_' + type(node).__name__
+        visitor = getattr(self, method_name, self.no_visit_method)
+        return visitor(node)
+
+    def no_visit_method(self, node):
+        """Handle undefined node types by raising an exception."""
+        raise Exception(f"No optimizer method defined for {type(node).__name__}")
+
+    def visit_block(self, nodes):
+        """Optimize a list of statements; each statement becomes zero or more statements."""
+        result = []
+        for node in nodes:
+            optimized = self.visit(node)
+            if isinstance(optimized, list):
+                result.extend(optimized)
+            else:
+                result.append(optimized)
+        return result
+
+    def visit_Num(self, node):
+        """Numbers are already constant."""
+        return node
+
+    def visit_Var(self, node):
+        """Variables cannot be folded."""
+        return node
+
+    def visit_BinOp(self, node):
+        """Fold a binary operation whose operands are both constants."""
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if isinstance(left, Num) and isinstance(right, Num):
+            op = self.OPERATORS.get(node.op.value)
+            if op is not None and not (node.op.value == '/' and right.value == 0):
+                return Num(Token(Token.INTEGER, op(left.value, right.value)))
+        if left is node.left and right is node.right:
+            return node
+        return BinOp(left, node.op, right)
+
+    def visit_Array(self, node):
+        """Optimize the elements of an array literal."""
+        elements = [self.visit(element) for element in node.elements]
+        if all(new is old for new, old in zip(elements, node.elements)):
+            return node
+        return Array(elements)
+
+    def visit_Range(self, node):
+        """Optimize the bounds of a range."""
+        start = self.visit(node.start)
+        stop = self.visit(node.stop)
+        return node if start is node.start and stop is node.stop else Range(start, stop)
+
+    def visit_Index(self, node):
+        """Optimize the array and position of an index expression."""
+        value = self.visit(node.value)
+        index = self.visit(node.index)
+        return node if value is node.value and index is node.index else Index(value, index)
+
+    def visit_Assign(self, node):
+        """Optimize the assigned expression."""
+        right = self.visit(node.right)
+        return node if right is node.right else Assign(node.left, node.op, right)
+
+    def visit_Print(self, node):
+        """Optimize the printed expression."""
+        value = self.visit(node.value)
+        return node if value is node.value else Print(value)
+
+    def visit_If(self, node):
+        """Drop an if statement with a constant false condition and inline one with a constant true condition."""
+        condition = self.visit(node.condition)
+        body = self.visit_block(node.body)
+        if isinstance(condition, Num):
+            return body if condition.value else []
+        return If(condition, body)
+
+    def visit_While(self, node):
+        """Drop a while loop whose condition is constant false."""
+        condition = self.visit(node.condition)
+        if isinstance(condition, Num) and not condition.value:
+            return []
+        return While(condition, self.visit_block(node.body))
+
+    def visit_Function(self, node):
+        """Optimize the body of a function definition."""
+        return Function(node.name, node.params, self.visit_block(node.body))
+
+    def visit_Return(self, node):
+        """Optimize the returned expression."""
+        if node.value is None:
+            return node
+        value = self.visit(node.value)
+        return node if value is node.value else Return(value)
+
+    def visit_Call(self, node):
+        """Optimize the arguments of a call."""
+        args = [self.visit(arg) for arg in node.args]
+        if all(new is old for new, old in zip(args, node.args)):
+            return node
+        return Call(node.name, args)
+
+    def visit_Global(self, node):
+        """Keep a global declaration as it is."""
+        return node
+
+class LoopOptimizer:
+    """Move repeated work out of `While` bodies.
+
+    For every loop, the variables assigned anywhere in its body are collected. Expressions in the
+    condition or body that only read variables the loop never assigns are loop invariant: each
+    distinct one is computed once into a temporary right before the loop. A multiplication
+    `v * k` (or `k * v`) by a constant, where `v` is an induction variable updated once per
+    iteration by `let v = v + c` (or `- c`) at the top level of the body, is replaced by a
+    temporary that starts at `v * k` and is advanced by `c * k` right after `v` is updated.
+
+    Both transformations evaluate expressions before the loop that the original program may
+    only evaluate inside it, or not at all when the loop runs zero times, so they are restricted
+    to expressions that cannot fail: every variable read must be assigned unconditionally
+    earlier in the enclosing blocks and hold an integer in every iteration (see `int_valued`
+    and `stable_ints`), and division is only allowed by a non-zero constant. Arrays and the
+    results of calls are never assumed to be integers, since adding arrays of different
+    lengths, or adding to None, raises. Temporaries are named with a leading `$`,
+    which the lexer never produces, so they cannot clash with program variables.
+
+    Attributes:
+        hoisted (int): The number of invariant expressions moved out of loops.
+        reduced (int): The number of multiplications replaced by running additions.
+        temporaries (list of str): The names of the temporaries introduced.
+    """
+    def __init__(self):
+        self.hoisted = 0
+        self.reduced = 0
+        self.temporaries = []
+
+    def optimize(self, tree, defined=(), ints=()):
+        """Return a copy of a list of statements with its loops optimized.
+
+        Args:
+            defined (iterable of str): The variables certainly assigned before the statements run.
+            ints (iterable of str): The variables of `defined` that hold integers.
+        """
+        return self.block(tree, set(defined), set(ints))
+
+    def new_temporary(self, prefix):
+        """Allocate the name of a new temporary variable."""
+        name = f'${prefix}{len(self.temporaries)}'
+        self.temporaries.append(name)
+        return name
+
+    def block(self, nodes, defined, ints):
+        """Optimize the loops in a list of statements.
+
+        Args:
+            nodes (list of AST): The statements.
+            defined (set of str): The variables certainly assigned before the block starts.
+            ints (set of str): The variables of `defined` that hold integers when the block starts.
+        """
+        defined = set(defined)
+        ints = set(ints)
+        result = []
+        for node in nodes:
+            if isinstance(node, While):
+                result.extend(self.loop(node, defined, ints))
+                ints = stable_ints([node], ints)
+            elif isinstance(node, If):
+                result.append(If(node.condition, self.block(node.body, defined, ints)))
+                ints = stable_ints([node], ints)
+            else:
+                result.append(node)
+                if isinstance(node, Assign):
+                    defined.add(node.left.value)
+                    if int_valued(node.right, ints):
+                        ints.add(node.left.value)
+                    else:
+                        ints.discard(node.left.value)
+        return result
+
+    def loop(self, node, defined, ints):
+        """Optimize a while loop and return the statements replacing it.
+
+        A loop that calls a function is left as it is, since the call may assign any variable.
+        """
+        ints = stable_ints(node.body, ints)
+        body = self.block(node.body, defined, ints)
+        if has_call(node.condition) or has_call(body):
+            return [While(node.condition, body)]
+        prelude = []
+        condition, body = self.strength_reduce(node.condition, body, ints, prelude)
+        assigned = assigned_names(body)
+        invariants = {}
+
+        def hoist(expression):
+            if not isinstance(expression, BinOp):
+                return expression
+            if self.is_invariant(expression, assigned, defined, ints):
+                key = expression_key(expression)
+                if key not in invariants:
+                    name = self.new_temporary('inv')
+                    invariants[key] = name
+                    prelude.append(Assign(temporary(name), Token.fixed(Token.ASSIGN, '='), expression))
+                    self.hoisted += 1
+                return Var(Token(Token.IDENTIFIER, invariants[key]))
+            left = hoist(expression.left)
+            right = hoist(expression.right)
+            if left is expression.left and right is expression.right:
+                return expression
+            return BinOp(left, expression.op, right)
+
+        condition = hoist(condition)
+        body = self.rewrite(body, hoist)
+        return prelude + [While(condition, body)]
+
+    def is_invariant(self, expression, assigned, defined, ints):
+        """Return whether an expression can be evaluated once before a loop."""
+        names = variables(expression)
+        return names.isdisjoint(assigned) and names <= defined and self.cannot_fail(expression, ints)
+
+    def cannot_fail(self, expression, ints):
+        """Return whether evaluating an expression can never raise, given the variables known to hold integers."""
+        if not isinstance(expression, BinOp):
+            return int_valued(expression, ints)
+        if expression.op.value == '/' and not (isinstance(expression.right, Num) and expression.right.value != 0):
+            return False
+        return self.cannot_fail(expression.left, ints) and self.cannot_fail(expression.right, ints)
+
+    def rewrite(self, nodes, transform):
+        """Apply an expression transform to the statements of a loop body, leaving nested loops alone."""
+        result = []
+        for node in nodes:
+            if isinstance(node, Assign):
+                right = transform(node.right)
+                result.append(node if right is node.right else Assign(node.left, node.op, right))
+            elif isinstance(node, Print):
+                value = transform(node.value)
+                result.append(node if value is node.value else Print(value))
+            elif isinstance(node, If):
+                result.append(If(transform(node.condition), self.rewrite(node.body, transform)))
+            else:
+                result.append(node)
+        return result
+
+    def induction_variables(self, body, ints):
+        """Return {name: (index, step)} for integer variables updated by a constant once per iteration.
+
+        Args:
+            ints (set of str): The variables that hold integers in every iteration.
+
+        `index` is the position of the updating statement in the loop body.
+        """
+        counts = assignment_counts(body)
+        induction = {}
+        for index, node in enumerate(body):
+            if not isinstance(node, Assign):
+                continue
+            name, right = node.left.value, node.right
+            if counts[name] != 1 or name not in ints or not isinstance(right, BinOp):
+                continue
+            if right.op.value not in ('+', '-') or not isinstance(right.left, Var) or right.left.value != name:
+                continue
+            if not isinstance(right.right, Num) or type(right.right.value) is not int:
+                continue
+            step = right.right.value if right.op.value == '+' else -right.right.value
+            induction[name] = (index, step)
+        return induction
+
+    def strength_reduce(self, condition, body, ints, prelude):
+        """Replace `v * k` for induction variables `v` and constants `k` with running temporaries."""
+        induction = self.induction_variables(body, ints)
+        if not induction:
+            return condition, body
+        running = {}
+
+        def reduce(expression):
+            if not isinstance(expression, BinOp):
+                return expression
+            if expression.op.value == '*':
+                for var, const in ((expression.left, expression.right), (expression.right, expression.left)):
+                    if (isinstance(var, Var) and var.value in induction
+                            and isinstance(const, Num) and type(const.value) is int):
+                        key = (var.value, const.value)
+                        if key not in running:
+                            name = self.new_temporary('sr')
+                            running[key] = name
+                            prelude.append(Assign(temporary(name), Token.fixed(Token.ASSIGN, '='), expression))
+                            self.reduced += 1
+                        return Var(Token(Token.IDENTIFIER, running[key]))
+            left = reduce(expression.left)
+            right = reduce(expression.right)
+            if left is expression.left and right is expression.right:
+                return expression
+            return BinOp(left, expression.op, right)
+
+        condition = reduce(condition)
+        body = self.rewrite(body, reduce)
+        updates = {}
+        for (name, factor), temp in running.items():
+            index, step = induction[name]
+            delta = step * factor
+            op = Token.fixed(Token.OPERATOR, '+' if delta >= 0 else '-')
+            update = BinOp(Var(Token(Token.IDENTIFIER, temp)), op, Num(Token(Token.INTEGER, abs(delta))))
+            updates.setdefault(index, []).append(Assign(temporary(temp), Token.fixed(Token.ASSIGN, '='), update))
+        result = []
+        for index, node in enumerate(body):
+            result.append(node)
+            result.extend(updates.get(index, ()))
+        return condition, result
+
+class CountedLoop:
+    """A while loop whose trip count and final variable values have a closed form.
+
+    The loop condition compares a counter with a loop-invariant bound (`c < n` or `n > c` for
+    a counter that increases, `c > n` or `n < c` for one that decreases) and the body only
+    assigns: the counter and other variables are advanced by loop-invariant amounts
+    (`let v = v + e`, `let v = e + v`, `let v = v - e`) and the remaining variables are set
+    to loop-invariant values. Each variable is assigned once, and invariant expressions read
+    no variable the body assigns and call no function, so they have the same value in every iteration.
+
+    `run` computes the number of iterations with floor division and applies every update that
+    many times at once, in O(1) instead of O(n).
+
+    Attributes:
+        counter (str): The variable the condition tests.
+        bound (AST): The invariant expression the counter is compared with.
+        increasing (bool): Whether the loop runs while the counter is below the bound.
+        updates (list of tuple): (name, kind, expression) for every assignment, where `kind` is
+                                 '+' or '-' for an advance by `expression` and '=' for a set.
+    """
+    def __init__(self, counter, bound, increasing, updates):
+        self.counter = counter
+        self.bound = bound
+        self.increasing = increasing
+        self.updates = updates
+
+    @classmethod
+    def analyze(cls, node):
+        """Return the CountedLoop of a while loop, or None if the loop does not have this form."""
+        condition = node.condition
+        if not isinstance(condition, BinOp) or condition.op.value not in ('<', '>'):
+            return None
+        if not all(isinstance(statement, Assign) for statement in node.body):
+            return None
+        assigned = assigned_names(node.body)
+        if any(count != 1 for count in assignment_counts(node.body).values()):
+            return None
+        if isinstance(condition.left, Var) and condition.left.value in assigned:
+            counter, bound, increasing = condition.left.value, condition.right, condition.op.value == '<'
+        elif isinstance(condition.right, Var) and condition.right.value in assigned:
+            counter, bound, increasing = condition.right.value, condition.left, condition.op.value == '>'
+        else:
+            return None
+        if not variables(bound).isdisjoint(assigned) or has_call(bound):
+            return None
+        updates = []
+        for statement in node.body:
+            name, right = statement.left.value, statement.right
+            update = cls.linear_update(name, right)
+            if update is None or not variables(update[1]).isdisjoint(assigned) or has_call(update[1]):
+                return None
+            if name == counter and update[0] == '=':
+                return None
+            updates.append((name,) + update)
+        return cls(counter, bound, increasing, updates)
+
+    @staticmethod
+    def linear_update(name, right):
+        """Return (kind, expression) for an assignment `name = right`; see `updates`."""
+        if isinstance(right, BinOp) and right.op.value in ('+', '-'):
+            if isinstance(right.left, Var) and right.left.value == name:
+                return right.op.value, right.right
+            if right.op.value == '+' and isinstance(right.right, Var) and right.right.value == name:
+                return '+', right.left
+        return '=', right
+
+    def run(self, interpreter):
+        """Finish the loop in closed form on an interpreter's scopes.
+
+        Returns:
+            bool: True if the loop was run, False if it must be interpreted instead: when a
+                  variable the body assigns is not in the current scope (so the iteration scopes
+                  would discard its updates), when a value is not an int, when evaluating an
+                  invariant fails, or when the counter never reaches the bound.
+        """
+        scope = interpreter.current_scope()
+        if any(name not in scope for name, kind, expression in self.updates):
+            return False
+        try:
+            bound = interpreter.visit(self.bound)
+            amounts = [interpreter.visit(expression) for name, kind, expression in self.updates]
+        except Exception:
+            return False
+        if type(bound) is not int:
+            return False
+        start = scope[self.counter]
+        if type(start) is not int:
+            return False
+        step = None
+        for (name, kind, expression), amount in zip(self.updates, amounts):
+            if kind != '=' and (type(amount) is not int or type(scope[name]) is not int):
+                return False
+            if name == self.counter:
+                step = amount if kind == '+' else -amount
+        if self.increasing:
+            distance = bound - start
+        else:
+            distance, step = start - bound, -step
+        if distance <= 0:
+            return True
+        if step <= 0:
+            return False
+        trips = -(-distance // step)
+        for (name, kind, expression), amount in zip(self.updates, amounts):
+            if kind == '+':
+                scope[name] += trips * amount
+            elif kind == '-':
+                scope[name] -= trips * amount
+            else:
+                scope[name] = amount
+        return True
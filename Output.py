@@ -0,0 +1,81 @@
+import sys
+
+class StdoutSink:
+    """Write every printed value to `sys.stdout` immediately, like the builtin `print`."""
+    def emit(self, value):
+        """Print a single value."""
+        print(value)
+
+    def flush(self):
+        """Nothing is buffered."""
+
+class BufferedSink:
+    """Accumulate printed lines and write them to a stream in large chunks.
+
+    Attributes:
+        stream (file or None): The stream to write to; None means `sys.stdout` at flush time.
+        flush_size (int): The number of buffered characters that triggers a write.
+    """
+    def __init__(self, stream=None, flush_size=65536):
+        self.stream = stream
+        self.flush_size = flush_size
+        self.parts = []
+        self.size = 0
+
+    def emit(self, value):
+        """Buffer a value as one output line, writing the buffer out once it is large enough."""
+        line = str(value) + '\n'
+        self.parts.append(line)
+        self.size += len(line)
+        if self.size >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """Write out everything buffered so far."""
+        if self.parts:
+            stream = self.stream if self.stream is not None else sys.stdout
+            stream.write(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+
+class CollectorSink:
+    """Keep printed values in memory instead of writing them anywhere.
+
+    Attributes:
+        values (list): The printed values, in order.
+    """
+    def __init__(self):
+        self.values = []
+        self.emit = self.values.append
+
+    def flush(self):
+        """Nothing needs to be written."""
+
+    def lines(self):
+        """Return the printed values as strings, as `print` would have formatted them."""
+        return [str(value) for value in self.values]
+
+    def getvalue(self):
+        """Return the output as the text `print` would have written."""
+        return ''.join(str(value) + '\n' for value in self.values)
+
+    def to_bytes(self, encoding='utf-8'):
+        """Return the output text encoded as bytes."""
+        return self.getvalue().encode(encoding)
+
+    def clear(self):
+        """Forget the values collected so far."""
+        self.values.clear()
+
+class CallbackSink:
+    """Stream every printed value to a host callback as soon as it is produced."""
+    def __init__(self, callback):
+        """Initialize the sink.
+
+        Args:
+            callback (callable): Called with each printed value.
+        """
+        self.emit = callback
+
+    def flush(self):
+        """Nothing is buffered."""
@@ -0,0 +1,160 @@
+import json
+import time
+from Interperter import Interpreter
+from AST import BinOp, Var, Num, Assign, Print, If, While
+
+class NodeStats:
+    """Execution statistics of one AST node.
+
+    Attributes:
+        node (AST): The profiled node.
+        count (int): The number of times the node was visited.
+        total (float): The time spent in the node including its children, in seconds.
+        children (float): The part of `total` spent in child nodes, in seconds.
+    """
+    __slots__ = ('node', 'count', 'total', 'children')
+
+    def __init__(self, node):
+        self.node = node
+        self.count = 0
+        self.total = 0.0
+        self.children = 0.0
+
+    @property
+    def self_time(self):
+        """The time spent in the node itself, excluding its children."""
+        return self.total - self.children
+
+def label(node):
+    """Return a short human-readable description of a node, such as 'Assign x' or 'BinOp +'."""
+    name = type(node).__name__
+    if isinstance(node, BinOp):
+        return f'{name} {node.op.value}'
+    if isinstance(node, (Var, Num)):
+        return f'{name} {node.value}'
+    if isinstance(node, Assign):
+        return f'{name} {node.left.value}'
+    return name
+
+class ProfilingInterpreter(Interpreter):
+    """A tree-walking interpreter that records how often and how long every AST node runs.
+
+    Profiling is a subclass overriding `visit`, so the plain `Interpreter` pays nothing for it.
+    Nodes are located by the `line` and `column` the parser records on them; nodes created
+    later, e.g. by the optimizer, are reported without a position.
+
+    Attributes:
+        stats (dict): Maps each visited node to its `NodeStats`.
+        stacks (dict): Maps each stack of node labels to the self time spent there, for flamegraphs.
+        clock (callable): The timer used, `time.perf_counter` by default.
+    """
+    def __init__(self, parser, cache=None, optimize=False, output=None, clock=time.perf_counter):
+        super().__init__(parser, engine='tree', cache=cache, optimize=optimize, output=output)
+        self.stats = {}
+        self.stacks = {}
+        self.clock = clock
+        self.tracer = None  # traced and closed-form loops would bypass `visit`
+        self.counted_loops = None
+        self.frames = []
+        self.paths = {}
+
+    def visit(self, node):
+        """Visit a node like `Interpreter.visit`, timing it and attributing the time to its parent."""
+        if isinstance(node, list):
+            return [self.visit(n) for n in node]
+        record = self.stats.get(node)
+        if record is None:
+            record = self.stats[node] = NodeStats(node)
+        frames = self.frames
+        parent_path = frames[-1][2] if frames else ()
+        path_key = (id(parent_path), node)
+        path = self.paths.get(path_key)
+        if path is None:
+            path = self.paths[path_key] = parent_path + (self.frame_label(node),)
+        frame = [record, 0.0, path]
+        frames.append(frame)
+        start = self.clock()
+        try:
+            return super().visit(node)
+        finally:
+            elapsed = self.clock() - start
+            frames.pop()
+            record.count += 1
+            record.total += elapsed
+            record.children += frame[1]
+            if frames:
+                frames[-1][1] += elapsed
+            self.stacks[path] = self.stacks.get(path, 0.0) + elapsed - frame[1]
+
+    @staticmethod
+    def frame_label(node):
+        """Return the stack frame name of a node: its label and line."""
+        line = getattr(node, 'line', None)
+        return label(node) if line is None else f'{label(node)}:{line}'
+
+    def loop_iterations(self):
+        """Return {while_node: iterations} for every executed while loop.
+
+        Each execution of a loop checks its condition once more than it iterates.
+        """
+        iterations = {}
+        for node, record in self.stats.items():
+            if isinstance(node, While):
+                condition = self.stats.get(node.condition)
+                checks = condition.count if condition is not None else 0
+                iterations[node] = checks - record.count
+        return iterations
+
+    def line_stats(self):
+        """Return {line: (hits, self_time)}, where hits counts the statements started on each line."""
+        lines = {}
+        for node, record in self.stats.items():
+            line = getattr(node, 'line', None)
+            hits, self_time = lines.get(line, (0, 0.0))
+            if isinstance(node, (Assign, Print, If, While)):
+                hits += record.count
+            lines[line] = (hits, self_time + record.self_time)
+        return lines
+
+    def report(self, limit=20):
+        """Return a text table of the nodes with the highest total time, followed by the per-line totals."""
+        iterations = self.loop_iterations()
+        rows = sorted(self.stats.values(), key=lambda r: r.total, reverse=True)[:limit]
+        lines = [f"{'node':<24}{'line':>6}{'col':>5}{'count':>10}{'total ms':>12}{'self ms':>12}{'iters':>8}"]
+        for record in rows:
+            node = record.node
+            lines.append(f"{label(node)[:23]:<24}{getattr(node, 'line', '-'):>6}{getattr(node, 'column', '-'):>5}"
+                         f"{record.count:>10}{record.total * 1000:>12.3f}{record.self_time * 1000:>12.3f}"
+                         f"{iterations.get(node, ''):>8}")
+        lines.append('')
+        lines.append(f"{'line':>6}{'hits':>10}{'self ms':>12}")
+        for line, (hits, self_time) in sorted(self.line_stats().items(), key=lambda item: (item[0] is None, item[0] or 0)):
+            lines.append(f"{line if line is not None else '-':>6}{hits:>10}{self_time * 1000:>12.3f}")
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """Return the profile as a JSON-serializable dictionary of per-node and per-line statistics."""
+        iterations = self.loop_iterations()
+        nodes = []
+        for record in self.stats.values():
+            node = record.node
+            nodes.append({
+                'node': label(node),
+                'line': getattr(node, 'line', None),
+                'column': getattr(node, 'column', None),
+                'count': record.count,
+                'total': record.total,
+                'self': record.self_time,
+                'iterations': iterations.get(node),
+            })
+        lines = [{'line': line, 'hits': hits, 'self': self_time}
+                 for line, (hits, self_time) in self.line_stats().items()]
+        return {'nodes': nodes, 'lines': lines}
+
+    def dump(self, file):
+        """Write the profile as JSON to a file object."""
+        json.dump(self.to_dict(), file, indent=2)
+
+    def collapsed(self):
+        """Return the profile in collapsed-stack format ('frame;frame;frame microseconds' per line) for flamegraph tools."""
+        return '\n'.join(f"{';'.join(stack)} {round(seconds * 1e6)}" for stack, seconds in self.stacks.items()) + '\n'
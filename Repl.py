@@ -0,0 +1,412 @@
+import argparse
+import re
+import sys
+from Token import Token
+from Lexer import Lexer
+from _Parser import Parser
+from Interperter import Interpreter
+from AST import While
+
+CHUNK_SIZE = 1024  # the number of characters a `TextBuffer` chunk is split at
+
+class PrefixSums:
+    """A Fenwick tree over a list of counts: updates and prefix sums take O(log n) steps.
+
+    Attributes:
+        tree (list of int): The partial sums, 1-based.
+    """
+    def __init__(self, counts):
+        tree = [0] + list(counts)
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, index, delta):
+        """Add `delta` to the count at `index`."""
+        tree = self.tree
+        i = index + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        """Return the sum of the counts before `index`."""
+        tree = self.tree
+        total = 0
+        i = index
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, total):
+        """Return the largest index whose prefix sum is at most `total`, and that prefix sum."""
+        tree = self.tree
+        index = 0
+        remaining = total
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            i = index + step
+            if i < len(tree) and tree[i] <= remaining:
+                index = i
+                remaining -= tree[i]
+            step >>= 1
+        return index, total - remaining
+
+class TextBuffer:
+    """An editable text stored as a list of chunks, so an edit copies one chunk instead of the whole text.
+
+    The chunk lengths and newline counts are kept in `PrefixSums`, so finding the chunk holding
+    an index, and the line number of an index, take O(log n) steps. A chunk that grows past twice
+    `chunk_size` is split, and an emptied chunk is dropped; only then are the sums rebuilt.
+    A `Lexer` can scan the buffer directly: it supports `len`, indexing and slicing like a string.
+
+    Attributes:
+        chunks (list of str): The text, in order; never empty.
+        chunk_size (int): The length chunks are split at.
+        lengths (PrefixSums): The length of each chunk.
+        newlines (PrefixSums): The number of newlines in each chunk.
+        length (int): The length of the text.
+    """
+    def __init__(self, text='', chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or ['']
+        self.rebuild()
+
+    def rebuild(self):
+        """Recompute the sums after chunks were added or removed."""
+        self.lengths = PrefixSums(len(chunk) for chunk in self.chunks)
+        self.newlines = PrefixSums(chunk.count('\n') for chunk in self.chunks)
+        self.length = sum(len(chunk) for chunk in self.chunks)
+        self.cached = (0, 0, '')
+
+    def locate(self, pos):
+        """Return the index of the chunk holding index `pos` of the text, and the index the chunk starts at."""
+        index, start = self.lengths.find(pos)
+        if index == len(self.chunks):
+            index -= 1
+            start -= len(self.chunks[index])
+        return index, start
+
+    def replace(self, start, end, text):
+        """Replace the characters from `start` to `end` with `text`."""
+        i, base = self.locate(start)
+        j, last = self.locate(end - 1) if end > start else (i, base)
+        chunks = self.chunks
+        old = chunks[i] if i == j else None
+        merged = chunks[i][:start - base] + text + chunks[j][end - last:]
+        if old is not None and (merged or len(chunks) == 1) and len(merged) <= 2 * self.chunk_size:
+            chunks[i] = merged
+            self.lengths.add(i, len(merged) - len(old))
+            self.newlines.add(i, merged.count('\n') - old.count('\n'))
+            self.length += len(merged) - len(old)
+            self.cached = (0, 0, '')
+            return
+        size = self.chunk_size
+        chunks[i:j + 1] = [merged[k:k + size] for k in range(0, len(merged), size)]
+        if not chunks:
+            chunks.append('')
+        self.rebuild()
+
+    def line(self, pos):
+        """Return the 1-based line number of index `pos`."""
+        index, start = self.locate(pos)
+        return self.newlines.prefix(index) + self.chunks[index].count('\n', 0, pos - start) + 1
+
+    def line_start(self, pos):
+        """Return the index where the line holding index `pos` starts."""
+        index, start = self.locate(pos)
+        found = self.chunks[index].rfind('\n', 0, pos - start)
+        while found < 0 and index > 0:
+            index -= 1
+            start -= len(self.chunks[index])
+            found = self.chunks[index].rfind('\n')
+        return start + found + 1 if found >= 0 else 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, _ = key.indices(self.length)
+            if start >= stop:
+                return ''
+            i, base = self.locate(start)
+            j, last = self.locate(stop)
+            if i == j:
+                return self.chunks[i][start - base:stop - base]
+            return ''.join([self.chunks[i][start - base:]] + self.chunks[i + 1:j] + [self.chunks[j][:stop - last]])
+        # Lexing reads consecutive characters, so the chunk of the last read is tried first.
+        base, stop, chunk = self.cached
+        if not base <= key < stop:
+            if not 0 <= key < self.length:
+                raise IndexError("TextBuffer index out of range")
+            index, base = self.locate(key)
+            chunk = self.chunks[index]
+            self.cached = (base, base + len(chunk), chunk)
+        return chunk[key - base]
+
+    def __str__(self):
+        return ''.join(self.chunks)
+
+class Segment:
+    """A top-level statement of an `IncrementalParser` buffer.
+
+    A segment spans from the first token of its statement up to the start of the next segment.
+
+    Attributes:
+        start (int): The index in the buffer where the statement starts; see `IncrementalParser.shift`.
+        statement (AST or None): The parsed statement, or None if this part of the buffer has a syntax error.
+        error (Exception or None): The syntax error, if any.
+        at_eof (bool): Whether the syntax error was found at the end of the buffer, so more input may fix it.
+    """
+    __slots__ = ('start', 'statement', 'error', 'at_eof')
+
+    def __init__(self, start, statement, error=None, at_eof=False):
+        self.start = start
+        self.statement = statement
+        self.error = error
+        self.at_eof = at_eof
+
+class IncrementalParser:
+    """Keep a source buffer parsed while it is being edited.
+
+    The buffer is split into segments, one per top-level statement. An edit re-lexes and re-parses
+    from the segment before the edited range and stops as soon as a statement starts exactly where
+    an unchanged old statement started: from there on the token stream is the same, so the old
+    statements and their AST subtrees are reused as they are. Reused statements keep the source
+    positions of the parse that produced them.
+
+    No step of an edit is linear in the buffer: the text is a chunked `TextBuffer`, the lexer
+    starts from line numbers it looks up there, and the segments after the edit are not moved
+    one by one. Their starts are shifted lazily instead: the starts of the segments from index
+    `shift_from` on are `shift` behind, and the next edit only updates the segments between the
+    two edits. The work done therefore grows with the size of the edit and the distance between
+    consecutive edits rather than the size of the buffer.
+
+    Syntax errors do not raise from `edit`; they are recorded on an error segment and raised by
+    `statements`, so a buffer can be edited through invalid intermediate states.
+
+    Attributes:
+        buffer (TextBuffer): The current buffer.
+        segments (list of Segment): The top-level statements, ordered by start.
+        shift_from (int): The index of the first segment whose start is behind.
+        shift (int): How far behind the starts of the segments from `shift_from` on are.
+        committed (int): Text before this index is final; see `commit`.
+        reparsed (int): The number of statements parsed by the last edit.
+        reused (int): The number of statements the last edit kept without re-parsing.
+    """
+    def __init__(self, text=''):
+        self.buffer = TextBuffer()
+        self.segments = []
+        self.shift_from = 0
+        self.shift = 0
+        self.committed = 0
+        self.reparsed = 0
+        self.reused = 0
+        if text:
+            self.edit(0, 0, text)
+
+    @property
+    def text(self):
+        """The current buffer as a string."""
+        return str(self.buffer)
+
+    def edit(self, start, end, text):
+        """Replace the buffer text from `start` to `end` with `text` and re-parse the statements it touches."""
+        if not self.committed <= start <= end <= len(self.buffer):
+            raise ValueError(f"Invalid edit range {start}:{end}")
+        delta = len(text) - (end - start)
+        # The statement before the edit is re-parsed too: its end depends on the token after it.
+        first = self.find(start) - 1
+        uncommitted = self.find(self.committed)
+        if first < uncommitted:
+            first, pos = uncommitted, self.committed
+        else:
+            pos = self.start_of(first)
+        later = self.find(end)
+        self.buffer.replace(start, end, text)
+        new, k = self.reparse(pos, later, delta)
+        self.move(k, delta)
+        self.segments[first:k] = new
+        self.shift_from += len(new) - (k - first)
+        self.reparsed = len(new)
+        self.reused = len(self.segments) - len(new)
+
+    def start_of(self, index):
+        """Return the start of the segment at `index`, counting the pending shift."""
+        segment = self.segments[index]
+        return segment.start + self.shift if index >= self.shift_from else segment.start
+
+    def find(self, pos):
+        """Return the index of the first segment starting at or after `pos`."""
+        lo, hi = 0, len(self.segments)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.start_of(mid) < pos:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def move(self, index, delta):
+        """Move the starts of the segments from `index` on by `delta`, updating only those between `index` and `shift_from`."""
+        segments = self.segments
+        if index >= self.shift_from or not self.shift:
+            for i in range(self.shift_from, min(index, len(segments))):
+                segments[i].start += self.shift
+            self.shift_from = index
+        else:
+            for i in range(index, self.shift_from):
+                segments[i].start += delta
+        self.shift = self.shift + delta if self.shift_from < len(segments) else 0
+
+    def settle(self):
+        """Apply the pending shift, so that every segment's `start` is exact."""
+        self.move(len(self.segments), 0)
+
+    def reparse(self, pos, later, delta):
+        """Parse from `pos` until a statement starts where an old segment at or after index `later` started.
+
+        Returns:
+            tuple: The newly parsed segments and the index of the first old segment kept after them;
+                   after a syntax error, the old segments the failed statement covers are dropped.
+        """
+        old = self.segments
+        buffer = self.buffer
+        lexer = Lexer(buffer)
+        lexer.seek(pos, buffer.line(pos), buffer.line_start(pos))
+        new = []
+        k = later
+        start = pos
+        parser = None
+        try:
+            parser = Parser(lexer)
+            while parser.current_token.type != Token.EOF:
+                start = lexer.token_start
+                while k < len(old) and self.start_of(k) + delta < start:
+                    k += 1
+                if k < len(old) and self.start_of(k) + delta == start:
+                    break
+                new.append(Segment(start, parser.statement()))
+            else:
+                k = len(old)
+        except Exception as e:
+            at_eof = parser is not None and parser.current_token.type == Token.EOF
+            new.append(Segment(start, None, e, at_eof))
+            # The error segment spans every old statement starting up to where the parse failed.
+            while k < len(old) and self.start_of(k) + delta <= lexer.pos:
+                k += 1
+        return new, k
+
+    def append(self, text):
+        """Add text at the end of the buffer."""
+        self.edit(len(self.buffer), len(self.buffer), text)
+
+    def commit(self):
+        """Make the whole current buffer final: later edits may only change text after it."""
+        self.committed = len(self.buffer)
+
+    def discard(self):
+        """Remove every uncommitted part of the buffer."""
+        self.edit(self.committed, len(self.buffer), '')
+
+    def pending(self):
+        """Return the segments that start in the uncommitted part of the buffer."""
+        self.settle()
+        return self.segments[self.find(self.committed):]
+
+    def statements(self):
+        """Return the parsed top-level statements, raising the first syntax error in the buffer."""
+        self.settle()
+        for segment in self.segments:
+            if segment.error is not None:
+                raise segment.error
+        return [segment.statement for segment in self.segments]
+
+# A line ending an input that started a while loop; without one, the loop body continues until a blank line.
+ENDWHILE_PATTERN = re.compile(r'\bendwhile\s*$', re.IGNORECASE)
+
+class Repl:
+    """An interactive session that runs each complete input as soon as it is entered.
+
+    Input lines are appended to an `IncrementalParser`, so each line only re-parses the statement
+    being typed. An input is complete when it parses, unless it is an open `while` loop, which
+    continues until `endwhile` or a blank line; an input whose syntax error is at the end of the
+    buffer, such as an `if` without `endif`, asks for more lines. Complete inputs run on one
+    `Interpreter`, so variables persist between them, and are then committed to the session.
+
+    Attributes:
+        parser (IncrementalParser): The session source.
+        interpreter (Interpreter): Runs the inputs and holds the session variables.
+    """
+    PROMPT = '>>> '
+    CONTINUATION = '... '
+
+    def __init__(self, engine='tree', output=None):
+        self.parser = IncrementalParser()
+        self.interpreter = Interpreter(None, engine=engine, output=output)
+
+    def feed(self, line):
+        """Add one line of input and run the pending input if it is complete.
+
+        Returns:
+            bool: True if more lines are needed to complete the input.
+
+        Raises:
+            Exception: A syntax error, after which the input is dropped from the session, or a runtime error.
+        """
+        self.parser.append(line + '\n')
+        pending = self.parser.pending()
+        if not pending:
+            return False
+        blank = not line.strip()
+        for segment in pending:
+            if segment.error is not None:
+                if segment.at_eof and not blank:
+                    return True
+                self.parser.discard()
+                raise segment.error
+        if isinstance(pending[-1].statement, While) and not blank and not ENDWHILE_PATTERN.search(line):
+            return True
+        self.parser.commit()
+        interpreter = self.interpreter
+        try:
+            getattr(interpreter, 'run_' + interpreter.engine)([segment.statement for segment in pending])
+        except Exception:
+            del interpreter.scopes[1:]  # an error inside a loop body leaves its scope open
+            raise
+        finally:
+            interpreter.output.flush()
+        return False
+
+    def run(self, stdin=None, stdout=None):
+        """Read lines until end of input, prompting and reporting errors on `stdout`."""
+        stdin = stdin if stdin is not None else sys.stdin
+        stdout = stdout if stdout is not None else sys.stdout
+        more = False
+        while True:
+            stdout.write(self.CONTINUATION if more else self.PROMPT)
+            stdout.flush()
+            line = stdin.readline()
+            if not line:
+                break
+            try:
+                more = self.feed(line.rstrip('\n'))
+            except Exception as e:
+                more = False
+                stdout.write(f"Error: {e}\n")
+        stdout.write('\n')
+
+def main(argv=None):
+    """Command-line entry point: start an interactive session."""
+    parser = argparse.ArgumentParser(description="Interactive interpreter session.")
+    parser.add_argument('--engine', default='tree', help="execution engine")
+    args = parser.parse_args(argv)
+    Repl(engine=args.engine).run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
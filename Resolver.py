@@ -0,0 +1,140 @@
+class _Undefined:
+    """Marker type for frame slots whose variable has not been assigned yet."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<undefined>'
+
+UNDEFINED = _Undefined()
+
+def new_frame(names, scopes):
+    """Create a frame for the given slot names, filled from a stack of scope dictionaries.
+
+    Args:
+        names (list of str): The variable name of each slot.
+        scopes (list of dict): The scopes stack to read initial values from, innermost last.
+
+    Returns:
+        list: One value per slot, `UNDEFINED` where the variable is not defined in any scope.
+    """
+    frame = [UNDEFINED] * len(names)
+    for index, name in enumerate(names):
+        for scope in reversed(scopes):
+            if name in scope:
+                frame[index] = scope[name]
+                break
+    return frame
+
+def store_frame(names, frame, scope):
+    """Write every defined slot of a frame back into a scope dictionary."""
+    for name, value in zip(names, frame):
+        if value is not UNDEFINED:
+            scope[name] = value
+
+class Resolver:
+    """Assign every variable of a program a fixed slot index in a flat runtime frame.
+
+    Backends read and write variables as `frame[slot]` instead of walking the scopes
+    stack. To keep the block scoping rule of `Interpreter.enter_scope`/`exit_scope`,
+    the resolver also records which slots each `While` body can assign: a backend resets
+    the ones that were undefined when the iteration started back to `UNDEFINED` when it
+    ends, so new names are dropped while updates to existing names are kept.
+
+    Attributes:
+        names (list of str): The variable name of each slot.
+        slots (dict): Maps each variable name to its slot index.
+        block_slots (dict): Maps each `While` node to the sorted tuple of slots assigned in its body.
+    """
+    def __init__(self):
+        self.names = []
+        self.slots = {}
+        self.block_slots = {}
+
+    def resolve(self, tree):
+        """Resolve all variables in the tree and return the resolver."""
+        self.visit(tree)
+        return self
+
+    def slot(self, name):
+        """Return the slot index of a variable, allocating a new slot on first use."""
+        if name not in self.slots:
+            self.slots[name] = len(self.names)
+            self.names.append(name)
+        return self.slots[name]
+
+    def new_frame(self, scopes):
+        """Create a frame for this program filled from a stack of scope dictionaries."""
+        return new_frame(self.names, scopes)
+
+    def store_frame(self, frame, scope):
+        """Write every defined slot of a frame back into a scope dictionary."""
+        store_frame(self.names, frame, scope)
+
+    def visit(self, node):
+        """Resolve a node or a list of nodes and return the set of slots they assign."""
+        if isinstance(node, list):
+            assigned = set()
+            for n in node:
+                assigned |= self.visit(n)
+            return assigned
+        method_name = 'visit_' + type(node).__name__
+        visitor = getattr(self, method_name, self.no_visit_method)
+        return visitor(node)
+
+    def no_visit_method(self, node):
+        """Handle undefined node types by raising an exception."""
+        raise Exception(f"No resolver method defined for {type(node).__name__}")
+
+    def visit_Num(self, node):
+        """Numbers reference no variables."""
+        return set()
+
+    def visit_Var(self, node):
+        """Allocate a slot for a variable read."""
+        self.slot(node.value)
+        return set()
+
+    def visit_BinOp(self, node):
+        """Resolve both operands of a binary operation."""
+        self.visit(node.left)
+        self.visit(node.right)
+        return set()
+
+    def visit_Array(self, node):
+        """Resolve the elements of an array literal."""
+        self.visit(node.elements)
+        return set()
+
+    def visit_Range(self, node):
+        """Resolve the bounds of a range."""
+        self.visit(node.start)
+        self.visit(node.stop)
+        return set()
+
+    def visit_Index(self, node):
+        """Resolve the array and position of an index expression."""
+        self.visit(node.value)
+        self.visit(node.index)
+        return set()
+
+    def visit_Assign(self, node):
+        """Resolve the assigned expression and allocate a slot for the target."""
+        self.visit(node.right)
+        return {self.slot(node.left.value)}
+
+    def visit_Print(self, node):
+        """Resolve the printed expression."""
+        self.visit(node.value)
+        return set()
+
+    def visit_If(self, node):
+        """Resolve the condition and body of an if statement; its body shares the enclosing scope."""
+        self.visit(node.condition)
+        return self.visit(node.body)
+
+    def visit_While(self, node):
+        """Resolve a while loop and record the slots its body assigns."""
+        self.visit(node.condition)
+        assigned = self.visit(node.body)
+        self.block_slots[node] = tuple(sorted(assigned))
+        return assigned
@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import json
+import sys
+from Lexer import Lexer
+from _Parser import Parser
+from Interperter import Interpreter
+from Cache import ProgramCache
+from Output import CollectorSink
+from Evaluator import StackEvaluator, EXEC
+
+class StepLimitExceeded(Exception):
+    """Raised when a program runs more steps than its budget allows."""
+
+class Stepper:
+    """Execute a program one step at a time on an interpreter's scopes.
+
+    `execute` is a generator that yields once per simple statement, `if` statement and `while`
+    condition check, so a driver can pause the run between any two steps. The program runs on
+    the interpreter's `StackEvaluator`, with the tree engine's semantics, and the statements and
+    loops of called function bodies are steps too, so a long call cannot run past a pause.
+
+    Attributes:
+        interpreter (Interpreter): Supplies the scopes, the functions and the output sink.
+    """
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def execute(self, nodes):
+        """Run a list of statements, yielding once per step."""
+        return StackEvaluator(self.interpreter).steps([(EXEC, node) for node in reversed(nodes)], [])
+
+class ExecutionService:
+    """Run many programs concurrently on one asyncio event loop.
+
+    Every run is driven by a `Stepper` and gives control back to the event loop every
+    `yield_every` steps, so a long or endless loop cannot block other runs. Each run is bounded
+    by a step budget and a wall-clock timeout. Parsed programs are shared through a `ProgramCache`.
+
+    Attributes:
+        yield_every (int): The number of steps a run takes before yielding to the event loop.
+        max_steps (int or None): The default step budget of a run.
+        timeout (float or None): The default wall-clock limit of a run, in seconds.
+        cache (ProgramCache): The cache of parsed programs.
+        completed (int): The number of runs finished, successfully or not.
+    """
+    def __init__(self, yield_every=1000, max_steps=None, timeout=None, cache=None):
+        if yield_every < 1:
+            raise ValueError("yield_every must be at least 1")
+        self.yield_every = yield_every
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.cache = cache if cache is not None else ProgramCache()
+        self.completed = 0
+
+    async def run(self, source, max_steps=None, timeout=None):
+        """Run a program and return its result.
+
+        Args:
+            source (str): The program source.
+            max_steps (int, optional): The step budget, overriding the service default.
+            timeout (float, optional): The wall-clock limit in seconds, overriding the service default.
+
+        Returns:
+            dict: The captured 'output', the final global 'scope', the number of 'steps' taken and
+                  the 'error' that stopped the program, formatted as 'Type: message' (None on success).
+        """
+        max_steps = max_steps if max_steps is not None else self.max_steps
+        timeout = timeout if timeout is not None else self.timeout
+        sink = CollectorSink()
+        state = {'steps': 0, 'interpreter': None}
+        error = None
+        try:
+            await asyncio.wait_for(self._execute(source, sink, max_steps, state), timeout)
+        except asyncio.TimeoutError:
+            error = f"TimeoutError: Run exceeded {timeout} seconds"
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        self.completed += 1
+        interpreter = state['interpreter']
+        scope = dict(interpreter.scopes[0]) if interpreter is not None else {}
+        return {'output': sink.getvalue(), 'scope': scope, 'steps': state['steps'], 'error': error}
+
+    async def _execute(self, source, sink, max_steps, state):
+        """Parse and step through a program, yielding to the event loop every `yield_every` steps."""
+        interpreter = Interpreter(Parser(Lexer(source)), cache=self.cache, output=sink)
+        state['interpreter'] = interpreter
+        tree = interpreter.parse()
+        yield_every = self.yield_every
+        steps = 0
+        run = Stepper(interpreter).execute(tree)
+        try:
+            for _ in run:
+                steps += 1
+                if max_steps is not None and steps > max_steps:
+                    raise StepLimitExceeded(f"Run exceeded {max_steps} steps")
+                if steps % yield_every == 0:
+                    state['steps'] = steps
+                    await asyncio.sleep(0)
+        finally:
+            run.close()  # leaves the scopes as they were outside any call in progress
+            state['steps'] = min(steps, max_steps) if max_steps is not None else steps
+
+    async def handle(self, line):
+        """Answer one JSON request line with a JSON response line.
+
+        A request is an object with a 'source' and optionally an 'id', 'max_steps' and 'timeout';
+        the response is the run result with the request's 'id'.
+        """
+        try:
+            request = json.loads(line)
+            source = request['source']
+        except (ValueError, KeyError, TypeError) as e:
+            return json.dumps({'id': None, 'error': f'BadRequest: {e}'})
+        result = await self.run(source, request.get('max_steps'), request.get('timeout'))
+        result['id'] = request.get('id')
+        return json.dumps(result, default=str)
+
+    async def serve_stdin(self, stdin=None, stdout=None):
+        """Serve JSON-lines requests from stdin until end of input, answering each as it completes."""
+        stdin = stdin if stdin is not None else sys.stdin
+        stdout = stdout if stdout is not None else sys.stdout
+        loop = asyncio.get_running_loop()
+        tasks = set()
+
+        async def answer(line):
+            stdout.write(await self.handle(line) + '\n')
+            stdout.flush()
+
+        while True:
+            line = await loop.run_in_executor(None, stdin.readline)
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.ensure_future(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def serve_unix(self, path):
+        """Serve JSON-lines requests on a Unix domain socket until cancelled."""
+        async def connection(reader, writer):
+            tasks = set()
+
+            async def answer(line):
+                writer.write((await self.handle(line) + '\n').encode('utf-8'))
+                await writer.drain()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(answer(line.decode('utf-8')))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            writer.close()
+
+        server = await asyncio.start_unix_server(connection, path=path)
+        async with server:
+            await server.serve_forever()
+
+def main(argv=None):
+    """Command-line entry point: serve JSON-lines run requests on stdin or a Unix socket."""
+    parser = argparse.ArgumentParser(description="Serve program runs over JSON lines.")
+    parser.add_argument('--socket', default=None, help="Unix socket path; reads stdin when omitted")
+    parser.add_argument('--yield-every', type=int, default=1000, help="steps between yields to the event loop")
+    parser.add_argument('--max-steps', type=int, default=None, help="default step budget per run")
+    parser.add_argument('--timeout', type=float, default=None, help="default wall-clock limit per run, in seconds")
+    args = parser.parse_args(argv)
+    service = ExecutionService(yield_every=args.yield_every, max_steps=args.max_steps, timeout=args.timeout)
+    if args.socket is not None:
+        asyncio.run(service.serve_unix(args.socket))
+    else:
+        asyncio.run(service.serve_stdin())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
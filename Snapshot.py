@@ -0,0 +1,221 @@
+import marshal
+import mmap as mmap_module
+import os
+import struct
+import tempfile
+from Interperter import Interpreter
+from Cache import CacheEntry, ProgramCache
+from FlatAST import FlatProgram
+from Bytecode import Code
+from Optimizer import Optimizer
+from Functions import Function
+import Arrays
+
+MAGIC = b'PLS2'
+HEADER = struct.Struct('<Q')  # the length of the marshalled header following it
+ALIGNMENT = 8                 # array data starts on a multiple of this many bytes
+MARSHAL_VERSION = 2           # later versions share repeated objects by reference, which makes the bytes vary
+
+# How a scope value is stored in the header.
+VALUE = 0  # an int, bool or None, stored as it is
+ARRAY = 1  # an array, stored as (offset, length) into the data section
+
+class Snapshot:
+    """The variables, functions and compiled programs of an interpreter, saved for a warm start.
+
+    A snapshot holds a copy of `Interpreter.scopes`, the defined functions with their purity
+    and memoized results, and the entries of its `ProgramCache`: each
+    cached program in its `FlatProgram` encoding, together with the compiled artifacts that can
+    be stored without running anything ('bytecode', 'flat', 'python' and the optimized 'tree').
+    `restore` builds a new interpreter from it without re-running the setup script, and each
+    restored interpreter gets its own copy of the variables and memos, so one snapshot can start
+    many jobs.
+
+    The file format is `MAGIC`, the length of a marshalled header, the header, and then the
+    elements of every array variable as raw little-endian 64-bit integers. Variables, programs
+    functions and artifacts are written in sorted order, so the file only depends on the captured state,
+    and loading it gives the same values in any process. With `load(path, mmap=True)` array
+    variables are read-only views of the memory-mapped file rather than copies.
+
+    Attributes:
+        scopes (list of dict): The captured scopes, outermost first.
+        programs (dict): Maps each cache key to its (tree, artifacts) pair.
+        functions (dict): Maps each function name to its (definition, pure, memo) triple, where
+                          `memo` is a tuple of (arguments, result) pairs, least recently used first.
+                          Only integer, boolean and None results are written to a file.
+    """
+    def __init__(self, scopes, programs=None, functions=None):
+        self.scopes = scopes
+        self.programs = programs if programs is not None else {}
+        self.functions = functions if functions is not None else {}
+
+    @classmethod
+    def capture(cls, interpreter):
+        """Take a snapshot of an interpreter's variables, of its functions and of the programs in its cache."""
+        scopes = [dict(scope) for scope in interpreter.scopes]
+        programs = {}
+        if interpreter.cache is not None:
+            for key, entry in interpreter.cache.entries.items():
+                programs[key] = (entry.tree, dict(entry.artifacts))
+        functions = {name: (function.node, function.pure, tuple(function.memo.items()))
+                     for name, function in interpreter.functions.items()}
+        return cls(scopes, programs, functions)
+
+    def restore(self, parser=None, engine='tree', optimize=False, output=None, cache=None):
+        """Return a new interpreter starting from the snapshot.
+
+        Args:
+            parser (Parser, optional): The parser of the program the interpreter will run.
+            engine, optimize, output: Passed on to `Interpreter`.
+            cache (ProgramCache, optional): The cache the snapshot's programs are added to. Defaults
+                                            to a new cache large enough to hold all of them.
+        """
+        if cache is None:
+            cache = ProgramCache(maxsize=max(128, len(self.programs)))
+        for key, (tree, artifacts) in self.programs.items():
+            if key not in cache.entries:
+                entry = CacheEntry(key, tree)
+                entry.artifacts.update(artifacts)
+                cache.entries[key] = entry
+        while len(cache.entries) > cache.maxsize:
+            cache.entries.popitem(last=False)
+            cache.evictions += 1
+        interpreter = Interpreter(parser, engine=engine, cache=cache, optimize=optimize, output=output)
+        interpreter.scopes = [dict(scope) for scope in self.scopes]
+        for name, (node, pure, memo) in self.functions.items():
+            function = Function(node, interpreter.memo_size)
+            function.pure = pure
+            function.memo.update(memo[-function.maxsize:] if function.maxsize else ())
+            interpreter.functions[name] = function
+        return interpreter
+
+    def to_bytes(self):
+        """Serialize the snapshot into a compact byte string."""
+        data = bytearray()
+        scopes = []
+        for scope in self.scopes:
+            scopes.append(tuple(encode_value(name, scope[name], data) for name in sorted(scope)))
+        programs = []
+        for key in sorted(self.programs):
+            tree, artifacts = self.programs[key]
+            stored = []
+            for name in sorted(artifacts):
+                value = encode_artifact(name, artifacts[name])
+                if value is not None:
+                    stored.append((name, value))
+            programs.append((key, FlatProgram.encode(tree).to_bytes(), tuple(stored)))
+        functions = []
+        for name in sorted(self.functions):
+            node, pure, memo = self.functions[name]
+            memo = tuple((args, value) for args, value in memo if value is None or type(value) in (int, bool))
+            functions.append((name, FlatProgram.encode([node]).to_bytes(), pure, memo))
+        header = marshal.dumps((tuple(scopes), tuple(programs), tuple(functions)), MARSHAL_VERSION)
+        start = len(MAGIC) + HEADER.size + len(header)
+        padding = b'\0' * (-start % ALIGNMENT)
+        return MAGIC + HEADER.pack(len(header)) + header + padding + bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a snapshot serialized with `to_bytes`, from bytes or any buffer such as an `mmap`."""
+        if bytes(data[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a snapshot file")
+        offset = len(MAGIC) + HEADER.size
+        (length,) = HEADER.unpack(data[len(MAGIC):offset])
+        scopes, programs, functions = marshal.loads(data[offset:offset + length])
+        offset += length
+        offset += -offset % ALIGNMENT
+        view = memoryview(data)[offset:]
+        restored_scopes = []
+        for scope in scopes:
+            restored_scopes.append({name: decode_value(kind, value, view) for name, kind, value in scope})
+        restored_programs = {}
+        for key, tree, artifacts in programs:
+            restored_programs[key] = (FlatProgram.from_bytes(tree).decode(),
+                                      {name: decode_artifact(name, value) for name, value in artifacts})
+        restored_functions = {name: (FlatProgram.from_bytes(node).decode()[0], pure, memo)
+                              for name, node, pure, memo in functions}
+        return cls(restored_scopes, restored_programs, restored_functions)
+
+    def save(self, path):
+        """Write the snapshot to a file, replacing any existing file atomically."""
+        data = self.to_bytes()
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """Load a snapshot file.
+
+        Args:
+            path (str): The file written by `save`.
+            mmap (bool): Whether to map the file into memory instead of reading it, so array
+                         variables share the pages of the file instead of being copied.
+        """
+        with open(path, 'rb') as f:
+            if not mmap:
+                return cls.from_bytes(f.read())
+            mapped = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+        return cls.from_bytes(mapped)
+
+def encode_value(name, value, data):
+    """Return the header entry of a variable, appending the elements of an array to `data`."""
+    if value is None or isinstance(value, (int, bool)):
+        return (name, VALUE, value)
+    if Arrays.numpy is not None and isinstance(value, Arrays.numpy.ndarray):
+        elements = Arrays.numpy.ascontiguousarray(value, dtype='<i8').tobytes()
+        entry = (name, ARRAY, (len(data), len(value)))
+        data += elements
+        return entry
+    raise Exception(f"Cannot snapshot variable '{name}' of type {type(value).__name__}")
+
+def decode_value(kind, value, data):
+    """Return a variable from its header entry, reading arrays from the data section."""
+    if kind == VALUE:
+        return value
+    Arrays.require_numpy()
+    offset, length = value
+    elements = Arrays.numpy.frombuffer(data, dtype='<i8', count=length, offset=offset)
+    if isinstance(data.obj, bytes):
+        elements = elements.astype(Arrays.numpy.int64)  # a copy, so the file contents can be released
+    return elements.view(Arrays.IntArray)
+
+def encode_artifact(name, artifact):
+    """Return a marshallable form of a cached artifact, or None for artifacts that are not stored."""
+    kind = name.split(':')[0]
+    if kind == 'bytecode':
+        return (artifact.code, artifact.consts, artifact.names, artifact.blocks)
+    if kind == 'flat':
+        return artifact.to_bytes()
+    if kind == 'python':
+        return artifact
+    if kind == 'tree':
+        tree, optimizer = artifact
+        return (FlatProgram.encode(tree).to_bytes(), optimizer.removed, optimizer.hoisted,
+                optimizer.reduced, optimizer.temporaries)
+    return None
+
+def decode_artifact(name, value):
+    """Rebuild a cached artifact from the form returned by `encode_artifact`."""
+    kind = name.split(':')[0]
+    if kind == 'bytecode':
+        code = Code()
+        code.code, code.consts, code.names, code.blocks = value
+        return code
+    if kind == 'flat':
+        return FlatProgram.from_bytes(value)
+    if kind == 'python':
+        return value
+    tree, removed, hoisted, reduced, temporaries = value
+    optimizer = Optimizer(loops=True)
+    optimizer.removed = removed
+    optimizer.hoisted = hoisted
+    optimizer.reduced = reduced
+    optimizer.temporaries = temporaries
+    return FlatProgram.from_bytes(tree).decode(), optimizer
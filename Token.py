@@ -4,6 +4,10 @@ class Token:
     THEN = 'THEN'
     WHILE = 'WHILE'
     ENDWHILE = 'ENDWHILE'
+    DEF = 'DEF'
+    ENDDEF = 'ENDDEF'
+    RETURN = 'RETURN'
+    GLOBAL = 'GLOBAL'
     INTEGER = 'INTEGER'
     IDENTIFIER = 'IDENTIFIER'
     OPERATOR = 'OPERATOR'
@@ -12,19 +16,46 @@ class Token:
     PRINT = 'PRINT'
     EOF = 'EOF' 
 
-    def __init__(self, type_, value):
+    __slots__ = ('type', 'value', 'line', 'column')
+
+    _fixed = {}
+
+    def __init__(self, type_, value, line=None, column=None):
         """Initialize a new instance of Token.
 
         Args:
             type_ (str): The type of the token (e.g., 'INTEGER', 'IDENTIFIER').
             value (str or int): The value of the token, such as a variable name, literal number, or operator.
+            line (int, optional): The 1-based source line the token starts on, when known.
+            column (int, optional): The 1-based source column the token starts at, when known.
 
         Attributes:
             type (str): The category or type of the token as defined by the constants.
             value (str or int): The actual lexeme or value associated with the token.
+            line (int or None): The source line of the token.
+            column (int or None): The source column of the token.
         """
         self.type = type_
         self.value = value
+        self.line = line
+        self.column = column
+
+    @classmethod
+    def fixed(cls, type_, value):
+        """Return the shared token for an operator, keyword, assignment or EOF lexeme.
+
+        Fixed tokens are interned: every occurrence of the same type and lexeme is the same
+        object, which carries no source position.
+
+        Args:
+            type_ (str): The type of the token.
+            value (str or None): The lexeme of the token.
+        """
+        key = (type_, value)
+        token = cls._fixed.get(key)
+        if token is None:
+            token = cls._fixed[key] = cls(type_, value)
+        return token
 
     def __str__(self):
         """Return a string representation of the Token instance for easy debugging."""
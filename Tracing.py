@@ -0,0 +1,307 @@
+from AST import BinOp, Num, Var, Assign, Print, If, Array, Range, Index
+from Transpiler import Transpiler, HELPERS, PYTHON_OPERATORS
+
+# Values a compiled trace returns.
+FINISHED = -1  # the loop condition became false
+
+def traceable(node):
+    """Return whether a `Trace` can compile a node or list of nodes.
+
+    Loops are not traced, and every statement and expression must have a `Transpiler` translation.
+    """
+    if isinstance(node, list):
+        return all(traceable(n) for n in node)
+    if isinstance(node, (Num, Var)):
+        return True
+    if isinstance(node, BinOp):
+        return node.op.value in PYTHON_OPERATORS and traceable(node.left) and traceable(node.right)
+    if isinstance(node, Assign):
+        return traceable(node.right)
+    if isinstance(node, Print):
+        return traceable(node.value)
+    if isinstance(node, If):
+        return traceable(node.condition) and traceable(node.body)
+    if isinstance(node, Array):
+        return traceable(node.elements)
+    if isinstance(node, Range):
+        return traceable(node.start) and traceable(node.stop)
+    if isinstance(node, Index):
+        return traceable(node.value) and traceable(node.index)
+    return False
+
+class Guard:
+    """A branch decision a trace depends on.
+
+    Attributes:
+        node (If): The if statement.
+        taken (bool): Whether the recorded iteration ran the body.
+        continuation (list of tuple): The (statements, index) pairs that finish the iteration
+                                      after the if statement, innermost block first.
+    """
+    __slots__ = ('node', 'taken', 'continuation')
+
+    def __init__(self, node, taken, continuation):
+        self.node = node
+        self.taken = taken
+        self.continuation = continuation
+
+class Trace:
+    """A `while` loop compiled along one path through its body.
+
+    The generated function keeps every variable of the loop in a Python local and runs whole
+    iterations as straight-line code: the statements of the recorded path in order, with each
+    `if` replaced by a guard checking that its condition still goes the recorded way. It
+    returns `FINISHED` when the loop condition becomes false, or the index of the first guard
+    that failed, leaving the iteration part-way through.
+
+    The function communicates through a state list: `state[0]` holds the values of `names` on
+    entry and exit, `state[1]` the values of `assigned` when the current iteration started (None
+    between iterations) and `state[2]` the number of complete iterations run.
+
+    Attributes:
+        names (list of str): Every variable the loop reads or assigns, in the order of the values.
+        assigned (list of str): The variables the loop body assigns; they come first in `names`.
+        guards (list of Guard): The guards, indexed by the values the function returns.
+        source (str): The generated Python source.
+        function (callable): The compiled trace.
+    """
+    def __init__(self, node, state, decisions):
+        transpiler = Transpiler()
+        self.transpiler = transpiler
+        self.assigned = state.assigned
+        self.names = state.names
+        self.guards = []
+        self.decisions = decisions
+        locals_ = ', '.join(transpiler.local(name) for name in self.names)
+        assigned = ''.join(transpiler.local(name) + ', ' for name in self.assigned)
+        lines = ['def __trace(__state, __emit):',
+                 f'    ({locals_},) = __state[0]',
+                 '    __n = 0',
+                 '    try:',
+                 '        while True:',
+                 '            __state[1] = None',
+                 f'            if not {transpiler.expression(node.condition)}:',
+                 f'                return {FINISHED}',
+                 f'            __state[1] = ({assigned})']
+        self.block(node.body, 3, [], lines)
+        lines += ['            __n += 1',
+                  '    finally:',
+                  f'        __state[0] = ({locals_},)',
+                  '        __state[2] = __n']
+        self.source = '\n'.join(lines) + '\n'
+        namespace = dict(HELPERS)
+        exec(compile(self.source, '<trace>', 'exec'), namespace)
+        self.function = namespace['__trace']
+
+    def block(self, nodes, indent, continuation, lines):
+        """Append the recorded path through a list of statements to the generated lines.
+
+        Args:
+            continuation (list of tuple): Where the iteration continues after this block, innermost first.
+        """
+        transpiler = self.transpiler
+        pad = '    ' * indent
+        for index, node in enumerate(nodes):
+            if isinstance(node, If):
+                taken = self.decisions.get(node, False)
+                after = [(nodes, index + 1)] + continuation
+                condition = transpiler.expression(node.condition)
+                lines.append(pad + (f'if not {condition}:' if taken else f'if {condition}:'))
+                lines.append(pad + f'    return {len(self.guards)}')
+                self.guards.append(Guard(node, taken, after))
+                if taken:
+                    self.block(node.body, indent, after, lines)
+            else:
+                transpiler.block([node], indent, set())
+                lines.append(transpiler.lines.pop())
+
+class LoopState:
+    """The tracing state of one `while` loop.
+
+    Attributes:
+        assigned (list of str): The variables the loop body assigns.
+        names (list of str): Every variable the loop uses, starting with `assigned`.
+        trace (Trace or None): The compiled trace, if one is being used.
+        failures (int): Guard failures of the current trace.
+        retraces (int): How many times the loop was traced again after its trace kept failing.
+        disabled (bool): Whether the loop is never traced, e.g. because its body is not `traceable`.
+    """
+    __slots__ = ('assigned', 'names', 'trace', 'failures', 'retraces', 'disabled')
+
+    def __init__(self, node):
+        transpiler = Transpiler()
+        self.assigned = sorted(transpiler.assigned(node.body))
+        self.names = self.assigned + sorted(transpiler.collect(node) - set(self.assigned))
+        self.trace = None
+        self.failures = 0
+        self.retraces = 0
+        self.disabled = not traceable(node.condition) or not traceable(node.body)
+
+class LoopTracer:
+    """Compile hot `while` loops of the tree-walking interpreter into straight-line traces.
+
+    `Interpreter.visit_While` counts the iterations of every loop run and hands it to `run` once
+    it has run `threshold` iterations. The tracer interprets one more iteration, recording which
+    way every `if` goes, compiles that path into a `Trace` and runs the rest of the loop with it.
+    When a guard fails, the interpreter finishes the current iteration from the failing `if` on
+    and the trace takes over again; after `max_failures` failures the loop is traced again along
+    its new path, and after `max_retraces` retraces it is left to `visit_While`.
+
+    A loop is traced only if its body has no nested loop and only uses expressions the
+    `Transpiler` supports, every variable it reads is defined, and every variable it assigns is
+    already defined in the current scope. Iterations then cannot introduce names, so running
+    them directly on the current scope, without the per-iteration scope of `visit_While`,
+    leaves the same variables. If an iteration raises, the scopes are left as `visit_While`
+    would leave them: the values from the start of the iteration in the current scope, under a
+    new scope holding the partial iteration.
+
+    Attributes:
+        interpreter (Interpreter): The interpreter whose loops are traced.
+        threshold (int): The iterations a loop runs interpreted before it is traced.
+        max_failures (int): The guard failures after which a loop is traced again.
+        max_retraces (int): How many times a loop may be traced again before tracing it is abandoned.
+        loops (dict): Maps each `While` node of the program being run to its `LoopState`; cleared
+                      by `Interpreter.run_tree` for every program, so old trees are not kept alive.
+        traces (int): The number of traces compiled.
+        trace_iterations (int): The number of complete iterations run by traces.
+        guard_failures (int): The number of guard failures.
+    """
+    def __init__(self, interpreter, threshold=10, max_failures=3, max_retraces=3):
+        self.interpreter = interpreter
+        self.threshold = threshold
+        self.max_failures = max_failures
+        self.max_retraces = max_retraces
+        self.loops = {}
+        self.traces = 0
+        self.trace_iterations = 0
+        self.guard_failures = 0
+
+    def run(self, node):
+        """Continue a hot loop with its trace.
+
+        Returns:
+            bool: True if the loop has finished, False if `visit_While` should continue it.
+        """
+        state = self.loops.get(node)
+        if state is None:
+            state = self.loops[node] = LoopState(node)
+        while not state.disabled:
+            values = self.load(state)
+            if values is None:
+                state.disabled = True
+            elif state.trace is None:
+                decisions = {}
+                if not self.record(node, decisions):
+                    return True
+                try:
+                    state.trace = Trace(node, state, decisions)
+                except (SyntaxError, RecursionError, MemoryError):
+                    # The loop is traceable, but its source nests deeper than Python can compile.
+                    state.disabled = True
+                    break
+                self.traces += 1
+                state.failures = 0
+            elif self.execute(state, values):
+                return True
+        return False
+
+    def load(self, state):
+        """Return the values of the loop's variables, or None if the loop cannot be traced now."""
+        interpreter = self.interpreter
+        current = interpreter.current_scope()
+        if any(name not in current for name in state.assigned):
+            return None
+        values = []
+        for name in state.names:
+            for scope in reversed(interpreter.scopes):
+                if name in scope:
+                    values.append(scope[name])
+                    break
+            else:
+                return None
+        return tuple(values)
+
+    def record(self, node, decisions):
+        """Interpret one iteration of a loop, recording the outcome of every if statement.
+
+        Returns:
+            bool: False if the loop condition was false, so there was no iteration.
+        """
+        interpreter = self.interpreter
+        if not interpreter.visit(node.condition):
+            return False
+        interpreter.enter_scope()
+        self.record_block(node.body, decisions)
+        interpreter.exit_scope()
+        return True
+
+    def record_block(self, nodes, decisions):
+        """Interpret a list of statements, recording the outcome of every if statement."""
+        interpreter = self.interpreter
+        for statement in nodes:
+            if isinstance(statement, If):
+                taken = bool(interpreter.visit(statement.condition))
+                decisions[statement] = taken
+                if taken:
+                    self.record_block(statement.body, decisions)
+            else:
+                interpreter.visit(statement)
+
+    def execute(self, state, values):
+        """Run a loop's trace from the current values, finishing any iteration a guard interrupts.
+
+        Returns:
+            bool: True if the loop has finished.
+        """
+        trace = state.trace
+        interpreter = self.interpreter
+        run_state = [values, None, 0]
+        try:
+            result = trace.function(run_state, interpreter.output.emit)
+        except BaseException:
+            self.store(trace, run_state)
+            raise
+        finally:
+            self.trace_iterations += run_state[2]
+        self.store(trace, run_state)
+        if result == FINISHED:
+            return True
+        self.guard_failures += 1
+        state.failures += 1
+        if state.failures >= self.max_failures:
+            state.trace = None
+            state.retraces += 1
+            state.disabled = state.retraces > self.max_retraces
+        guard = trace.guards[result]
+        if not guard.taken:
+            interpreter.visit(guard.node.body)
+        for statements, index in guard.continuation:
+            interpreter.visit(statements[index:])
+        interpreter.exit_scope()
+        return False
+
+    def store(self, trace, run_state):
+        """Write the values a trace left back into the scopes.
+
+        In the middle of an iteration the scopes are set up as `visit_While` has them: the current
+        scope gets the values from the start of the iteration and a new scope the current values.
+        """
+        interpreter = self.interpreter
+        current, started = run_state[0], run_state[1]
+        scope = interpreter.current_scope()
+        if started is not None:
+            for name, value in zip(trace.assigned, started):
+                scope[name] = value
+            interpreter.enter_scope()
+            scope = interpreter.current_scope()
+        for name, value in zip(trace.assigned, current):
+            scope[name] = value
+
+    def stats(self):
+        """Return the tracing counters as a dictionary."""
+        return {
+            'traces': self.traces,
+            'trace_iterations': self.trace_iterations,
+            'guard_failures': self.guard_failures,
+            'disabled': sum(1 for state in self.loops.values() if state.disabled),
+        }
@@ -0,0 +1,204 @@
+import re
+from functools import lru_cache
+from AST import BinOp, Num, Var, Assign, Print, If, While, Array, Range, Index
+import Arrays
+
+PYTHON_OPERATORS = {'+': '+', '-': '-', '*': '*', '/': '//', '==': '==', '>': '>', '<': '<'}
+
+UNBOUND_PATTERN = re.compile(r"local variable '(\w+)'")
+
+# The globals of generated code: the array operations its expressions call.
+HELPERS = {'__array': Arrays.array, '__arange': Arrays.arange, '__index': Arrays.index}
+
+def python_name(name):
+    """Return the Python local variable used for a program variable.
+
+    Program variables become `v_<name>`; optimizer temporaries (`$name`) become `t_<name>`.
+    Names that are still not valid Python identifiers are hex-encoded.
+    """
+    if name.startswith('$') and name[1:].isidentifier():
+        return 't_' + name[1:]
+    candidate = 'v_' + name
+    if candidate.isidentifier():
+        return candidate
+    return 'h_' + name.encode('utf-8').hex()
+
+@lru_cache(maxsize=256)
+def load(source):
+    """Compile generated source and return its `__program` function; results are cached by source text."""
+    namespace = dict(HELPERS)
+    exec(compile(source, '<transpiled>', 'exec'), namespace)
+    return namespace['__program']
+
+class Transpiler:
+    """Translate an AST into the source of an equivalent Python function.
+
+    The generated `__program(__scope, __emit)` keeps every program variable in a Python local,
+    loaded from the `__scope` dictionary on entry and written back on exit, and calls `__emit`
+    for every `print`. Division is emitted as `//`, and array literals, ranges and indexing
+    call the `Arrays` functions bound in `HELPERS`. The block scoping of `while` bodies is
+    preserved: a variable that may be undefined when an iteration starts is deleted again when
+    the iteration ends, so names introduced by the body do not outlive it.
+
+    Attributes:
+        names (dict): Maps each Python local back to the program variable it holds.
+        lines (list of str): The generated source lines.
+    """
+    def __init__(self):
+        self.names = {}
+        self.lines = []
+        self.flags = 0
+
+    def generate(self, tree):
+        """Return the Python source of a program given as a list of statement nodes."""
+        variables = sorted(self.collect(tree))
+        self.emit(0, 'def __program(__scope, __emit):')
+        for name in variables:
+            self.emit(1, 'try:')
+            self.emit(2, f'{self.local(name)} = __scope[{name!r}]')
+            self.emit(1, 'except KeyError:')
+            self.emit(2, 'pass')
+        self.emit(1, 'try:')
+        self.block(tree, 2, set())
+        self.emit(1, 'finally:')
+        for name in variables:
+            self.emit(2, 'try:')
+            self.emit(3, f'__scope[{name!r}] = {self.local(name)}')
+            self.emit(2, 'except NameError:')
+            self.emit(3, 'pass')
+        self.emit(2, 'pass')
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, indent, line):
+        """Append a source line at the given indentation level."""
+        self.lines.append('    ' * indent + line)
+
+    def local(self, name):
+        """Return the Python local for a program variable, recording the mapping."""
+        local = python_name(name)
+        self.names[local] = name
+        return local
+
+    def collect(self, node):
+        """Return the set of variable names read or assigned in a node or list of nodes."""
+        if isinstance(node, list):
+            names = set()
+            for n in node:
+                names |= self.collect(n)
+            return names
+        if isinstance(node, Var):
+            return {node.value}
+        if isinstance(node, BinOp):
+            return self.collect(node.left) | self.collect(node.right)
+        if isinstance(node, Assign):
+            return {node.left.value} | self.collect(node.right)
+        if isinstance(node, Print):
+            return self.collect(node.value)
+        if isinstance(node, (If, While)):
+            return self.collect(node.condition) | self.collect(node.body)
+        if isinstance(node, Array):
+            return self.collect(node.elements)
+        if isinstance(node, Range):
+            return self.collect(node.start) | self.collect(node.stop)
+        if isinstance(node, Index):
+            return self.collect(node.value) | self.collect(node.index)
+        return set()
+
+    def assigned(self, nodes):
+        """Return the names assigned anywhere in a list of statements."""
+        names = set()
+        for node in nodes:
+            if isinstance(node, Assign):
+                names.add(node.left.value)
+            elif isinstance(node, (If, While)):
+                names |= self.assigned(node.body)
+        return names
+
+    def block(self, nodes, indent, defined):
+        """Emit a list of statements.
+
+        Args:
+            nodes (list of AST): The statements.
+            indent (int): The indentation level.
+            defined (set of str): Variables certainly assigned before the block starts.
+        """
+        defined = set(defined)
+        if not nodes:
+            self.emit(indent, 'pass')
+        for node in nodes:
+            if isinstance(node, Assign):
+                self.emit(indent, f'{self.local(node.left.value)} = {self.expression(node.right)}')
+                defined.add(node.left.value)
+            elif isinstance(node, Print):
+                self.emit(indent, f'__emit({self.expression(node.value)})')
+            elif isinstance(node, If):
+                self.emit(indent, f'if {self.expression(node.condition)}:')
+                self.block(node.body, indent + 1, defined)
+            elif isinstance(node, While):
+                self.loop(node, indent, defined)
+            else:
+                raise Exception(f"No Python translation defined for {type(node).__name__}")
+
+    def loop(self, node, indent, defined):
+        """Emit a while loop, deleting the names an iteration introduced when it ends."""
+        self.emit(indent, f'while {self.expression(node.condition)}:')
+        maybe_new = sorted(self.assigned(node.body) - defined)
+        flags = []
+        for name in maybe_new:
+            flag = f'__new{self.flags}'
+            self.flags += 1
+            flags.append((flag, name))
+            self.emit(indent + 1, 'try:')
+            self.emit(indent + 2, self.local(name))
+            self.emit(indent + 2, f'{flag} = False')
+            self.emit(indent + 1, 'except NameError:')
+            self.emit(indent + 2, f'{flag} = True')
+        self.block(node.body, indent + 1, defined)
+        for flag, name in flags:
+            self.emit(indent + 1, f'if {flag}:')
+            self.emit(indent + 2, 'try:')
+            self.emit(indent + 3, f'del {self.local(name)}')
+            self.emit(indent + 2, 'except NameError:')
+            self.emit(indent + 3, 'pass')
+
+    def expression(self, node):
+        """Return the Python source of an expression."""
+        if isinstance(node, Num):
+            return repr(node.value)
+        if isinstance(node, Var):
+            return self.local(node.value)
+        if isinstance(node, BinOp):
+            op = PYTHON_OPERATORS.get(node.op.value)
+            if op is None:
+                raise ValueError(f"Unsupported operator '{node.op.value}'")
+            return f'({self.expression(node.left)} {op} {self.expression(node.right)})'
+        if isinstance(node, Array):
+            return f"__array([{', '.join(self.expression(element) for element in node.elements)}])"
+        if isinstance(node, Range):
+            return f'__arange({self.expression(node.start)}, {self.expression(node.stop)})'
+        if isinstance(node, Index):
+            return f'__index({self.expression(node.value)}, {self.expression(node.index)})'
+        raise Exception(f"No Python translation defined for {type(node).__name__}")
+
+def transpile(tree):
+    """Return the generated Python source of a program and the map from Python locals to program variables."""
+    transpiler = Transpiler()
+    source = transpiler.generate(tree)
+    return source, transpiler.names
+
+def run(source, names, scope, emit):
+    """Run a transpiled program against a scope dictionary.
+
+    Args:
+        source (str): The generated source returned by `transpile`.
+        names (dict): The map from Python locals to program variables returned by `transpile`.
+        scope (dict): Initial variable values; updated with the final values.
+        emit (callable): Called with the value of every executed `print`.
+    """
+    program = load(source)
+    try:
+        program(scope, emit)
+    except UnboundLocalError as error:
+        match = UNBOUND_PATTERN.search(str(error))
+        name = names.get(match.group(1), match.group(1)) if match else '?'
+        raise NameError(f"Variable '{name}' not defined") from None
@@ -0,0 +1,94 @@
+from Bytecode import (LOAD_CONST, LOAD_SLOT, STORE_SLOT, ADD, SUB, MUL, FLOORDIV, EQ, GT, LT,
+                      JUMP, JUMP_IF_FALSE, ENTER_BLOCK, EXIT_BLOCK, PRINT, BUILD_ARRAY, BUILD_RANGE, INDEX, OPNAMES)
+from Resolver import UNDEFINED, new_frame, store_frame
+import Arrays
+
+class VM:
+    """A stack-based virtual machine executing programs compiled by `BytecodeCompiler`."""
+    def __init__(self, interpreter):
+        """Initialize the VM for a given interpreter.
+
+        Args:
+            interpreter (Interpreter): The interpreter whose variables the program reads and writes.
+        """
+        self.interpreter = interpreter
+
+    def run(self, code):
+        """Execute a `Code` object, loading its frame from the interpreter's scopes and storing it back afterwards."""
+        frame = new_frame(code.names, self.interpreter.scopes)
+        try:
+            self.execute(code, frame)
+        finally:
+            store_frame(code.names, frame, self.interpreter.current_scope())
+
+    def execute(self, code, frame):
+        """Run the instruction array of a `Code` object over a slot frame with a flat dispatch loop."""
+        instructions = code.code
+        consts = code.consts
+        names = code.names
+        blocks = code.blocks
+        emit = self.interpreter.output.emit
+        fresh_slots = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        end = len(instructions)
+        while pc < end:
+            op = instructions[pc]
+            arg = instructions[pc + 1]
+            pc += 2
+            if op == LOAD_SLOT:
+                value = frame[arg]
+                if value is UNDEFINED:
+                    raise NameError(f"Variable '{names[arg]}' not defined")
+                push(value)
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == STORE_SLOT:
+                frame[arg] = pop()
+            elif op == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == LT:
+                right = pop()
+                stack[-1] = stack[-1] < right
+            elif op == GT:
+                right = pop()
+                stack[-1] = stack[-1] > right
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == ENTER_BLOCK:
+                fresh_slots.append([slot for slot in blocks[arg] if frame[slot] is UNDEFINED])
+            elif op == EXIT_BLOCK:
+                for slot in fresh_slots.pop():
+                    frame[slot] = UNDEFINED
+            elif op == MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == FLOORDIV:
+                right = pop()
+                stack[-1] = stack[-1] // right
+            elif op == EQ:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif op == PRINT:
+                emit(pop())
+            elif op == INDEX:
+                position = pop()
+                stack[-1] = Arrays.index(stack[-1], position)
+            elif op == BUILD_ARRAY:
+                elements = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                push(Arrays.array(elements))
+            elif op == BUILD_RANGE:
+                stop = pop()
+                stack[-1] = Arrays.arange(stack[-1], stop)
+            else:
+                raise Exception(f"Unknown opcode {OPNAMES[op] if op < len(OPNAMES) else op} at offset {pc - 2}")
@@ -2,15 +2,25 @@ from Token import Token
 from AST import *
 
 class Parser:
+    # Binding levels of the binary operators: comparisons bind loosest, then + and -, then * and /.
+    LEVELS = {'<': 0, '>': 0, '==': 0, '+': 1, '-': 1, '*': 2, '/': 2}
+
     def __init__(self, lexer):
         """Initialize the Parser with a lexer object. The lexer will tokenize the input for the parser to analyze."""
         self.lexer = lexer
         self.current_token = self.lexer.get_next_token()
+        self.in_function = False
+        self.params = ()  # the parameters of the function being parsed
 
     def error(self, message="Syntax error"):
         """Raise an exception for syntax errors with a given message."""
         raise Exception(message)
 
+    def located(self, node, position):
+        """Record the (line, column) where a node starts on the node and return it."""
+        node.line, node.column = position
+        return node
+
     def eat(self, token_type):
         """Consume the current token if it matches token_type; otherwise, raise a syntax error."""
         if self.current_token.type == token_type:
@@ -18,114 +28,210 @@ class Parser:
         else:
             self.error(f"Expected token {token_type}, but found {self.current_token.type}")
 
-    def factor(self):
-        """Parse a factor which can be an integer, a variable, or an expression enclosed in parentheses."""
-        token = self.current_token
-        if token.type == Token.INTEGER:
-            self.eat(Token.INTEGER)
-            return Num(token)
-        elif token.type == Token.IDENTIFIER:
-            self.eat(Token.IDENTIFIER)
-            return Var(token)
-        elif token.value == '(':
-            self.eat(Token.OPERATOR)
-            node = self.expression()
-            self.eat(Token.OPERATOR)
-            return node
-        else:
-            self.error("Invalid syntax in factor")
-
-    def term(self):
-        """Parse terms that involve multiplication or division of factors."""
-        node = self.factor()
-        while self.current_token.value in ('*', '/'):
-            token = self.current_token
-            self.eat(Token.OPERATOR)
-            node = BinOp(left=node, op=token, right=self.factor())
-        return node
-
     def expression(self):
-        """Parse expressions that involve addition or subtraction of terms."""
-        node = self.term()
-        while self.current_token.value in ('+', '-'):
-            token = self.current_token
-            self.eat(Token.OPERATOR)
-            node = BinOp(left=node, op=token, right=self.term())
-        return node
+        """Parse expressions that involve addition, subtraction, multiplication or division."""
+        return self.operators(1)
 
     def comparison(self):
         """Parse comparison operators (>, <, ==) between expressions."""
-        node = self.expression()
-        while self.current_token.type == Token.OPERATOR and self.current_token.value in ('>', '<', '=='):
+        return self.operators(0)
+
+    def operators(self, min_level):
+        """Parse a binary-operator expression with the shunting-yard algorithm.
+
+        Operands and pending operators are kept on explicit stacks instead of the Python call
+        stack, so nesting depth is only limited by memory. Operators bind by their level in
+        `LEVELS` and associate to the left; inside parentheses only arithmetic operators are
+        accepted, as in the grammar.
+
+        Args:
+            min_level (int): The lowest operator level accepted outside parentheses: 0 to
+                             include comparisons, 1 for arithmetic only.
+        """
+        operands = []
+        pending = []  # (token, position, level) entries, with None marking an open parenthesis
+        open_parens = 0
+        while True:
             token = self.current_token
+            position = self.lexer.position()
+            if token.type == Token.INTEGER:
+                self.eat(Token.INTEGER)
+                operands.append(self.located(Num(token), position))
+            elif token.type == Token.IDENTIFIER:
+                self.eat(Token.IDENTIFIER)
+                if self.current_token.value == '(' and self.current_token.type == Token.OPERATOR:
+                    operands.append(self.located(self.call(token.value), position))
+                else:
+                    operands.append(self.located(Var(token), position))
+            elif token.value == '(':
+                self.eat(Token.OPERATOR)
+                pending.append(None)
+                open_parens += 1
+                continue
+            elif token.value == '[':
+                operands.append(self.located(self.array(), position))
+            else:
+                self.error("Invalid syntax in factor")
+            while True:
+                token = self.current_token
+                if token.value == '[' and token.type == Token.OPERATOR:
+                    position = self.lexer.position()
+                    self.eat(Token.OPERATOR)
+                    index = self.expression()
+                    self.expect(']')
+                    operands.append(self.located(Index(operands.pop(), index), position))
+                    continue
+                level = self.LEVELS.get(token.value) if token.type == Token.OPERATOR else None
+                if level is not None and level >= (1 if open_parens else min_level):
+                    self.reduce(operands, pending, level)
+                    pending.append((token, self.lexer.position(), level))
+                    self.eat(Token.OPERATOR)
+                    break
+                if not open_parens:
+                    self.reduce(operands, pending, 0)
+                    return operands[0]
+                if token.value != ')':
+                    self.error(f"Expected ')', but found {token.type}")
+                self.reduce(operands, pending, 0)
+                pending.pop()
+                open_parens -= 1
+                self.eat(Token.OPERATOR)
+
+    def expect(self, value):
+        """Consume the current token if it is the operator `value`; otherwise, raise a syntax error."""
+        if self.current_token.type != Token.OPERATOR or self.current_token.value != value:
+            self.error(f"Expected '{value}', but found {self.current_token.type}")
+        self.eat(Token.OPERATOR)
+
+    def array(self):
+        """Parse an array literal `[a, b, ...]` or a range `[start : stop]`."""
+        self.expect('[')
+        if self.current_token.value == ']':
             self.eat(Token.OPERATOR)
-            node = BinOp(left=node, op=token, right=self.expression())
-        return node
+            return Array([])
+        first = self.expression()
+        if self.current_token.value == ':':
+            self.eat(Token.OPERATOR)
+            stop = self.expression()
+            self.expect(']')
+            return Range(first, stop)
+        elements = [first]
+        while self.current_token.value == ',':
+            self.eat(Token.OPERATOR)
+            elements.append(self.expression())
+        self.expect(']')
+        return Array(elements)
+
+    def call(self, name):
+        """Parse the parenthesized argument list of a call to the function `name`, after its name."""
+        self.expect('(')
+        args = []
+        if self.current_token.value != ')':
+            args.append(self.expression())
+            while self.current_token.value == ',':
+                self.eat(Token.OPERATOR)
+                args.append(self.expression())
+        self.expect(')')
+        return Call(name, args)
+
+    def function_definition(self):
+        """Parse a function definition `def name(params) then body enddef`.
 
-    def assignment_statement(self):
-        """Parse assignment statements for variables."""
-        self.eat(Token.LET)
-        var_token = self.current_token
+        Functions are defined at the top level only; `return` and `global` are only accepted inside their bodies.
+        """
+        position = self.lexer.position()
+        self.eat(Token.DEF)
+        name = self.current_token.value
         self.eat(Token.IDENTIFIER)
-        self.eat(Token.ASSIGN)
-        expr = self.expression()
-        return Assign(left=Var(var_token), op=Token(Token.ASSIGN, '='), right=expr)
-
-    def print_statement(self):
-        """Parse print statements that output the value of expressions."""
-        self.eat(Token.PRINT)
-        expr = self.comparison()
-        return Print(value=expr)
-
-    def if_statement(self):
-        """Parse if statements, including the condition and the body enclosed by THEN and ENDIF."""
+        self.expect('(')
+        params = []
+        if self.current_token.value != ')':
+            params.append(self.current_token.value)
+            self.eat(Token.IDENTIFIER)
+            while self.current_token.value == ',':
+                self.eat(Token.OPERATOR)
+                params.append(self.current_token.value)
+                self.eat(Token.IDENTIFIER)
+        self.expect(')')
+        if len(set(params)) != len(params):
+            self.error(f"Duplicate parameter name in function '{name}'")
+        self.eat(Token.THEN)
+        body = []
+        self.in_function = True
+        self.params = params
         try:
-            self.eat(Token.IF)
-            condition = self.comparison()
-            if condition is None:
-                raise ValueError("Failed to parse condition in IF statement.")
-            self.eat(Token.THEN)
-            body = self.block()
-            if body is None:
-                raise ValueError("Failed to parse body in IF statement.")
-            if self.current_token.type == Token.ENDIF:
-                self.eat(Token.ENDIF)
-            else:
-                self.error("Expected ENDIF")
-            return If(condition=condition, body=body)
-
-        except Exception as e:
-            print(f"Error parsing IF statement: {str(e)}")
-            raise
-
-    def block(self):
-        """Parse a block of statements until the end of the block is reached (e.g., ENDWHILE, ENDIF)."""
-        statements = []
-        while self.current_token.type != Token.EOF and self.current_token.type not in (Token.ENDWHILE, Token.ENDIF):
-            stmt = self.statement()
-            if stmt is not None:
-                statements.append(stmt)
-            else:
-                self.error("Unexpected None statement")
-        return statements
+            while self.current_token.type not in (Token.ENDDEF, Token.EOF):
+                if self.current_token.type == Token.DEF:
+                    self.error("Functions can only be defined at the top level")
+                body.append(self.statement())
+        finally:
+            self.in_function = False
+            self.params = ()
+        self.eat(Token.ENDDEF)
+        return self.located(Function(name, params, body), position)
 
-    def while_statement(self):
-        """Parse while statements that execute a block repeatedly as long as a condition is true."""
-        self.eat(Token.WHILE)
-        condition = self.comparison()
-        self.eat(Token.THEN)
-        body = self.block()
-        return While(condition=condition, body=body)
+    def reduce(self, operands, pending, level):
+        """Apply pending operators of at least `level`, stopping at an open parenthesis."""
+        while pending and pending[-1] is not None and pending[-1][2] >= level:
+            token, position, _ = pending.pop()
+            right = operands.pop()
+            left = operands.pop()
+            operands.append(self.located(BinOp(left=left, op=token, right=right), position))
 
     def statement(self):
-        """Dispatch parsing to specific statement types based on the current token."""
+        """Parse one statement, dispatching on the current token.
+
+        The bodies of nested `if` and `while` statements are parsed with an explicit stack of
+        open blocks rather than by recursion, so nesting depth is only limited by memory.
+
+        An `if` block must be closed by `endif`. A `while` block is closed by `endwhile`, which is
+        consumed, or else extends to the end of the enclosing block (the `endif` of an enclosing
+        `if`, or the end of the program); an `endwhile` outside a `while` block is a syntax error.
+        """
+        if self.current_token.type == Token.DEF and not self.in_function:
+            return self.function_definition()
+        if self.current_token.type not in (Token.IF, Token.WHILE):
+            return self.simple_statement()
+        open_blocks = []  # (token type, position, condition, body) of every unclosed block
+        while True:
+            token_type = self.current_token.type
+            if token_type in (Token.IF, Token.WHILE):
+                position = self.lexer.position()
+                self.eat(token_type)
+                condition = self.comparison()
+                self.eat(Token.THEN)
+                open_blocks.append((token_type, position, condition, []))
+                continue
+            if token_type in (Token.EOF, Token.ENDIF, Token.ENDWHILE, Token.ENDDEF):
+                kind, position, condition, body = open_blocks.pop()
+                if kind == Token.IF:
+                    if token_type == Token.ENDIF:
+                        self.eat(Token.ENDIF)
+                    else:
+                        self.error("Expected 'ENDIF' after the block")
+                    node = self.located(If(condition=condition, body=body), position)
+                else:
+                    if token_type == Token.ENDWHILE:
+                        self.eat(Token.ENDWHILE)
+                    node = self.located(While(condition=condition, body=body), position)
+                if not open_blocks:
+                    return node
+                open_blocks[-1][3].append(node)
+                continue
+            open_blocks[-1][3].append(self.simple_statement())
+
+    def simple_statement(self):
+        """Parse an assignment, print, return, global or call statement."""
+        position = self.lexer.position()
         if self.current_token.type == Token.LET:
             self.eat(Token.LET)
             var_token = self.current_token
+            var_position = self.lexer.position()
             self.eat(Token.IDENTIFIER)
             self.eat(Token.ASSIGN)
             expr = self.expression()
-            return Assign(left=Var(var_token), op=Token(Token.ASSIGN, '='), right=expr)
+            var = self.located(Var(var_token), var_position)
+            return self.located(Assign(left=var, op=Token.fixed(Token.ASSIGN, '='), right=expr), position)
 
         elif self.current_token.type == Token.IDENTIFIER:
             var_token = self.current_token
@@ -133,42 +239,51 @@ class Parser:
             if self.current_token.type == Token.ASSIGN:
                 self.eat(Token.ASSIGN)
                 expr = self.expression()
-                return Assign(Var(var_token), '=', expr)
+                return self.located(Assign(self.located(Var(var_token), position), '=', expr), position)
+            elif self.current_token.value == '(' and self.current_token.type == Token.OPERATOR:
+                return self.located(self.call(var_token.value), position)
             else:
                 self.error(f"Expected assignment after identifier {var_token.value}")
 
         elif self.current_token.type == Token.PRINT:
             self.eat(Token.PRINT)
             expr = self.expression()
-            return Print(expr)
-
-        elif self.current_token.type == Token.WHILE:
-            self.eat(Token.WHILE)
-            condition = self.comparison()
-            self.eat(Token.THEN)
-            body = self.block()
-            return While(condition=condition, body=body)
-
-        elif self.current_token.type == Token.IF:
-            self.eat(Token.IF)
-            condition = self.comparison()
-            self.eat(Token.THEN)
-            body = self.block()
-            if self.current_token.type == Token.ENDIF:
-                self.eat(Token.ENDIF)
-            else:
-                self.error("Expected 'ENDIF' after the block")
-            return If(condition=condition, body=body)
+            return self.located(Print(expr), position)
+
+        elif self.current_token.type == Token.RETURN:
+            if not self.in_function:
+                self.error("'return' outside a function")
+            self.eat(Token.RETURN)
+            if self.current_token.type in (Token.ENDIF, Token.ENDWHILE, Token.ENDDEF, Token.EOF):
+                return self.located(Return(None), position)
+            return self.located(Return(self.expression()), position)
+
+        elif self.current_token.type == Token.GLOBAL:
+            if not self.in_function:
+                self.error("'global' outside a function")
+            self.eat(Token.GLOBAL)
+            names = [self.current_token.value]
+            self.eat(Token.IDENTIFIER)
+            while self.current_token.value == ',' and self.current_token.type == Token.OPERATOR:
+                self.eat(Token.OPERATOR)
+                names.append(self.current_token.value)
+                self.eat(Token.IDENTIFIER)
+            for name in names:
+                if name in self.params:
+                    self.error(f"Parameter '{name}' declared global")
+            return self.located(Global(names), position)
 
         else:
             self.error(f"Unrecognized statement with token {self.current_token.type} and value {self.current_token.value}")
 
+    def statements(self):
+        """Parse the program lazily, yielding each top-level statement as soon as it is complete."""
+        while self.current_token.type != Token.EOF:
+            yield self.statement()
+
     def program(self):
         """Parse the entire program consisting of multiple statements."""
-        results = []
-        while self.current_token.type != Token.EOF:
-            results.append(self.statement())
-        return results
+        return list(self.statements())
 
     def parse(self):
         """Start the parsing process of the entire program and return the results."""
@@ -0,0 +1,212 @@
+"""Benchmarks for the lexer, parser and interpreter hot paths.
+
+Every workload is generated at several sizes and timed in three separate phases: lexing with
+`Lexer.get_next_token` (and, for comparison, `BytesLexer.get_next_token` over the encoded
+source), parsing with `Parser.parse` over an already tokenized `TokenStream`, and running the
+parsed tree with the selected engine. Peak memory of the whole pipeline is measured
+in a separate pass with `tracemalloc`, so tracing does not distort the timings.
+
+    python benchmarks.py                        # run and print a table
+    python benchmarks.py --save baseline.json   # record a baseline
+    python benchmarks.py --compare baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from Token import Token
+from Lexer import Lexer, BytesLexer
+from _Parser import Parser
+from Interperter import Interpreter
+from Optimizer import count_nodes
+from Output import CollectorSink
+
+def nested_if(depth):
+    """Return a program of `depth` nested if statements, all taken."""
+    lines = ['let x = 0']
+    for i in range(depth):
+        lines.append('  ' * i + f'if x < {i + 1} then')
+        lines.append('  ' * (i + 1) + 'let x = x + 1')
+    for i in reversed(range(depth)):
+        lines.append('  ' * i + 'endif')
+    return '\n'.join(lines) + '\n', 0
+
+def long_while(iterations, variables=20):
+    """Return a loop running `iterations` times that updates `variables` variables per iteration."""
+    lines = ['let i = 0']
+    lines += [f'let v{k} = {k}' for k in range(variables)]
+    lines.append(f'while i < {iterations} then')
+    lines += [f'  let v{k} = (v{k} + i * {k + 1}) / 2' for k in range(variables)]
+    lines.append('  let i = i + 1')
+    lines.append('endwhile')
+    lines.append(f'print v{variables - 1}')
+    return '\n'.join(lines) + '\n', iterations
+
+def straight_line(statements):
+    """Return a script of `statements` assignments without any control flow."""
+    lines = ['let v0 = 1']
+    for k in range(1, statements):
+        lines.append(f'let v{k} = (v{k - 1} + {k}) / 2 + v{k // 2} * 3 - {k % 7}')
+    lines.append(f'print v{statements - 1}')
+    return '\n'.join(lines) + '\n', 0
+
+def deep_parens(depth, lines=20):
+    """Return `lines` assignments of expressions nested `depth` parentheses deep."""
+    expression = '1'
+    for k in range(depth):
+        expression = f'({expression} + {k % 5}) * 1'
+    return '\n'.join(f'let e{k} = {expression}' for k in range(lines)) + '\n', 0
+
+WORKLOADS = {
+    'nested_if': (nested_if, (10, 50, 150)),
+    'long_while': (long_while, (100, 1000, 5000)),
+    'straight_line': (straight_line, (100, 1000, 10000)),
+    'deep_parens': (deep_parens, (10, 50, 150)),
+}
+
+QUICK_SIZES = {'nested_if': (10,), 'long_while': (100,), 'straight_line': (100,), 'deep_parens': (10,)}
+
+def best_time(function, repeat):
+    """Return the shortest wall-clock time of `repeat` calls to `function`, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def lex(text):
+    """Tokenize a program one token at a time and return the number of tokens, EOF included."""
+    lexer = Lexer(text)
+    count = 1
+    while lexer.get_next_token().type != Token.EOF:
+        count += 1
+    return count
+
+def lex_bytes(data):
+    """Tokenize ASCII source bytes one token at a time with `BytesLexer` and return the number of tokens."""
+    lexer = BytesLexer(data)
+    count = 1
+    while lexer.get_next_token().type != Token.EOF:
+        count += 1
+    return count
+
+def run(tree, engine):
+    """Run a parsed program with a fresh interpreter whose output is collected in memory."""
+    interpreter = Interpreter(None, engine=engine, output=CollectorSink())
+    getattr(interpreter, 'run_' + engine)(tree)
+
+def peak_memory(text, engine):
+    """Return the peak memory allocated while lexing, parsing and running a program, in bytes."""
+    tracemalloc.start()
+    try:
+        run(Parser(Lexer(text)).parse(), engine)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def benchmark(name, size, text, iterations, engine='tree', repeat=3):
+    """Benchmark one generated program and return its measurements as a dictionary."""
+    tokens = lex(text)
+    stream = Lexer(text).tokenize()
+    tree = Parser(stream).parse()
+    nodes = count_nodes(tree)
+
+    def parse():
+        stream.index = 0
+        Parser(stream).parse()
+
+    data = text.encode('ascii')
+    lex_time = best_time(lambda: lex(text), repeat)
+    bytes_lex_time = best_time(lambda: lex_bytes(data), repeat)
+    parse_time = best_time(parse, repeat)
+    run_time = best_time(lambda: run(tree, engine), repeat)
+    return {
+        'workload': name,
+        'size': size,
+        'engine': engine,
+        'tokens': tokens,
+        'nodes': nodes,
+        'iterations': iterations,
+        'lex_time': lex_time,
+        'bytes_lex_time': bytes_lex_time,
+        'parse_time': parse_time,
+        'run_time': run_time,
+        'tokens_per_s': tokens / lex_time,
+        'bytes_tokens_per_s': tokens / bytes_lex_time,
+        'nodes_per_s': nodes / parse_time,
+        'iterations_per_s': iterations / run_time if iterations else None,
+        'peak_memory': peak_memory(text, engine),
+    }
+
+def run_benchmarks(engine='tree', repeat=3, quick=False, workloads=None):
+    """Run every workload at every size and return the list of measurements."""
+    results = []
+    for name, (generate, sizes) in WORKLOADS.items():
+        if workloads and name not in workloads:
+            continue
+        for size in (QUICK_SIZES[name] if quick else sizes):
+            text, iterations = generate(size)
+            results.append(benchmark(name, size, text, iterations, engine, repeat))
+    return results
+
+def key(result):
+    """Return the identity of a measurement, used to match it against a baseline."""
+    return f"{result['workload']}/{result['size']}/{result['engine']}"
+
+def compare(results, baseline, tolerance=0.25):
+    """Return a description of every time or memory figure that grew by more than `tolerance` over the baseline."""
+    previous = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for field in ('lex_time', 'bytes_lex_time', 'parse_time', 'run_time', 'peak_memory'):
+            if old.get(field) and result[field] > old[field] * (1 + tolerance):
+                change = (result[field] / old[field] - 1) * 100
+                regressions.append(f"{key(result)} {field}: {old[field]:.6g} -> {result[field]:.6g} (+{change:.0f}%)")
+    return regressions
+
+def table(results):
+    """Return the measurements formatted as a text table."""
+    lines = [f"{'workload':<24}{'tokens/s':>12}{'bytes tok/s':>12}{'nodes/s':>12}{'iters/s':>12}"
+             f"{'lex ms':>10}{'parse ms':>10}{'run ms':>10}{'peak KiB':>10}"]
+    for r in results:
+        iterations = f"{r['iterations_per_s']:.0f}" if r['iterations_per_s'] else '-'
+        lines.append(f"{r['workload'] + '/' + str(r['size']):<24}{r['tokens_per_s']:>12.0f}"
+                     f"{r['bytes_tokens_per_s']:>12.0f}{r['nodes_per_s']:>12.0f}"
+                     f"{iterations:>12}{r['lex_time'] * 1000:>10.2f}{r['parse_time'] * 1000:>10.2f}"
+                     f"{r['run_time'] * 1000:>10.2f}{r['peak_memory'] / 1024:>10.0f}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    """Command-line entry point: run the benchmarks, optionally saving or comparing against a baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the lexer, parser and interpreter.")
+    parser.add_argument('--engine', default='tree', help="execution engine to benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement; the best is kept")
+    parser.add_argument('--quick', action='store_true', help="only run the smallest size of each workload")
+    parser.add_argument('--workload', action='append', choices=sorted(WORKLOADS), help="limit to a workload")
+    parser.add_argument('--save', default=None, help="write the results to a baseline JSON file")
+    parser.add_argument('--compare', default=None, help="compare the results with a baseline JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before reporting a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.engine, args.repeat, args.quick, args.workload)
+    print(table(results))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
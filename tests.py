@@ -2,11 +2,34 @@ import unittest
 import io
 import sys
 import contextlib
-from Lexer import Lexer
+import tempfile
+import unittest.mock
+from Lexer import Lexer, StreamLexer, BytesLexer
 from _Parser import Parser
 from Interperter import Interpreter
 from Token import Token
-from AST import Assign
+from AST import Assign, BinOp, Num, Print, While
+from Bytecode import BytecodeCompiler
+from Resolver import Resolver
+from FlatAST import FlatProgram
+from Cache import ProgramCache
+from Optimizer import Optimizer
+import Transpiler
+from Output import BufferedSink, CallbackSink, CollectorSink
+import Batch
+import asyncio
+from Service import ExecutionService
+import json
+import itertools
+from Profiler import ProfilingInterpreter
+import benchmarks
+import Arrays
+from Repl import IncrementalParser, Repl, TextBuffer
+from Snapshot import Snapshot
+import os
+import subprocess
+import mmap
+import tracemalloc
 
 @contextlib.contextmanager
 def capture_output():
@@ -19,6 +42,27 @@ def capture_output():
     finally:
         sys.stdout, sys.stderr = old_out, old_err
 
+DEMO_PROGRAM = """
+let balance = 1000
+let withdrawal = 100
+let counter = 0
+while counter < 10 THEN
+    print balance
+    if balance > 200 THEN
+        let balance = balance - withdrawal
+        let spent = 1
+        print balance
+    ENDIF
+    let counter = counter + 1
+"""
+
+def run_program(text, **options):
+    """Run a program with the given Interpreter options and return the interpreter and its output."""
+    interpreter = Interpreter(Parser(Lexer(text)), **options)
+    with capture_output() as output:
+        interpreter.interpret()
+    return interpreter, output.getvalue()
+
 class TestLanguageComponents(unittest.TestCase):
     def test_lexer_tokens(self):
         """Test lexer token generation to ensure correct token types are produced for a given input."""
@@ -73,5 +117,1001 @@ class TestLanguageComponents(unittest.TestCase):
             interpreter.interpret()
             self.assertIn('123', output.getvalue())
 
+    def test_endwhile_grammar(self):
+        """Test that endwhile closes a while block, and that a while block without it extends to the end of the enclosing block."""
+        closed = Parser(Lexer("while x < 1 then let x = 1 endwhile print x")).parse()
+        self.assertEqual([type(node) for node in closed], [While, Print])
+        open_ = Parser(Lexer("while x < 1 then let x = 1 print x")).parse()
+        self.assertEqual(len(open_), 1)
+        self.assertEqual(len(open_[0].body), 2)
+        nested = Parser(Lexer("if x < 1 then while x < 1 then let x = 1 endif print x")).parse()
+        self.assertEqual(len(nested), 2)
+        self.assertIsInstance(nested[0].body[0], While)
+        for text in ("let x = 1 endwhile", "if x < 1 then endwhile endif"):
+            with self.subTest(text=text):
+                with self.assertRaises(Exception):
+                    Parser(Lexer(text)).parse()
+
+class TestClosureEngine(unittest.TestCase):
+    def test_matches_tree_engine(self):
+        """Test that the closure engine produces the same output and scope as the tree walker."""
+        tree_interpreter, tree_output = run_program(DEMO_PROGRAM)
+        closure_interpreter, closure_output = run_program(DEMO_PROGRAM, engine='closure')
+        self.assertEqual(closure_output, tree_output)
+        self.assertEqual(closure_interpreter.scopes, tree_interpreter.scopes)
+        self.assertNotIn('spent', closure_interpreter.current_scope())
+
+    def test_floor_division_and_undefined_variable(self):
+        """Test integer division semantics and the error raised for an undefined variable."""
+        _, output = run_program("print 7 / 2", engine='closure')
+        self.assertEqual(output, "3\n")
+        with self.assertRaises(NameError):
+            run_program("print y", engine='closure')
+
+    def test_unknown_engine(self):
+        """Test that selecting an unknown engine is rejected."""
+        with self.assertRaises(ValueError):
+            Interpreter(Parser(Lexer("")), engine='missing')
+
+class TestBytecodeEngine(unittest.TestCase):
+    def test_matches_tree_engine(self):
+        """Test that the bytecode VM produces the same output and scope as the tree walker."""
+        tree_interpreter, tree_output = run_program(DEMO_PROGRAM)
+        vm_interpreter, vm_output = run_program(DEMO_PROGRAM, engine='bytecode')
+        self.assertEqual(vm_output, tree_output)
+        self.assertEqual(vm_interpreter.scopes, tree_interpreter.scopes)
+
+    def test_if_jumps_over_body(self):
+        """Test that a false if condition skips its body and compiles to a forward jump."""
+        _, output = run_program("let x = 5 if x > 9 THEN print 1 ENDIF print x", engine='bytecode')
+        self.assertEqual(output, "5\n")
+        code = BytecodeCompiler().compile(Parser(Lexer("if 1 < 2 THEN print 3 ENDIF")).parse())
+        self.assertIn('JUMP_IF_FALSE', code.disassemble())
+
+class TestResolver(unittest.TestCase):
+    def test_slots_and_block_assignments(self):
+        """Test that every variable gets one slot and while bodies record the slots they assign."""
+        tree = Parser(Lexer("let a = 1 while a < 3 THEN let b = a let a = a + 1")).parse()
+        resolver = Resolver().resolve(tree)
+        self.assertEqual(resolver.names, ['a', 'b'])
+        self.assertEqual(resolver.block_slots[tree[1]], (0, 1))
+
+    def test_block_names_dropped_each_iteration(self):
+        """Test that names introduced by a loop iteration are gone in the next one, for every slot-based engine."""
+        text = "let i = 0 while i < 3 THEN if i > 0 THEN print seen ENDIF let seen = i let i = i + 1"
+        for engine in ('tree', 'closure', 'bytecode'):
+            with self.subTest(engine=engine), self.assertRaises(NameError):
+                run_program(text, engine=engine)
+
+class TestTokenize(unittest.TestCase):
+    def test_matches_get_next_token(self):
+        """Test that the bulk tokenizer yields the same token types and values as get_next_token."""
+        lexer = Lexer(DEMO_PROGRAM)
+        expected = []
+        while True:
+            token = lexer.get_next_token()
+            expected.append((token.type, token.value))
+            if token.type == Token.EOF:
+                break
+        tokens = Lexer(DEMO_PROGRAM).tokenize()
+        self.assertEqual([(token.type, token.value) for token in tokens], expected)
+
+    def test_positions_and_parsing(self):
+        """Test that the stream records line/column positions and that the parser consumes it."""
+        tokens = Lexer("let x = 1\n  print x >= 2").tokenize()
+        self.assertEqual([tokens.position(i) for i in range(4, 7)], [(2, 3), (2, 9), (2, 11)])
+        self.assertEqual((tokens[5].line, tokens[5].column), (2, 9))
+        self.assertEqual(tokens[6].value, '>=')
+        tree = Parser(Lexer("let x = 10 / 3").tokenize()).parse()
+        self.assertEqual(tree[0].right.op.value, '/')
+
+    def test_fixed_tokens_are_shared(self):
+        """Test that operator and keyword tokens are interned and tokens have no instance dict."""
+        tokens = Lexer("let a = a + 1 let b = b + 2").tokenize()
+        self.assertIs(tokens[4], tokens[10])
+        self.assertIs(tokens[0], Lexer("let").get_next_token())
+        self.assertFalse(hasattr(tokens[1], '__dict__'))
+
+    def test_invalid_character(self):
+        """Test that the bulk tokenizer rejects invalid characters like get_next_token."""
+        with self.assertRaises(Exception):
+            Lexer("let x = 1 # 2").tokenize()
+
+class TestFlatAST(unittest.TestCase):
+    def test_encode_decode_round_trip(self):
+        """Test that decoding a flat program rebuilds an equivalent tree without per-node dicts."""
+        tree = Parser(Lexer(DEMO_PROGRAM)).parse()
+        program = FlatProgram.encode(tree)
+        decoded = program.decode()
+        self.assertEqual(FlatProgram.encode(decoded).kinds, program.kinds)
+        self.assertEqual(decoded[3].body[1].condition.op.value, '>')
+        self.assertFalse(hasattr(tree[0], '__dict__'))
+
+    def test_flat_engine_matches_tree_engine(self):
+        """Test that walking the flat encoding produces the same output and scope as the tree walker."""
+        tree_interpreter, tree_output = run_program(DEMO_PROGRAM)
+        flat_interpreter, flat_output = run_program(DEMO_PROGRAM, engine='flat')
+        self.assertEqual(flat_output, tree_output)
+        self.assertEqual(flat_interpreter.scopes, tree_interpreter.scopes)
+
+class TestProgramCache(unittest.TestCase):
+    def test_hits_misses_and_evictions(self):
+        """Test the LRU behavior and counters of the in-memory cache."""
+        cache = ProgramCache(maxsize=2)
+        for text in ("let a = 1", "let b = 2", "let a = 1", "let c = 3", "let b = 2"):
+            cache.parse(text)
+        self.assertEqual(cache.stats(), {'size': 2, 'hits': 1, 'disk_hits': 0, 'misses': 4,
+                                         'evictions': 2, 'disk_writes': 0})
+
+    def test_interpreter_reuses_parsed_program(self):
+        """Test that interpreters sharing a cache parse a source once and reuse compiled artifacts."""
+        cache = ProgramCache()
+        outputs = [run_program(DEMO_PROGRAM, engine='bytecode', cache=cache)[1] for _ in range(3)]
+        self.assertEqual(outputs, [run_program(DEMO_PROGRAM)[1]] * 3)
+        self.assertEqual((cache.misses, cache.hits), (1, 2))
+        entry = cache.entry(DEMO_PROGRAM)
+        self.assertIn('bytecode', entry.artifacts)
+
+    def test_disk_store(self):
+        """Test that a second cache loads the parsed program from disk instead of parsing it."""
+        with tempfile.TemporaryDirectory() as directory:
+            ProgramCache(directory=directory).parse(DEMO_PROGRAM)
+            cache = ProgramCache(directory=directory)
+            interpreter, output = run_program(DEMO_PROGRAM, cache=cache)
+            self.assertEqual((cache.disk_hits, cache.misses), (1, 0))
+            self.assertEqual(output, run_program(DEMO_PROGRAM)[1])
+
+LOOP_PROGRAM = """
+let balance = 1000
+let withdrawal = 7
+let counter = 0
+let total = 0
+while counter < 20 THEN
+    let net = balance - withdrawal
+    if counter * 3 > net / 100 THEN
+        let total = total + counter * 3 + net
+    ENDIF
+    let counter = counter + 1
+    print counter * 3
+"""
+
+class TestOptimizer(unittest.TestCase):
+    def test_constant_folding(self):
+        """Test that constant subtrees fold into a single number with floor division semantics."""
+        tree = Parser(Lexer("let x = 60 * 60 * 24 + y let z = (0 - 7) / 2")).parse()
+        optimizer = Optimizer()
+        result = optimizer.optimize(tree)
+        self.assertIsInstance(result[0].right.left, Num)
+        self.assertEqual(result[0].right.left.value, 86400)
+        self.assertEqual(result[1].right.value, -4)
+        self.assertEqual(optimizer.removed, 8)
+        self.assertIsInstance(tree[0].right.left, BinOp)
+
+    def test_dead_branches(self):
+        """Test that constant false branches are removed and constant true ones inlined."""
+        text = "if 1 > 2 THEN print 1 ENDIF if 2 > 1 THEN print 2 ENDIF print 3"
+        interpreter, output = run_program(text, optimize=True)
+        self.assertEqual(output, "2\n3\n")
+        self.assertEqual(interpreter.nodes_removed, 10)
+
+    def test_division_by_zero_not_folded(self):
+        """Test that a constant division by zero still fails at run time, after earlier output."""
+        with capture_output() as output:
+            with self.assertRaises(ZeroDivisionError):
+                Interpreter(Parser(Lexer("print 1 print 1 / 0")), optimize=True).interpret()
+        self.assertEqual(output.getvalue(), "1\n")
+
+    def test_loop_invariants_and_strength_reduction(self):
+        """Test that loop optimizations move work out of the loop without changing results."""
+        tree = Parser(Lexer(LOOP_PROGRAM)).parse()
+        optimizer = Optimizer(loops=True)
+        result = optimizer.optimize(tree)
+        self.assertEqual((optimizer.hoisted, optimizer.reduced), (1, 1))
+        self.assertEqual([node.left.value for node in result[4:6]], ['$sr0', '$inv1'])
+        expected_interpreter, expected_output = run_program(LOOP_PROGRAM)
+        for engine in ('tree', 'closure', 'bytecode', 'flat'):
+            with self.subTest(engine=engine):
+                interpreter, output = run_program(LOOP_PROGRAM, engine=engine, optimize=True)
+                self.assertEqual(output, expected_output)
+                self.assertEqual(interpreter.scopes, expected_interpreter.scopes)
+
+    def test_no_hoisting_of_possibly_failing_expressions(self):
+        """Test that expressions which could raise, or read undefined names, stay inside the loop."""
+        text = "let d = 0 let i = 0 while i < 0 THEN let q = 5 / d let r = u + 1 let i = i + 1"
+        optimizer = Optimizer(loops=True)
+        optimizer.optimize(Parser(Lexer(text)).parse())
+        self.assertEqual(optimizer.hoisted, 0)
+        run_program(text, optimize=True)
+
+    def test_no_hoisting_of_array_arithmetic(self):
+        """Test that arithmetic on arrays, which may raise, is not moved out of a loop that never runs."""
+        text = ("let a = [1, 2, 3] let b = [1, 2] let i = 0 "
+                "while i < 0 THEN print a + b let c = a * 2 let i = i + 1 endwhile print 1")
+        optimizer = Optimizer(loops=True)
+        optimizer.optimize(Parser(Lexer(text)).parse())
+        self.assertEqual((optimizer.hoisted, optimizer.reduced), (0, 0))
+        interpreter, output = run_program(text, optimize=True)
+        self.assertEqual(output, "1\n")
+
+class TestTranspiler(unittest.TestCase):
+    def test_matches_tree_engine(self):
+        """Test that transpiled programs produce the same output and scope as the tree walker."""
+        for text, options in ((DEMO_PROGRAM, {}), (LOOP_PROGRAM, {'optimize': True})):
+            expected_interpreter, expected_output = run_program(text)
+            interpreter, output = run_program(text, engine='python', **options)
+            self.assertEqual(output, expected_output)
+            self.assertEqual(interpreter.scopes, expected_interpreter.scopes)
+
+    def test_generated_source(self):
+        """Test that the generated source is readable Python using floor division."""
+        source, names = Transpiler.transpile(Parser(Lexer("let x = 7 / 2 print x")).parse())
+        self.assertIn("v_x = (7 // 2)", source)
+        self.assertIn("__emit(v_x)", source)
+        self.assertEqual(names, {'v_x': 'x'})
+
+    def test_block_scoping_and_errors(self):
+        """Test that names introduced by a loop iteration are dropped and undefined reads raise NameError."""
+        with self.assertRaisesRegex(NameError, "Variable 'seen' not defined"):
+            run_program("let i = 0 while i < 3 THEN if i > 0 THEN print seen ENDIF let seen = i let i = i + 1",
+                        engine='python')
+
+class TestOutputSinks(unittest.TestCase):
+    def test_collector_matches_stdout_for_every_engine(self):
+        """Test that collected output equals what the default sink prints, whatever the engine."""
+        _, expected = run_program(DEMO_PROGRAM)
+        for engine in ('tree', 'closure', 'bytecode', 'flat', 'python'):
+            with self.subTest(engine=engine):
+                sink = CollectorSink()
+                Interpreter(Parser(Lexer(DEMO_PROGRAM)), engine=engine, output=sink).interpret()
+                self.assertEqual(sink.getvalue(), expected)
+                self.assertEqual(sink.values[:2], [1000, 900])
+                self.assertEqual(sink.to_bytes(), expected.encode())
+
+    def test_buffered_sink_flushes_in_chunks(self):
+        """Test that the buffered sink writes once per chunk and flushes the rest at the end."""
+        stream = unittest.mock.Mock()
+        sink = BufferedSink(stream, flush_size=10)
+        Interpreter(Parser(Lexer("print 1000 print 2000 print 3000 print 4")), output=sink).interpret()
+        self.assertEqual([call.args[0] for call in stream.write.call_args_list], ["1000\n2000\n", "3000\n4\n"])
+
+    def test_callback_sink(self):
+        """Test that the callback sink streams each value to the host as it is printed."""
+        received = []
+        Interpreter(Parser(Lexer("print 1 print 2")), output=CallbackSink(received.append)).interpret()
+        self.assertEqual(received, [1, 2])
+
+class TestStreaming(unittest.TestCase):
+    def test_stream_lexer_across_chunk_boundaries(self):
+        """Test that tokens split across chunks are read whole, with the same tokens as the Lexer."""
+        text = "let counter = 100\nwhile counter > 99 THEN\n  let counter = counter - 1\nENDWHILE\nprint counter"
+        chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+        lexer, stream = Lexer(text), StreamLexer(chunks)
+        while True:
+            expected, token = lexer.get_next_token(), stream.get_next_token()
+            self.assertEqual((token.type, token.value), (expected.type, expected.value))
+            if token.type == Token.EOF:
+                break
+        self.assertEqual(stream.line, 5)
+
+    def test_statements_run_as_they_are_parsed(self):
+        """Test that a statement runs before the rest of the input is even read."""
+        output = []
+
+        def chunks():
+            yield "print 1 let x = 2 "
+            self.assertEqual(output, [1])
+            yield "while x > 0 THEN print x let x = x - 1 ENDWHILE print 7"
+
+        interpreter = Interpreter(Parser(StreamLexer(chunks())), output=CallbackSink(output.append))
+        self.assertEqual(interpreter.interpret_stream(), 4)
+        self.assertEqual(output, [1, 2, 1, 7])
+
+    def test_file_input(self):
+        """Test streaming a program from a file object gives the same result as interpret()."""
+        interpreter = Interpreter(Parser(StreamLexer(io.StringIO(DEMO_PROGRAM), chunk_size=16)), engine='closure')
+        with capture_output() as output:
+            interpreter.interpret_stream()
+        self.assertEqual(output.getvalue(), run_program(DEMO_PROGRAM)[1])
+
+    def test_optimized_statements_know_earlier_variables(self):
+        """Test that streamed loops hoist invariants over variables defined by earlier statements."""
+        text = "let n = 5 let k = 3 let i = 0 let total = 0 while i < n then let total = total + k * 2 let i = i + 1 endwhile"
+        interpreter = Interpreter(Parser(StreamLexer([text])), optimize=True, output=CollectorSink())
+        interpreter.interpret_stream()
+        self.assertEqual(interpreter.scopes[0]['total'], 30)
+        self.assertEqual(interpreter.optimizer.hoisted, 1)
+        self.assertNotIn('$inv0', interpreter.scopes[0])
+
+class TestBatch(unittest.TestCase):
+    def test_parallel_results(self):
+        """Test that a batch returns each program's output, final scope and error in order."""
+        sources = ["let x = 2 print x * 21", DEMO_PROGRAM, "print y", "let x = 2 print x * 21"]
+        results = list(Batch.run_batch(sources, workers=2, chunksize=2, engine='closure'))
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3])
+        self.assertEqual((results[0].output, results[0].scope, results[0].error), ("42\n", {'x': 2}, None))
+        self.assertEqual(results[1].output, run_program(DEMO_PROGRAM)[1])
+        self.assertEqual(results[2].error, "NameError: Variable 'y' not defined")
+
+    def test_unordered_results(self):
+        """Test that as-completed results still cover every program exactly once."""
+        results = Batch.run_batch([f"print {i}" for i in range(6)], workers=2, ordered=False)
+        self.assertEqual(sorted((r.index, r.output) for r in results), [(i, f"{i}\n") for i in range(6)])
+
+class TestService(unittest.TestCase):
+    def test_matches_tree_engine(self):
+        """Test that a stepped run prints and leaves the same scope as the tree engine."""
+        interpreter, output = run_program(DEMO_PROGRAM)
+        result = asyncio.run(ExecutionService(yield_every=3).run(DEMO_PROGRAM))
+        self.assertIsNone(result['error'])
+        self.assertEqual((result['output'], result['scope']), (output, interpreter.scopes[0]))
+
+    def test_budgets_do_not_block_other_runs(self):
+        """Test that endless loops are stopped by their step budget or timeout while a short run completes."""
+        service = ExecutionService(yield_every=10)
+        endless = "let x = 0 while 1 < 2 then let x = x + 1"
+
+        async def main():
+            return await asyncio.gather(service.run(endless, max_steps=500), service.run(endless, timeout=0.05),
+                                        service.run("print 7"))
+
+        budget, timeout, short = asyncio.run(main())
+        self.assertEqual(budget['error'], "StepLimitExceeded: Run exceeded 500 steps")
+        self.assertEqual(budget['steps'], 500)
+        self.assertTrue(timeout['error'].startswith("TimeoutError"))
+        self.assertEqual((short['output'], short['error']), ("7\n", None))
+
+    def test_steps_into_function_bodies(self):
+        """Test that statements inside calls count as steps, so a long call is stopped by its budget."""
+        spin = ("def spin(n) then let i = 0 while i < n then let i = i + 1 endwhile return i enddef "
+                "let calls = 0 print spin(3000000)")
+        result = asyncio.run(ExecutionService(max_steps=1000, timeout=5).run(spin))
+        self.assertEqual(result['error'], "StepLimitExceeded: Run exceeded 1000 steps")
+        self.assertEqual(result['scope'], {'calls': 0})
+        text = FACTORIAL_PROGRAM + "let x = factorial(6) print x + factorial(3)"
+        interpreter, output = run_program(text)
+        result = asyncio.run(ExecutionService(yield_every=3).run(text))
+        self.assertEqual((result['output'], result['scope'], result['error']), (output, interpreter.scopes[0], None))
+
+    def test_json_requests(self):
+        """Test the JSON-lines front end, including malformed requests."""
+        stdin = io.StringIO('{"id": 1, "source": "print 2 * 3"}\nnot json\n')
+        stdout = io.StringIO()
+        asyncio.run(ExecutionService().serve_stdin(stdin, stdout))
+        responses = sorted(stdout.getvalue().splitlines())
+        self.assertEqual(len(responses), 2)
+        self.assertIn('"output": "6\\n"', responses[0] + responses[1])
+        self.assertIn('BadRequest', responses[0] + responses[1])
+
+class TestProfiler(unittest.TestCase):
+    def test_source_positions(self):
+        """Test that every lexer gives the parser the same node positions."""
+        text = "let x = 1\nwhile x < 3 then\n  print x * 2\n  x = x + 1\n"
+        for lexer in (Lexer(text), Lexer(text).tokenize(), StreamLexer([text[:12], text[12:]])):
+            with self.subTest(lexer=type(lexer).__name__):
+                tree = Parser(lexer).parse()
+                loop = tree[1]
+                self.assertEqual((loop.line, loop.column), (2, 1))
+                self.assertEqual((loop.condition.line, loop.condition.column), (2, 9))
+                self.assertEqual((loop.body[0].value.line, loop.body[0].value.column), (3, 11))
+                self.assertEqual((loop.body[1].line, loop.body[1].column), (4, 3))
+
+    def test_counts_and_times(self):
+        """Test visit counts, loop iterations and self times measured with a fake clock."""
+        text = "let i = 0\nwhile i < 3 then\n  let i = i + 1\n"
+        ticks = itertools.count()
+        profiler = ProfilingInterpreter(Parser(Lexer(text)), output=CollectorSink(), clock=lambda: next(ticks))
+        profiler.interpret()
+        loops = profiler.loop_iterations()
+        self.assertEqual(list(loops.values()), [3])
+        line_hits = {line: hits for line, (hits, _) in profiler.line_stats().items()}
+        self.assertEqual(line_hits, {1: 1, 2: 1, 3: 3})
+        for record in profiler.stats.values():
+            self.assertGreater(record.self_time, 0)
+            self.assertLessEqual(record.children, record.total)
+        top_level = [r.total for r in profiler.stats.values()
+                     if isinstance(r.node, (Assign, While)) and r.node.line in (1, 2)]
+        self.assertEqual(sum(profiler.stacks.values()), sum(top_level))
+
+    def test_reports(self):
+        """Test the table, JSON and collapsed-stack reports."""
+        profiler = ProfilingInterpreter(Parser(Lexer(DEMO_PROGRAM)), output=CollectorSink())
+        profiler.interpret()
+        self.assertIn('While', profiler.report())
+        dump = io.StringIO()
+        profiler.dump(dump)
+        data = json.loads(dump.getvalue())
+        self.assertIn({'node': 'While', 'line': 5, 'column': 1}, [{k: n[k] for k in ('node', 'line', 'column')}
+                                                                  for n in data['nodes']])
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in profiler.collapsed().splitlines()))
+        self.assertIn('While:5;If:7;Assign balance:8', profiler.collapsed())
+
+class TestBenchmarks(unittest.TestCase):
+    def test_workloads_are_valid_programs(self):
+        """Test that every generated workload parses and produces the same output on the tree and closure engines."""
+        for name, (generate, sizes) in benchmarks.WORKLOADS.items():
+            with self.subTest(workload=name):
+                text, _ = generate(benchmarks.QUICK_SIZES[name][0])
+                self.assertEqual(run_program(text)[1], run_program(text, engine='closure')[1])
+
+    def test_measurements_and_comparison(self):
+        """Test that a benchmark reports throughput and that slower results are flagged against a baseline."""
+        result = benchmarks.benchmark('long_while', 10, *benchmarks.long_while(10, variables=2), repeat=1)
+        self.assertEqual((result['iterations'], result['tokens']), (10, benchmarks.lex(benchmarks.long_while(10, 2)[0])))
+        self.assertGreater(result['peak_memory'], 0)
+        slower = dict(result, run_time=result['run_time'] * 2)
+        self.assertEqual(benchmarks.compare([result], [result]), [])
+        regressions = benchmarks.compare([slower], [result], tolerance=0.5)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('long_while/10/tree run_time'))
+
+class TestIterative(unittest.TestCase):
+    def test_matches_tree_engine(self):
+        """Test that the explicit-stack engine prints and leaves the same scopes as the tree engine."""
+        for text in (DEMO_PROGRAM, LOOP_PROGRAM):
+            tree_interpreter, expected = run_program(text)
+            interpreter, output = run_program(text, engine='iterative')
+            self.assertEqual((output, interpreter.scopes), (expected, tree_interpreter.scopes))
+        with self.assertRaises(NameError):
+            run_program("print y", engine='iterative')
+
+    def test_operator_precedence(self):
+        """Test precedence, left associativity and parentheses in the shunting-yard parser."""
+        self.assertEqual(run_program("print 2 + 3 * 4 - 10 / 5 - 1")[1], "11\n")
+        self.assertEqual(run_program("print (2 + 3) * (4 - 10 / 5) - (1)")[1], "9\n")
+        condition = Parser(Lexer("1 + 2 < 3 * 4 == 1")).comparison()
+        self.assertEqual((condition.op.value, condition.left.op.value), ('==', '<'))
+        with self.assertRaises(Exception):
+            Parser(Lexer("print (1 + 2 < 3)")).parse()
+
+    def test_deep_nesting(self):
+        """Test parsing and running nesting tens of thousands of levels deep without hitting the recursion limit."""
+        depth = 20000
+        text = ('let x = ' + '(' * depth + '1' + ' + 1)' * depth + '\n'
+                + ''.join(f'if x > {i} then\n' for i in range(depth)) + 'print x\n' + 'endif\n' * depth)
+        sink = CollectorSink()
+        Interpreter(Parser(Lexer(text).tokenize()), engine='iterative', output=sink).interpret()
+        self.assertEqual(sink.values, [depth + 1])
+
+ARRAY_PROGRAM = """
+let b = [0 : 5] * 100 + 1000
+let b = b - [10, 20, 30, 40, 50] * 2
+print b
+print b[2] + b[4]
+print b / [1, 2, 3, 4, 5]
+print b[[4, 0]]
+if b > 0 then
+  print 1
+endif
+"""
+
+@unittest.skipIf(Arrays.numpy is None, "NumPy is not installed")
+class TestArrays(unittest.TestCase):
+    def test_engines(self):
+        """Test array literals, ranges, indexing and broadcasting on every engine."""
+        expected = "[980, 1060, 1140, 1220, 1300]\n2440\n[980, 530, 380, 305, 260]\n[1300, 980]\n1\n"
+        for engine in ('tree', 'closure', 'bytecode', 'flat', 'python', 'iterative', 'adaptive'):
+            for optimize in (False, True):
+                with self.subTest(engine=engine, optimize=optimize):
+                    self.assertEqual(run_program(ARRAY_PROGRAM, engine=engine, optimize=optimize)[1], expected)
+
+    def test_matches_scalar_loop(self):
+        """Test that a vectorized formula gives the same results as the equivalent scalar loop."""
+        vectorized, _ = run_program("let b = [0 : 50] let b = (b * 3 - 70) / 4")
+        loop, _ = run_program("let b = [0 : 50] let i = 0 while i < 50 then "
+                              "let x = (b[i] * 3 - 70) / 4 print x let i = i + 1", output=CollectorSink())
+        self.assertEqual(vectorized.scopes[0]['b'].tolist(), loop.output.values)
+
+    def test_disk_cache(self):
+        """Test that array programs are stored in and loaded from an on-disk program cache."""
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(2):
+                cache = ProgramCache(directory=directory)
+                interpreter, output = run_program("let a = [1, 2, 3] print a[1] + [0 : 2][1]", cache=cache)
+                self.assertEqual(output, "3\n")
+            self.assertEqual((cache.stats()['disk_hits'], cache.stats()['misses']), (1, 0))
+
+    def test_errors(self):
+        """Test floor division by zero, out-of-range positions and indexing a scalar."""
+        for text, error in (("print [1, 2] / [0, 1]", ZeroDivisionError), ("print 1 / [1, 0]", ZeroDivisionError),
+                            ("print [1, 2][2]", IndexError), ("let x = 5 print x[0]", TypeError)):
+            with self.subTest(text=text), self.assertRaises(error):
+                run_program(text)
+
+class TestIncrementalParsing(unittest.TestCase):
+    def test_edit_reuses_untouched_statements(self):
+        """Test that an edit re-parses only the statement it touches and keeps the others' AST nodes."""
+        text = "".join(f"let v{i} = {i} * 2\n" for i in range(100))
+        parser = IncrementalParser(text)
+        before = parser.statements()
+        start = text.index("let v50 = ") + len("let v50 = ")
+        parser.edit(start, start + 2, "7 + 1")
+        after = parser.statements()
+        self.assertEqual((parser.reparsed, parser.reused), (1, 99))
+        self.assertTrue(all(after[i] is before[i] for i in range(100) if i != 50))
+        self.assertEqual(after[50].right.op.value, '+')
+
+    def test_matches_full_parse(self):
+        """Test that the incremental result matches a full parse after edits that merge and split statements."""
+        parser = IncrementalParser("let x = 1\nprint x\nlet y = 2\n")
+        edits = [(9, 9, " + 3"), (0, 0, "while x < 3 then\n"), (len("while x < 3 then\nlet x = 1 + 3"), 
+                 len("while x < 3 then\nlet x = 1 + 3"), "\nendwhile"), (0, 5, "if"), (0, 0, "print (")]
+        for start, end, text in edits:
+            parser.edit(start, end, text)
+            with self.subTest(text=parser.text):
+                try:
+                    expected = Parser(Lexer(parser.text)).parse()
+                except Exception:
+                    with self.assertRaises(Exception):
+                        parser.statements()
+                    continue
+                self.assertEqual(FlatProgram.encode(parser.statements()).to_bytes(),
+                                 FlatProgram.encode(expected).to_bytes())
+
+    def test_error_covers_statements_it_spans(self):
+        """Test that a statement that fails to parse drops the old statements it covers, so a later fix re-parses them."""
+        parser = IncrementalParser("pr\n")
+        parser.edit(0, 0, "while a < 3 then\n")
+        parser.edit(19, 19, "int 2")
+        self.assertEqual(parser.text, "while a < 3 then\nprint 2\n")
+        self.assertEqual(FlatProgram.encode(parser.statements()).to_bytes(),
+                         FlatProgram.encode(Parser(Lexer(parser.text)).parse()).to_bytes())
+
+    def test_edit_leaves_later_segments_in_place(self):
+        """Test that an edit shifts the following statements lazily and finds them in the chunked buffer."""
+        text = "".join(f"let v{i} = {i}\n" for i in range(1000))
+        parser = IncrementalParser(text)
+        stored = [segment.start for segment in parser.segments]
+        start = text.index("let v500 ")
+        parser.edit(start, start, "print 1\n")
+        self.assertEqual([segment.start for segment in parser.segments[502:]], stored[501:])
+        self.assertEqual(parser.start_of(1000), len(text) - len("let v999 = 999\n") + len("print 1\n"))
+        statements = parser.statements()
+        expected = Parser(Lexer(parser.text)).parse()
+        self.assertEqual(FlatProgram.encode(statements).to_bytes(), FlatProgram.encode(expected).to_bytes())
+        self.assertEqual([segment.start for segment in parser.segments],
+                         [segment.start for segment in IncrementalParser(parser.text).segments])
+
+    def test_text_buffer(self):
+        """Test that a chunked text buffer indexes, slices and numbers lines like the string it holds."""
+        text = "let a = 1\nprint a\n"
+        buffer = TextBuffer(text, chunk_size=4)
+        for start, end, insert in ((3, 3, "xyz\n"), (0, 12, ""), (5, 5, "a\nb" * 6), (2, len(text), "\n")):
+            text = text[:start] + insert + text[end:]
+            buffer.replace(start, end, insert)
+            with self.subTest(text=text):
+                self.assertEqual((str(buffer), len(buffer), buffer[1:7]), (text, len(text), text[1:7]))
+                for pos in range(len(text) + 1):
+                    self.assertEqual((buffer.line(pos), buffer.line_start(pos)),
+                                     (text.count('\n', 0, pos) + 1, text.rfind('\n', 0, pos) + 1))
+                    if pos < len(text):
+                        self.assertEqual(buffer[pos], text[pos])
+
+    def test_repl_session(self):
+        """Test that a REPL keeps variables between inputs and asks for more lines for open blocks."""
+        sink = CollectorSink()
+        repl = Repl(output=sink)
+        lines = ["let a = 10", "if a > 5 then", "  print a", "endif", "while a < 12 then", "  let a = a + 1", "", "print a"]
+        self.assertEqual([repl.feed(line) for line in lines], [False, True, True, False, True, True, False, False])
+        self.assertEqual(sink.values, [10, 12])
+        with self.assertRaises(Exception):
+            repl.feed("let b = )")
+        self.assertFalse(repl.feed("print a * 2"))
+        self.assertEqual(sink.values[-1], 24)
+
+class TestAdaptive(unittest.TestCase):
+    def test_matches_tree_engine(self):
+        """Test that the adaptive engine gives the tree engine's results and specializes its hot operations."""
+        text = DEMO_PROGRAM + "let i = 0 let total = 0 while i < 50 then let total = (balance + i * 3) / 2 let i = i + 1 endwhile\nprint total\n"
+        interpreter, output = run_program(text, engine='adaptive')
+        self.assertEqual(output, run_program(text)[1])
+        stats = interpreter.adaptive.stats()
+        self.assertEqual(stats['specialized'], stats['sites'] - stats['kinds'].get('warmup', 0))
+        self.assertEqual(stats['kinds']['int_mul_slot_const'], 1)
+        self.assertEqual(stats['guard_failures'], 0)
+
+    def test_errors_after_specializing(self):
+        """Test that specialized operations still raise division by zero and undefined variable errors."""
+        for text, error in (("let i = 0 while i < 20 then print 100 / (10 - i) let i = i + 1", ZeroDivisionError),
+                            ("let i = 0 while i < 20 then if i > 10 then print y + i endif let y = i let i = i + 1", NameError)):
+            with self.subTest(text=text):
+                with self.assertRaises(error):
+                    run_program(text, engine='adaptive')
+
+    @unittest.skipIf(Arrays.numpy is None, "NumPy is not installed")
+    def test_guard_failures(self):
+        """Test that operations seeing arrays after specializing on ints fall back, then stay generic."""
+        text = ("let x = 1 let y = 0 let i = 0 while i < 40 then if i == 10 then let x = [1, 2] endif "
+                "let y = x * 2 let i = i + 1 endwhile print y")
+        interpreter, output = run_program(text, engine='adaptive')
+        self.assertEqual(output, "[2, 4]\n")
+        stats = interpreter.adaptive.stats()
+        self.assertEqual(stats['guard_failures'], 16)
+        self.assertEqual(stats['deoptimized'], 1)
+        self.assertEqual(stats['kinds']['generic'], 1)
+
+TRACED_PROGRAM = """
+let balance = 1000
+let withdrawal = 30
+let counter = 0
+while counter < 60 THEN
+    if balance > 200 THEN
+        let balance = balance - withdrawal
+        if balance < 500 THEN
+            print balance
+        ENDIF
+    ENDIF
+    let counter = counter + 1
+endwhile
+"""
+
+class TestTracing(unittest.TestCase):
+    def run_both(self, text):
+        """Run a program with and without loop tracing and return both interpreters and their errors."""
+        results = []
+        for traced in (False, True):
+            interpreter = Interpreter(Parser(Lexer(text)), output=CollectorSink())
+            if not traced:
+                interpreter.tracer = None
+            try:
+                interpreter.interpret()
+                error = None
+            except Exception as e:
+                error = type(e)
+            results.append((interpreter, error))
+        return results
+
+    def test_trace_matches_interpreter(self):
+        """Test that traced loops print and leave the same values, retracing when a branch changes direction."""
+        (plain, _), (traced, _) = self.run_both(TRACED_PROGRAM)
+        self.assertEqual(traced.output.values, plain.output.values)
+        self.assertEqual(traced.scopes, plain.scopes)
+        stats = traced.tracer.stats()
+        self.assertEqual(stats['traces'], 3)  # both ifs taken, only the outer one, then neither
+        self.assertGreater(stats['trace_iterations'], 40)
+        self.assertEqual(stats['guard_failures'], 2 * traced.tracer.max_failures)
+
+    def test_error_leaves_same_scopes(self):
+        """Test that an error inside a traced iteration leaves the scopes as the interpreter would."""
+        text = "let x = 100 let i = 0 while i < 50 then let x = x - 3 let y = 1000 / (x - 10) let i = i + 1"
+        (plain, plain_error), (traced, traced_error) = self.run_both(text.replace("let y", "let x = x + 0 let y"))
+        self.assertIs(traced_error, ZeroDivisionError)
+        self.assertIs(plain_error, ZeroDivisionError)
+        self.assertEqual(traced.scopes, plain.scopes)
+        self.assertEqual(len(traced.scopes), 2)
+
+    def test_ineligible_loops_are_interpreted(self):
+        """Test that loops introducing names or containing loops are not traced and still run correctly."""
+        for text in ("let i = 0 while i < 30 then let t = i * 2 let i = i + 1 endwhile print i",
+                     "let i = 0 let j = 0 while i < 30 then let j = 0 while j < 2 then let j = j + 1 endwhile let i = i + 1"):
+            with self.subTest(text=text):
+                (plain, _), (traced, _) = self.run_both(text)
+                self.assertEqual(traced.scopes, plain.scopes)
+                self.assertEqual(traced.tracer.stats()['traces'], 0)
+
+    def test_loops_are_forgotten_between_programs(self):
+        """Test that the tracer only keeps the loop states of the program being run."""
+        interpreter = Interpreter(None, output=CollectorSink())
+        interpreter.counted_loops = None
+        first = Parser(Lexer(TRACED_PROGRAM)).parse()
+        second = Parser(Lexer("let i = 0 while i < 30 then let i = i + 1 endwhile")).parse()
+        interpreter.run_tree(first)
+        interpreter.run_tree(second)
+        self.assertEqual(list(interpreter.tracer.loops), [second[1]])
+        self.assertEqual(interpreter.tracer.stats()['traces'], 4)
+
+class TestCountedLoops(unittest.TestCase):
+    def run_both(self, text):
+        """Run a program with and without closed-form loops and return both interpreters."""
+        interpreters = []
+        for counted in (False, True):
+            interpreter = Interpreter(Parser(Lexer(text)), output=CollectorSink())
+            interpreter.tracer = None
+            if not counted:
+                interpreter.counted_loops = None
+            interpreter.interpret()
+            interpreters.append(interpreter)
+        return interpreters
+
+    def test_closed_form_matches_iteration(self):
+        """Test that counted loops give exactly the iterated final scope, including floor division and uneven steps."""
+        text = ("let balance = 1000 let withdrawal = 7 let acc = 0 - 3 let last = 0 let counter = 5 "
+                "while counter < 103 then let balance = balance - withdrawal / 2 let counter = counter + 3 "
+                "let acc = (withdrawal - 10) / 4 + acc let last = withdrawal * 2 endwhile "
+                "let down = 50 while 0 < down then let down = down - 7 endwhile")
+        plain, counted = self.run_both(text)
+        self.assertEqual(counted.scopes, plain.scopes)
+        self.assertEqual(counted.scopes[0]['counter'], 104)
+        self.assertEqual(counted.scopes[0]['down'], -6)
+        self.assertEqual(sum(loop is not None for loop in counted.counted_loops.values()), 2)
+
+    def test_loops_are_forgotten_between_programs(self):
+        """Test that only the loops of the program being run keep their analysis."""
+        interpreter = Interpreter(None, output=CollectorSink())
+        for _ in range(3):
+            tree = Parser(Lexer("let i = 0 while i < 30 then let i = i + 1 endwhile")).parse()
+            interpreter.run_tree(tree)
+        self.assertEqual(list(interpreter.counted_loops), [tree[1]])
+        self.assertEqual(interpreter.scopes[0]['i'], 30)
+
+    def test_other_loops_are_interpreted(self):
+        """Test that loops that print, branch, update non-linearly or assign outer-scope names keep their behavior."""
+        for text in ("let i = 0 while i < 5 then print i let i = i + 1",
+                     "let i = 0 let x = 1 while i < 5 then let x = x * 2 let i = i + 1",
+                     "let i = 0 let x = 0 while i < 5 then if i > 2 then let x = x + 1 endif let i = i + 1",
+                     "let i = 0 let x = 0 while i < 2 then let j = 0 while j < 3 then let x = x + 1 let j = j + 1 "
+                     "endwhile let i = i + 1"):
+            with self.subTest(text=text):
+                plain, counted = self.run_both(text)
+                self.assertEqual(counted.scopes, plain.scopes)
+                self.assertEqual(counted.output.values, plain.output.values)
+
+SNAPSHOT_SETUP = """
+let total = 0
+let i = 1
+while i < 50 then
+    let total = total + i * i
+    let i = i + 1
+endwhile
+"""
+
+SNAPSHOT_JOB = "print total + i\n"
+
+SNAPSHOT_SCRIPT = """
+import sys
+from Lexer import Lexer
+from _Parser import Parser
+from Interperter import Interpreter
+from Cache import ProgramCache
+from Output import CollectorSink
+from Snapshot import Snapshot
+interpreter = Interpreter(Parser(Lexer(sys.argv[1])), engine='bytecode', cache=ProgramCache(), output=CollectorSink())
+interpreter.interpret()
+Snapshot.capture(interpreter).save(sys.argv[2])
+"""
+
+class TestSnapshot(unittest.TestCase):
+    def warm_interpreter(self):
+        """Run the snapshot setup script on a cached bytecode interpreter and return it."""
+        interpreter = Interpreter(Parser(Lexer(SNAPSHOT_SETUP)), engine='bytecode', cache=ProgramCache(), output=CollectorSink())
+        interpreter.interpret()
+        return interpreter
+
+    def test_round_trip(self):
+        """Test that restored interpreters start from the saved variables and compiled programs, independently."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'warm.pls')
+            Snapshot.capture(self.warm_interpreter()).save(path)
+            snapshot = Snapshot.load(path)
+        first = snapshot.restore(Parser(Lexer(SNAPSHOT_JOB)), output=CollectorSink())
+        first.interpret()
+        self.assertEqual(first.output.values, [40475])
+        first.scopes[0]['total'] = 0
+        second = snapshot.restore(Parser(Lexer(SNAPSHOT_SETUP)), engine='bytecode', output=CollectorSink())
+        self.assertEqual(second.scopes[0]['total'], 40425)
+        second.interpret()
+        self.assertEqual(second.cache.stats()['misses'], 0)
+        self.assertEqual(second.output.values, [])
+        self.assertEqual(second.scopes[0]['total'], 40425)
+
+    def test_identical_across_processes(self):
+        """Test that a snapshot written by another process has the same bytes and results as a local one."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'warm.pls')
+            subprocess.run([sys.executable, '-c', SNAPSHOT_SCRIPT, SNAPSHOT_SETUP, path], check=True,
+                           cwd=os.path.dirname(os.path.abspath(__file__)))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), Snapshot.capture(self.warm_interpreter()).to_bytes())
+            restored = Snapshot.load(path, mmap=True).restore(Parser(Lexer(SNAPSHOT_JOB)), output=CollectorSink())
+            restored.interpret()
+        self.assertEqual(restored.output.values, [40475])
+
+    def test_functions(self):
+        """Test that restored interpreters keep the defined functions, their purity and their memoized results."""
+        interpreter, _ = run_program("let base = 2 def sq(x) then return x * x enddef "
+                                     "def shifted(x) then return sq(x) + base enddef print sq(3) print shifted(4)")
+        snapshot = Snapshot.from_bytes(Snapshot.capture(interpreter).to_bytes())
+        for _ in range(2):
+            restored = snapshot.restore(Parser(Lexer("print sq(3) print shifted(5)")), output=CollectorSink())
+            restored.interpret()
+            self.assertEqual(restored.output.values, [9, 27])
+            stats = restored.function_stats()
+            self.assertEqual((stats['sq']['pure'], stats['sq']['hits'], stats['sq']['size']), (True, 1, 3))
+            self.assertFalse(stats['shifted']['pure'])
+
+    def test_none_variables(self):
+        """Test that variables assigned from calls without a return value survive a round trip."""
+        interpreter, _ = run_program("def p(x) then let z = x enddef let y = p(3) let k = 1")
+        snapshot = Snapshot.from_bytes(Snapshot.capture(interpreter).to_bytes())
+        restored = snapshot.restore(Parser(Lexer("print k")), output=CollectorSink())
+        self.assertEqual(restored.scopes[0], {'y': None, 'k': 1})
+        restored.interpret()
+        self.assertEqual(restored.output.values, [1])
+
+    @unittest.skipIf(Arrays.numpy is None, "NumPy is not installed")
+    def test_memory_mapped_arrays(self):
+        """Test that arrays are restored as read-only views of a memory-mapped snapshot."""
+        interpreter, _ = run_program("let squares = [0 : 1000] * [0 : 1000]")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'arrays.pls')
+            Snapshot.capture(interpreter).save(path)
+            restored = Snapshot.load(path, mmap=True).restore(Parser(Lexer("print squares[999] + squares[[2, 3]]")),
+                                                              output=CollectorSink())
+            squares = restored.scopes[0]['squares']
+            self.assertIsInstance(squares, Arrays.IntArray)
+            self.assertFalse(squares.flags.writeable)
+            restored.interpret()
+            self.assertEqual(restored.output.values[0].tolist(), [998005, 998010])
+            del squares, restored
+
+class TestBytesLexer(unittest.TestCase):
+    def tokens(self, lexer):
+        """Return the (type, value, position) of every token of a lexer, up to and including EOF."""
+        tokens = []
+        while True:
+            token = lexer.get_next_token()
+            tokens.append((token.type, token.value, lexer.position()))
+            if token.type == Token.EOF:
+                return tokens
+
+    def test_matches_str_lexer(self):
+        """Test that a file path, an mmap and a memoryview give the same tokens and positions as the str lexer."""
+        expected = self.tokens(Lexer(DEMO_PROGRAM))
+        stream = Lexer(DEMO_PROGRAM).tokenize()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'demo.txt')
+            with open(path, 'wb') as f:
+                f.write(DEMO_PROGRAM.encode('ascii'))
+            lexer = Lexer.open(path)
+            self.assertEqual(self.tokens(lexer), expected)
+            lexer.close()
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self.assertEqual(self.tokens(BytesLexer(mapped)), expected)
+                tokens = BytesLexer(mapped).tokenize()
+                self.assertEqual([(t.type, t.value) for t in tokens], [(t.type, t.value) for t in stream])
+                self.assertEqual((list(tokens.lines), list(tokens.columns)), (list(stream.lines), list(stream.columns)))
+        self.assertEqual(self.tokens(BytesLexer(memoryview(DEMO_PROGRAM.encode('ascii')))), expected)
+        interpreter = Interpreter(Parser(BytesLexer(DEMO_PROGRAM.encode('ascii'))), output=CollectorSink())
+        interpreter.interpret()
+        self.assertEqual(interpreter.scopes, run_program(DEMO_PROGRAM)[0].scopes)
+
+    def test_large_file_memory(self):
+        """Test that lexing a memory-mapped multi-megabyte file allocates far less than the file size."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'large.txt')
+            with open(path, 'wb') as f:
+                f.write(b'let counter = counter + 12345\n' * 100000)
+            lexer = Lexer.open(path)
+            tracemalloc.start()
+            try:
+                count = 1
+                while lexer.get_next_token().type != Token.EOF:
+                    count += 1
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+                lexer.close()
+        self.assertEqual(count, 600001)
+        self.assertLess(peak, 100_000)
+
+    def test_invalid_character(self):
+        """Test that an invalid byte is reported with its line and column."""
+        with self.assertRaisesRegex(Exception, "Invalid character: b'#' at line 2, column 9"):
+            BytesLexer(b"let x = 1\nlet y = # 2").tokenize()
+        with self.assertRaisesRegex(Exception, "line 2, column 9"):
+            self.tokens(BytesLexer(b"let x = 1\nlet y = # 2"))
+
+FACTORIAL_PROGRAM = """
+def factorial(n) then
+    if n < 1 then
+        return 1
+    endif
+    return n * factorial(n - 1)
+enddef
+"""
+
+class TestFunctions(unittest.TestCase):
+    def run_functions(self, text, engine='tree'):
+        """Run a program on a collecting interpreter and return the interpreter."""
+        interpreter = Interpreter(Parser(Lexer(text)), engine=engine, output=CollectorSink())
+        interpreter.interpret()
+        return interpreter
+
+    def test_recursion_and_memoization(self):
+        """Test that recursive calls run without Python recursion and that pure calls are memoized."""
+        fib = ("def fib(n) then if n < 2 then return n endif "
+               "return fib(n - 1) + fib(n - 2) enddef print fib(90)")
+        for engine in ('tree', 'iterative'):
+            with self.subTest(engine=engine):
+                interpreter = self.run_functions(FACTORIAL_PROGRAM + "print factorial(5) print factorial(5000) / factorial(4999)",
+                                                 engine)
+                self.assertEqual(interpreter.output.values, [120, 5000])
+                interpreter = self.run_functions(fib, engine)
+                self.assertEqual(interpreter.output.values, [2880067194370816120])
+                stats = interpreter.function_stats()['fib']
+                self.assertTrue(stats['pure'])
+                self.assertLessEqual(stats['calls'], 2 * 91)
+                self.assertGreater(stats['hit_rate'], 0.4)
+
+    def test_every_engine(self):
+        """Test that every engine runs programs that define and call functions, and later calls of earlier definitions."""
+        text = FACTORIAL_PROGRAM + ("let n = 0 def count(k) then global n let n = n + k enddef "
+                                    "let i = 0 while i < 4 then count(factorial(i)) let i = i + 1 endwhile print n")
+        expected = self.run_functions(text)
+        for engine in ('tree', 'closure', 'bytecode', 'flat', 'python', 'iterative', 'adaptive'):
+            with self.subTest(engine=engine):
+                interpreter = self.run_functions(text, engine)
+                self.assertEqual(interpreter.output.values, [10])
+                self.assertEqual(interpreter.scopes, expected.scopes)
+                getattr(interpreter, 'run_' + engine)(Parser(Lexer("print factorial(n)")).parse())
+                self.assertEqual(interpreter.output.values, [10, 3628800])
+                interpreter.run_flat(FlatProgram.encode(Parser(Lexer("count(1) print n")).parse()))
+                self.assertEqual(interpreter.output.values, [10, 3628800, 11])
+
+    def test_side_effects_are_not_memoized(self):
+        """Test that calls that print or assign globals always run, and that redefinition clears memos."""
+        interpreter = self.run_functions(
+            "let total = 0 def add(x) then global total let total = total + x return total enddef "
+            "def show(x) then print x enddef def double(x) then let y = x * 2 return y enddef "
+            "let i = 0 while i < 3 then show(add(2)) let i = i + 1 endwhile "
+            "print double(4) let y = 0 print double(4) print y")
+        self.assertEqual(interpreter.output.values, [2, 4, 6, 8, 8, 0])
+        self.assertEqual(interpreter.scopes[0]['total'], 6)
+        stats = interpreter.function_stats()
+        self.assertEqual((stats['add']['pure'], stats['show']['pure'], stats['double']['pure']), (False, False, True))
+        self.assertEqual((stats['double']['hits'], stats['double']['misses']), (1, 1))
+        interpreter = self.run_functions("def f(x) then return x + 1 enddef print f(1) print f(1) "
+                                         "def f(x) then return x + 2 enddef print f(1)")
+        self.assertEqual(interpreter.output.values, [2, 2, 3])
+
+    def test_assignments_are_local(self):
+        """Test that a body assigns the caller's variables only through names it declares global."""
+        interpreter = self.run_functions(
+            "let x = 1 let n = 0 def f(a) then let x = a * 10 return x enddef "
+            "def g(a) then if a > 0 then global n endif let n = n + a let x = a enddef "
+            "print f(5) print x g(2) g(3) print n print x")
+        self.assertEqual(interpreter.output.values, [50, 1, 5, 1])
+        self.assertEqual(interpreter.functions['g'].globals, {'n'})
+        self.assertFalse(interpreter.function_stats()['g']['pure'])
+
+    def test_disk_cache(self):
+        """Test that function definitions round-trip through the flat encoding and the on-disk program cache."""
+        text = ("let n = 0 def count(k) then global n let n = n + k return enddef "
+                "def square(x) then return x * x enddef count(2) count(3) print square(n) + n")
+        tree = Parser(Lexer(text)).parse()
+        encoded = FlatProgram.encode(tree).to_bytes()
+        self.assertEqual(FlatProgram.encode(FlatProgram.from_bytes(encoded).decode()).to_bytes(), encoded)
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(2):
+                cache = ProgramCache(directory=directory)
+                interpreter, output = run_program(text, cache=cache)
+                self.assertEqual(output, "30\n")
+            self.assertEqual((cache.stats()['disk_hits'], cache.stats()['misses']), (1, 0))
+
+    def test_syntax_errors(self):
+        """Test that return or global outside a function, nested definitions and wrong arities are rejected."""
+        for text in ("global x", "let x = 1 return x", "def f(x) then global x enddef", "def f() then global enddef"):
+            with self.subTest(text=text), self.assertRaises(Exception):
+                Parser(Lexer(text)).parse()
+        with self.assertRaises(Exception):
+            Parser(Lexer("return 1")).parse()
+        with self.assertRaises(Exception):
+            Parser(Lexer("def f() then def g() then return 1 enddef enddef")).parse()
+        with self.assertRaisesRegex(Exception, "takes 1 arguments but 2 were given"):
+            self.run_functions(FACTORIAL_PROGRAM + "print factorial(1, 2)")
+        with self.assertRaises(NameError):
+            self.run_functions("print missing(1)")
+
+    def test_call_results_not_hoisted(self):
+        """Test that arithmetic on a call result, possibly None, stays inside a loop that never runs."""
+        text = ("def nothing() then let z = 1 enddef let n = nothing() let i = 0 "
+                "while i < 0 then print n + 1 let i = i + 1 endwhile print i")
+        interpreter = Interpreter(Parser(Lexer(text)), optimize=True, output=CollectorSink())
+        interpreter.interpret()
+        self.assertEqual(interpreter.output.values, [0])
+        interpreter = Interpreter(Parser(StreamLexer([text])), optimize=True, output=CollectorSink())
+        interpreter.interpret_stream()
+        self.assertEqual(interpreter.output.values, [0])
+        self.assertEqual(interpreter.optimizer.hoisted, 0)
+
 if __name__ == '__main__':
     unittest.main()